@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+"""
+indexing(参照 -> インデックス番号変換)のベンチマーク
+list.indexによる検索と、同一性の対応表(reference_indexer)による検索を比較する
+
+$ python -m benchmark.indexing [メッシュ数] [モーフターゲット数]
+"""
+
+import sys
+from timeit import timeit
+
+from vrm.gltf import copy_gltf, indexing, reference_indexer
+
+
+def synthetic_gltf(mesh_count, target_count, vertex_count=1000):
+    """
+    モーフターゲットを多数持つglTFオブジェクト(参照変換済み)を作成する
+    モーフターゲットの差分は全て0(VRoidの出力と同様に密な配列)
+    :param mesh_count: メッシュ数
+    :param target_count: メッシュ毎のモーフターゲット数
+    :param vertex_count: メッシュ毎の頂点数
+    :return: glTFオブジェクト
+    """
+    buffer_views, accessors, meshes = [], [], []
+
+    def accessor(type_, components, count):
+        # 読み込み時と同様にbufferView毎に異なるオフセットを持たせる
+        offset = buffer_views[-1]['byteOffset'] + buffer_views[-1]['byteLength'] if buffer_views else 0
+        view = {'byteOffset': offset, 'byteLength': components * 4 * count, 'data': bytes(components * 4 * count)}
+        new_accessor = {'bufferView': view, 'byteOffset': 0, 'componentType': 5126, 'type': type_, 'count': count}
+        buffer_views.append(view)
+        accessors.append(new_accessor)
+        return new_accessor
+
+    material = {'name': 'mat', 'pbrMetallicRoughness': {}}
+    for _ in range(mesh_count):
+        attributes = {'POSITION': accessor('VEC3', 3, vertex_count), 'NORMAL': accessor('VEC3', 3, vertex_count)}
+        targets = [{'POSITION': accessor('VEC3', 3, vertex_count), 'NORMAL': accessor('VEC3', 3, vertex_count)}
+                   for _ in range(target_count)]
+        primitive = {'indices': accessor('SCALAR', 1, vertex_count), 'attributes': attributes, 'targets': targets,
+                     'material': material}
+        meshes.append({'name': 'mesh', 'primitives': [primitive]})
+
+    return {
+        'accessors': accessors, 'bufferViews': buffer_views, 'images': [], 'materials': [material],
+        'meshes': meshes, 'samplers': [], 'skins': [], 'textures': [],
+        'extensions': {'VRM': {'meta': {}, 'materialProperties': []}}
+    }
+
+
+def list_index_references(gltf):
+    """
+    list.indexによるaccessor、bufferViewの参照変換(変更前の実装)
+    :param gltf: glTFオブジェクト
+    """
+    gltf = copy_gltf(gltf)
+    buffer_views, accessors = gltf['bufferViews'], gltf['accessors']
+    for accessor in accessors:
+        accessor['bufferView'] = buffer_views.index(accessor['bufferView'])
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            primitive['indices'] = accessors.index(primitive['indices'])
+            for target in primitive['targets']:
+                for name in target:
+                    target[name] = accessors.index(target[name])
+
+
+def table_references(gltf):
+    """
+    同一性の対応表によるaccessor、bufferViewの参照変換
+    :param gltf: glTFオブジェクト
+    """
+    gltf = copy_gltf(gltf)
+    buffer_views, accessors = gltf['bufferViews'], gltf['accessors']
+    buffer_view_index, accessor_index = reference_indexer(buffer_views), reference_indexer(accessors)
+    for accessor in accessors:
+        accessor['bufferView'] = buffer_view_index(accessor['bufferView'])
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            primitive['indices'] = accessor_index(primitive['indices'])
+            for target in primitive['targets']:
+                for name in target:
+                    target[name] = accessor_index(target[name])
+
+
+def main(argv):
+    mesh_count, target_count = (list(map(int, argv)) + [10, 100][len(argv):])[:2]
+    gltf = synthetic_gltf(mesh_count, target_count)
+    print('accessors:', len(gltf['accessors']))
+    print('list.index: {:.3f} sec'.format(timeit(lambda: list_index_references(gltf), number=1)))
+    print('reference table: {:.3f} sec'.format(timeit(lambda: table_references(gltf), number=1)))
+    print('indexing: {:.3f} sec'.format(timeit(lambda: indexing(gltf), number=1)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+from array import array
+
+from vrm.debug import count_draw_calls
+from vrm.gltf import accessor_array
+from vrm.reducer import batched_primitives, combine_primitives
+
+
+def indices_accessor(values):
+    data = array('H', values).tobytes()
+    view = {'buffer': 0, 'byteOffset': 0, 'byteLength': len(data), 'target': 34963, 'data': data}
+    return {'bufferView': view, 'byteOffset': 0, 'componentType': 5123, 'count': len(values), 'type': 'SCALAR'}
+
+
+def test_batched_primitives():
+    mat1, mat2 = {'name': 'mat1'}, {'name': 'mat2'}
+    attributes = {'POSITION': {'count': 6}}
+    other_attributes = {'POSITION': {'count': 3}}
+    targets = [{'POSITION': {'count': 6}}]
+    indices = [indices_accessor(values) for values in [[0, 1, 2], [2, 3, 4], [3, 4, 5], [0, 1, 2], [0, 1, 2, 3],
+                                                        [2, 3, 4, 5]]]
+    primitives = [
+        {'mode': 4, 'material': mat1, 'attributes': attributes, 'targets': targets, 'indices': indices[0]},
+        {'mode': 4, 'material': mat2, 'attributes': attributes, 'targets': targets, 'indices': indices[1]},
+        {'mode': 4, 'material': mat1, 'attributes': attributes, 'targets': targets, 'indices': indices[2]},
+        {'mode': 4, 'material': mat1, 'attributes': other_attributes, 'indices': indices[3]},
+        {'mode': 5, 'material': mat2, 'attributes': attributes, 'indices': indices[4]},
+        {'mode': 5, 'material': mat2, 'attributes': attributes, 'indices': indices[5]}
+    ]
+    accessors = [attributes['POSITION'], other_attributes['POSITION'], targets[0]['POSITION']] + indices
+    gltf = {
+        'meshes': [{'name': 'mesh', 'primitives': primitives}], 'materials': [mat1, mat2],
+        'accessors': accessors, 'bufferViews': [accessor['bufferView'] for accessor in indices]
+    }
+
+    batched = batched_primitives(gltf)
+    new_primitives = batched['meshes'][0]['primitives']
+    assert count_draw_calls(batched) == 5
+    # 隣接していない同じマテリアルのプリミティブを先頭の位置に統合する
+    assert new_primitives[0]['material'] is mat1
+    assert list(accessor_array(new_primitives[0]['indices'])) == [0, 1, 2, 3, 4, 5]
+    assert new_primitives[0]['attributes']['POSITION'] is attributes['POSITION']
+    assert new_primitives[0]['targets'][0]['POSITION'] is targets[0]['POSITION']
+    assert new_primitives[1:] == primitives[1:2] + primitives[3:]
+    assert batched['accessors'] == accessors + [new_primitives[0]['indices']]
+
+    # 元のglTFオブジェクトは変更しない
+    assert gltf['meshes'][0]['primitives'] is primitives
+    assert count_draw_calls(gltf) == 6
+
+
+def test_batched_primitives_blended():
+    # 半透明のマテリアルは隣接しているプリミティブだけ統合する(マテリアルのないプリミティブも扱える)
+    blend, opaque = {'name': 'blend', 'alphaMode': 'BLEND'}, {'name': 'opaque'}
+    attributes = {'POSITION': {'count': 6}}
+    indices = [indices_accessor([n, n + 1, n + 2]) for n in range(5)]
+    materials = [blend, blend, opaque, blend, None]
+    primitives = [{'mode': 4, 'attributes': attributes, 'indices': i} for i in indices]
+    for primitive, material in zip(primitives, materials):
+        if material:
+            primitive['material'] = material
+    gltf = {
+        'meshes': [{'name': 'mesh', 'primitives': primitives}], 'materials': [blend, opaque],
+        'accessors': [attributes['POSITION']] + indices, 'bufferViews': [a['bufferView'] for a in indices]
+    }
+
+    new_primitives = batched_primitives(gltf)['meshes'][0]['primitives']
+    assert [p.get('material') for p in new_primitives] == [blend, opaque, blend, None]
+    assert list(accessor_array(new_primitives[0]['indices'])) == [0, 1, 2, 1, 2, 3]
+    assert new_primitives[1:] == primitives[2:]
+
+
+def test_combine_primitives_view():
+    # targetを持たないbufferViewも統合できる(統合したbufferViewの位置は0から)
+    indices = [indices_accessor([0, 1, 2]), indices_accessor([2, 1, 3])]
+    for accessor in indices:
+        del accessor['bufferView']['target']
+        accessor['bufferView']['byteOffset'] = 8
+    primitive, accessor, view = combine_primitives([{'mode': 4, 'indices': i} for i in indices])
+    assert primitive['indices'] is accessor and accessor['bufferView'] is view
+    assert list(accessor_array(accessor)) == [0, 1, 2, 2, 1, 3]
+    assert view['byteOffset'] == 0 and 'target' not in view
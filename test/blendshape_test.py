@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.blendshape import pruned_morph_targets
+
+
+def make_gltf(weights=(0.0, 0.0, 0.0, 0.0), bound=(1, 3), animations=()):
+    targets = [{'POSITION': {'name': 'target%d' % n}} for n in range(4)]
+    names = ['morph%d' % n for n in range(4)]
+    mesh = {
+        'name': 'Face', 'weights': list(weights), 'extras': {'targetNames': names},
+        'primitives': [{'attributes': {}, 'targets': [dict(t) for t in targets], 'extras': {'targetNames': names}}
+                       for _ in range(2)]
+    }
+    body = {'name': 'Body', 'primitives': [{'attributes': {}}]}
+    return {
+        'meshes': [mesh, body],
+        'nodes': [{'mesh': mesh}, {'mesh': body}],
+        'animations': list(animations),
+        'extensions': {'VRM': {'blendShapeMaster': {'blendShapeGroups': [
+            {'name': 'G%d' % n, 'binds': [{'mesh': mesh, 'index': n, 'weight': 100}]} for n in bound
+        ]}}}
+    }
+
+
+def bind_indices(gltf):
+    groups = gltf['extensions']['VRM']['blendShapeMaster']['blendShapeGroups']
+    return [b['index'] for g in groups for b in g['binds']]
+
+
+@pytest.mark.parametrize(
+    "weights, keep_names, bound, names", [
+        ((0.0, 0.0, 0.0, 0.0), [], (1, 3), ['morph1', 'morph3']),
+        ((0.0, 0.0, 0.0, 0.0), ['morph2'], (1, 3), ['morph1', 'morph2', 'morph3']),  # 設定で残す
+        ((0.5, 0.0, 0.0, 0.0), [], (1, 3), ['morph0', 'morph1', 'morph3']),  # 既定のウェイトが0でない
+        ((0.0, 0.0, 0.0, 0.0), [], (3, 1, 3), ['morph1', 'morph3'])  # 複数のバインドが同じモーフターゲットを参照
+    ]
+)
+def test_pruned_morph_targets(weights, keep_names, bound, names):
+    gltf = make_gltf(weights, bound)
+    pruned = pruned_morph_targets(gltf, keep_names)
+
+    mesh = pruned['meshes'][0]
+    assert mesh['extras']['targetNames'] == names
+    assert mesh['weights'] == [weights[int(name[-1])] for name in names]
+    for primitive in mesh['primitives']:
+        assert primitive['extras']['targetNames'] == names
+        assert [t['POSITION']['name'] for t in primitive['targets']] == ['target' + name[-1] for name in names]
+
+    # バインドは削除後のモーフターゲット番号を参照する
+    assert [names[n] for n in bind_indices(pruned)] == ['morph%d' % n for n in bound]
+    assert pruned['nodes'][0]['mesh'] is mesh
+
+    # 元のglTFオブジェクトは変更しない
+    assert len(gltf['meshes'][0]['primitives'][0]['targets']) == 4 and bind_indices(gltf) == list(bound)
+
+
+def test_pruned_all_morph_targets():
+    pruned = pruned_morph_targets(make_gltf(bound=()))
+    mesh = pruned['meshes'][0]
+    assert 'weights' not in mesh and mesh['extras'] == {}
+    assert all('targets' not in p and p['extras'] == {} for p in mesh['primitives'])
+
+
+def test_pruned_morph_targets_animated():
+    # アニメーションでウェイトを変更しているメッシュはそのまま
+    animation = {'channels': [{'sampler': 0, 'target': {'node': 0, 'path': 'weights'}}]}
+    pruned = pruned_morph_targets(make_gltf(animations=[animation]))
+    assert len(pruned['meshes'][0]['primitives'][0]['targets']) == 4
+
+
+def test_pruned_morph_targets_short_weights():
+    # ウェイト、モーフターゲット名がモーフターゲットより短い、または省略されている
+    gltf = make_gltf(bound=(1, 3))
+    mesh = gltf['meshes'][0]
+    mesh['weights'] = [0.0, 0.0]
+    mesh['extras']['targetNames'] = ['morph0', 'morph1', 'morph2']
+    del mesh['primitives'][0]['extras']
+    pruned = pruned_morph_targets(gltf)
+
+    mesh = pruned['meshes'][0]
+    assert mesh['weights'] == [0.0]
+    assert mesh['extras']['targetNames'] == ['morph1']
+    assert [t['POSITION']['name'] for t in mesh['primitives'][0]['targets']] == ['target1', 'target3']
+    assert bind_indices(pruned) == [0, 1]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+from io import BytesIO
+
+from PIL import Image
+
+from vrm.cache import ImageCache
+
+
+def png(size, color):
+    with BytesIO() as bio:
+        Image.new('RGBA', size, color).save(bio, format='png')
+        return bio.getvalue()
+
+
+def test_load():
+    cache = ImageCache()
+    data = png((4, 4), (255, 0, 0, 255))
+    image = cache.load(data)
+    assert image.size == (4, 4)
+    assert cache.load(bytes(bytearray(data))) is image  # 同じ内容ならデコードしない
+    assert cache.get(memoryview(data)) is image
+    assert cache.get(png((4, 4), (0, 0, 0, 255))) is None
+
+
+def test_put_evict():
+    cache = ImageCache(max_bytes=4 * 4 * 4 * 2)  # RGBA 4x4 2枚分
+    datas = [png((4, 4), (n, 0, 0, 255)) for n in range(3)]
+    images = [Image.new('RGBA', (4, 4)) for _ in datas]
+    for data, image in zip(datas, images):
+        cache.put(data, image)
+    assert cache.get(datas[0]) is None  # 古いものから削除
+    assert cache.get(datas[1]) is images[1]
+    assert cache.get(datas[2]) is images[2]
+    assert cache.total_bytes == 4 * 4 * 4 * 2
+
+
+def test_evict_buffers():
+    # キャッシュから削除した画像のバイトデータは保持しない
+    cache = ImageCache(max_bytes=4 * 4 * 4 * 2)
+    datas = [png((4, 4), (n, 0, 0, 255)) for n in range(4)]
+    for data in datas:
+        cache.load(data)
+    assert cache.get(png((4, 4), (0, 0, 255, 255))) is None
+    buffers = [buffer for buffer, _ in cache.hashes.values()]
+    assert len(buffers) == len(cache.images) == 2
+    assert all(buffer is not data for buffer in buffers for data in datas[:2])
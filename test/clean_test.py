@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.cleaner import clean, pruned_attributes, pruned_nodes
+
+
+def test_clean():
+    views = [{'data': b'%d' % n} for n in range(5)]
+    accessors = [{'bufferView': views[n]} for n in range(4)]
+    samplers = [{}, {}]
+    images = [{'name': 'img0', 'bufferView': views[4]}, {'name': 'img1'}]
+    textures = [{'source': images[0], 'sampler': samplers[1]}, {'source': images[1], 'sampler': samplers[0]}]
+    materials = [
+        {'name': 'mat0', 'pbrMetallicRoughness': {'baseColorTexture': {'index': textures[0]}}},
+        {'name': 'mat1', 'pbrMetallicRoughness': {'baseColorTexture': {'index': textures[1]}}}
+    ]
+    gltf = {
+        'bufferViews': views, 'accessors': accessors, 'samplers': samplers, 'images': images,
+        'textures': textures, 'materials': materials,
+        'skins': [{'inverseBindMatrices': accessors[2]}],
+        'meshes': [{'primitives': [
+            {'indices': accessors[1], 'attributes': {'POSITION': accessors[2]}, 'material': materials[0]},
+            {'indices': accessors[1], 'attributes': {'POSITION': accessors[2]}, 'material': materials[0]}
+        ]}],
+        'extensions': {'VRM': {'meta': {}, 'materialProperties': [
+            {'name': 'mat0', 'textureProperties': {'_MainTex': textures[0], '_ShadeTexture': textures[0]}},
+            {'name': 'mat1', 'textureProperties': {'_MainTex': textures[1]}}
+        ]}}
+    }
+
+    cleaned = clean(gltf)
+    assert cleaned['materials'] == [materials[0]]
+    assert cleaned['extensions']['VRM']['materialProperties'][0]['name'] == 'mat0'
+    assert len(cleaned['extensions']['VRM']['materialProperties']) == 1
+    assert cleaned['textures'] == [textures[0]]
+    assert cleaned['images'] == [images[0]]
+    assert cleaned['samplers'][0] is samplers[1]
+    assert [a['bufferView']['data'] for a in cleaned['accessors']] == [b'2', b'1']  # スキン、メッシュの順
+    assert [v['data'] for v in cleaned['bufferViews']] == [b'2', b'1', b'4']  # アクセッサー、画像の順
+
+    # 元のglTFオブジェクトは変更しない
+    assert len(gltf['materials']) == 2 and len(gltf['extensions']['VRM']['materialProperties']) == 2
+
+
+def test_clean_sparse():
+    # sparseアクセッサーの要素番号、値のbufferViewも残す
+    views = [{'data': b'%d' % n} for n in range(3)]
+    sparse = {'count': 1, 'indices': {'bufferView': views[1], 'componentType': 5121},
+              'values': {'bufferView': views[2]}}
+    accessor = {'componentType': 5126, 'type': 'VEC3', 'count': 2, 'sparse': sparse}
+    gltf = {
+        'bufferViews': views, 'accessors': [accessor], 'samplers': [], 'images': [], 'textures': [], 'materials': [],
+        'skins': [], 'meshes': [{'primitives': [
+            {'indices': accessor, 'attributes': {}, 'targets': [{'POSITION': accessor}], 'material': {}}
+        ]}],
+        'extensions': {'VRM': {'meta': {}, 'materialProperties': []}}
+    }
+    cleaned = clean(gltf)
+    assert [v['data'] for v in cleaned['bufferViews']] == [b'1', b'2']
+
+
+def attribute_gltf(material):
+    # 頂点データを共有する2つのプリミティブ(1つ目は法線マップなしのマテリアル)
+    attributes = {name: {'name': name} for name in ['POSITION', 'NORMAL', 'TANGENT', 'TEXCOORD_0', 'TEXCOORD_1']}
+    targets = [{'POSITION': {}, 'NORMAL': {}, 'TANGENT': {}}, {'NORMAL': {}}]
+    materials = [{'name': 'plain', 'pbrMetallicRoughness': {}}, material]
+    primitives = [{'attributes': dict(attributes), 'targets': [dict(t) for t in targets], 'material': m}
+                  for m in materials]
+    return {'meshes': [{'primitives': primitives}], 'materials': materials,
+            'extensions': {'VRM': {'materialProperties': [
+                {'name': 'plain', 'textureProperties': {}, 'keywordMap': {}},
+                {'name': 'mapped', 'textureProperties': {}, 'keywordMap': {'_NORMALMAP': True}}
+            ]}}}
+
+
+@pytest.mark.parametrize(
+    "material, keep_morph_normals, attributes, target", [
+        ({'name': 'plain', 'pbrMetallicRoughness': {}}, False,
+         ['POSITION', 'NORMAL', 'TEXCOORD_0'], ['POSITION']),
+        ({'name': 'plain', 'pbrMetallicRoughness': {}}, True,
+         ['POSITION', 'NORMAL', 'TEXCOORD_0'], ['POSITION', 'NORMAL']),
+        ({'name': 'mapped', 'pbrMetallicRoughness': {}}, False,  # VRMマテリアルの法線マップ
+         ['POSITION', 'NORMAL', 'TANGENT', 'TEXCOORD_0'], ['POSITION', 'TANGENT']),
+        ({'name': 'uv1', 'pbrMetallicRoughness': {'baseColorTexture': {'index': {}, 'texCoord': 1}}}, False,
+         ['POSITION', 'NORMAL', 'TEXCOORD_0', 'TEXCOORD_1'], ['POSITION']),
+        ({'name': 'uv1', 'pbrMetallicRoughness': {}, 'occlusionTexture': {'index': {}, 'texCoord': 1}}, False,
+         ['POSITION', 'NORMAL', 'TEXCOORD_0', 'TEXCOORD_1'], ['POSITION'])
+    ]
+)
+def test_pruned_attributes(material, keep_morph_normals, attributes, target):
+    gltf = attribute_gltf(material)
+    pruned = pruned_attributes(gltf, keep_morph_normals)
+    for primitive in pruned['meshes'][0]['primitives']:
+        # 頂点データを共有するプリミティブは同じ頂点属性を持つ
+        assert list(primitive['attributes']) == attributes
+        assert list(primitive['targets'][0]) == target
+        assert list(primitive['targets'][1]) == ['NORMAL']  # モーフターゲットは空にしない
+
+    # 元のglTFオブジェクトは変更しない
+    assert len(gltf['meshes'][0]['primitives'][0]['attributes']) == 5
+
+
+def node_gltf():
+    # 0: Root -> 1: Hips -> 2: Head -> 3: Hair -> 4: HairEnd, 0 -> 5: Body(メッシュ), 0 -> 6: secondary(空のノード)
+    # 0 -> 7: Group(単位変換) -> 8: Accessory(メッシュ)
+    mesh = {'primitives': []}
+    skin = {'joints': [1, 2, 3], 'skeleton': 1}
+    nodes = [
+        {'name': 'Root', 'children': [1, 5, 6, 7]}, {'name': 'Hips', 'children': [2], 'translation': [0, 1, 0]},
+        {'name': 'Head', 'children': [3]}, {'name': 'Hair', 'children': [4]}, {'name': 'HairEnd'},
+        {'name': 'Body', 'mesh': mesh, 'skin': skin}, {'name': 'secondary'},
+        {'name': 'Group', 'children': [8], 'scale': [1, 1, 1]}, {'name': 'Accessory', 'mesh': mesh}
+    ]
+    return {
+        'nodes': nodes, 'scenes': [{'nodes': [0]}], 'meshes': [mesh], 'skins': [skin],
+        'extensions': {'VRM': {
+            'humanoid': {'humanBones': [{'bone': 'hips', 'node': 1}, {'bone': 'head', 'node': 2}]},
+            'firstPerson': {'firstPersonBone': 2},
+            'secondaryAnimation': {'boneGroups': [{'bones': [3], 'center': -1, 'colliderGroups': [0]}],
+                                   'colliderGroups': [{'node': 2, 'colliders': []}]}
+        }}
+    }
+
+
+@pytest.mark.parametrize(
+    "flatten, names, children, scene", [
+        (False, ['Root', 'Hips', 'Head', 'Hair', 'HairEnd', 'Body', 'Group', 'Accessory'],
+         [[1, 5, 6], [2], [3], [4], None, None, [7], None], [0]),
+        # 単位変換のノード(Root、Group)を取り除き、子を親(シーン)に付け替える
+        (True, ['Hips', 'Head', 'Hair', 'HairEnd', 'Body', 'Accessory'],
+         [[1], [2], [3], None, None, None], [0, 4, 5]),
+    ]
+)
+def test_pruned_nodes(flatten, names, children, scene):
+    gltf = node_gltf()
+    pruned = pruned_nodes(gltf, flatten)
+    nodes = pruned['nodes']
+    assert [n['name'] for n in nodes] == names
+    assert [n.get('children') for n in nodes] == children
+    assert pruned['scenes'][0]['nodes'] == scene
+
+    # ノード番号の参照は削除後の番号に振り直す(揺れもののチェーンの末端は残す)
+    def name(n):
+        return nodes[n]['name']
+
+    skin = pruned['skins'][0]
+    assert [name(n) for n in skin['joints']] == ['Hips', 'Head', 'Hair'] and name(skin['skeleton']) == 'Hips'
+    assert nodes[names.index('Body')]['skin'] is skin
+    vrm = pruned['extensions']['VRM']
+    assert [name(b['node']) for b in vrm['humanoid']['humanBones']] == ['Hips', 'Head']
+    assert name(vrm['firstPerson']['firstPersonBone']) == 'Head'
+    secondary = vrm['secondaryAnimation']
+    assert name(secondary['boneGroups'][0]['bones'][0]) == 'Hair' and secondary['boneGroups'][0]['center'] == -1
+    assert name(secondary['colliderGroups'][0]['node']) == 'Head'
+
+    # 元のglTFオブジェクトは変更しない
+    assert len(gltf['nodes']) == 9 and gltf['skins'][0]['joints'] == [1, 2, 3]
+
+
+def test_pruned_nodes_dangling():
+    # 存在しないノードへの参照は、省略できるものだけ削除する
+    gltf = node_gltf()
+    vrm = gltf['extensions']['VRM']
+    vrm['firstPerson']['firstPersonBone'] = 9
+    vrm['secondaryAnimation']['boneGroups'][0]['bones'] = [9, 3, 10]
+    vrm['humanoid']['humanBones'][1]['node'] = 11
+    gltf['skins'][0]['joints'] = [1, 12, 3]
+    pruned = pruned_nodes(gltf)
+    nodes = pruned['nodes']
+    vrm = pruned['extensions']['VRM']
+    assert 'firstPersonBone' not in vrm['firstPerson']
+    assert [nodes[n]['name'] for n in vrm['secondaryAnimation']['boneGroups'][0]['bones']] == ['Hair']
+    # 必須の参照、スキンのジョイントの位置は変えない(範囲外のまま残る)
+    assert [b['node'] for b in vrm['humanoid']['humanBones']] == [1, 11]
+    assert pruned['skins'][0]['joints'] == [1, 12, 3]
+    assert gltf['extensions']['VRM']['secondaryAnimation']['boneGroups'][0]['bones'] == [9, 3, 10]
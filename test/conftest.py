@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+
+import pytest
+
+import vrm.gltf
+import vrm.quantizer
+import vrm.reducer
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def backend(request, monkeypatch):
+    # NumPyがある場合とない場合(arrayで処理する)の両方で実行する
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        for module in [vrm.gltf, vrm.quantizer, vrm.reducer]:
+            monkeypatch.setattr(module, 'numpy', None)
+    return request.param
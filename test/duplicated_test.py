@@ -2,7 +2,7 @@
 
 import pytest
 
-from vrm.reducer import unique_vrm_materials, deduplicated_materials
+from vrm.reducer import unique_vrm_materials, deduplicated_materials, deduplicated_textures
 
 
 @pytest.mark.parametrize(
@@ -29,6 +29,48 @@ def test_unique_materials(src, dst):
     assert dict(unique_vrm_materials(src)) == dst
 
 
+@pytest.mark.parametrize(
+    "tolerance, dst", [
+        (None, {'mat1': 'mat1', 'mat2': 'mat2', 'mat3': 'mat3'}),
+        (0.001, {'mat1': 'mat1', 'mat2': 'mat1', 'mat3': 'mat3'})
+    ]
+)
+def test_unique_materials_tolerance(tolerance, dst):
+    src = [
+        {'name': 'mat1', 'floatProperties': {'_Cutoff': 0.5}, 'vectorProperties': {'_Color': [1, 0.5, 0.5, 1]}},
+        {'name': 'mat2', 'floatProperties': {'_Cutoff': 0.5}, 'vectorProperties': {'_Color': [1, 0.50001, 0.5, 1]}},
+        {'name': 'mat3', 'floatProperties': {'_Cutoff': 0.6}, 'vectorProperties': {'_Color': [1, 0.5, 0.5, 1]}}
+    ]
+    assert dict(unique_vrm_materials(src, tolerance)) == dst
+
+
+def test_unique_materials_tolerance_exact():
+    # 丸めるのは色、係数だけで、列挙値とrenderQueueは完全一致で比較する
+    src = [
+        {'name': 'mat1', 'renderQueue': 3000, 'floatProperties': {'_Cutoff': 0.5, '_BlendMode': 0},
+         'vectorProperties': {'_Color': [1, 1, 1, 1]}},
+        {'name': 'mat2', 'renderQueue': 3000, 'floatProperties': {'_Cutoff': 1.5, '_BlendMode': 0},
+         'vectorProperties': {'_Color': [2, 1, 1, 1]}},
+        {'name': 'mat3', 'renderQueue': 3001, 'floatProperties': {'_Cutoff': 0.5, '_BlendMode': 0},
+         'vectorProperties': {'_Color': [1, 1, 1, 1]}},
+        {'name': 'mat4', 'renderQueue': 3000, 'floatProperties': {'_Cutoff': 0.5, '_BlendMode': 1},
+         'vectorProperties': {'_Color': [1, 1, 1, 1]}}
+    ]
+    assert dict(unique_vrm_materials(src, 5)) == {'mat1': 'mat1', 'mat2': 'mat1', 'mat3': 'mat3', 'mat4': 'mat4'}
+
+
+def test_unique_materials_texture():
+    # テクスチャは別インスタンスでも内容が同じなら同じマテリアルとみなす
+    textures = [
+        {'source': {'bufferView': {'data': memoryview(b'image')}}, 'sampler': {}},
+        {'source': {'bufferView': {'data': b'image'}}, 'sampler': {}},
+        {'source': {'bufferView': {'data': b'other'}}, 'sampler': {}}
+    ]
+    src = [{'name': 'mat%d' % i, 'vectorProperties': {}, 'textureProperties': {'_MainTex': texture}}
+           for i, texture in enumerate(textures)]
+    assert dict(unique_vrm_materials(src)) == {'mat0': 'mat0', 'mat1': 'mat0', 'mat2': 'mat2'}
+
+
 @pytest.mark.parametrize(
     "src, dst", [
         (
@@ -100,3 +142,42 @@ def test_unique_materials(src, dst):
 )
 def test_deduplicated_materials(src, dst):
     assert deduplicated_materials(src) == dst
+
+
+def test_deduplicated_textures():
+    images = [
+        {'name': 'Shader_NoneBlack', 'mimeType': 'image/png', 'bufferView': {'data': b'black'}},
+        {'name': 'Shader_NoneBlack', 'mimeType': 'image/png', 'bufferView': {'data': b'black'}},
+        {'name': 'main', 'mimeType': 'image/png', 'bufferView': {'data': b'main'}}
+    ]
+    samplers = [{'magFilter': 9729}, {'magFilter': 9729}, {'magFilter': 9728}]
+    textures = [
+        {'source': images[0], 'sampler': samplers[0]},
+        {'source': images[1], 'sampler': samplers[1]},
+        {'source': images[2], 'sampler': samplers[0]},
+        {'source': images[2], 'sampler': samplers[2]}
+    ]
+    gltf = {
+        'images': images, 'samplers': samplers, 'textures': textures,
+        'materials': [{'name': 'mat', 'pbrMetallicRoughness': {'baseColorTexture': {'index': textures[1]}},
+                       'occlusionTexture': {'index': textures[1]}}],
+        'meshes': [],
+        'extensions': {'VRM': {'meta': {'texture': textures[3]}, 'materialProperties': [
+            {'name': 'mat', 'textureProperties': {'_MainTex': textures[2], '_EmissionMap': textures[1],
+                                                  '_SphereAdd': textures[0]}}
+        ]}}
+    }
+
+    deduplicated = deduplicated_textures(gltf)
+    new_textures = deduplicated['textures']
+    properties = deduplicated['extensions']['VRM']['materialProperties'][0]['textureProperties']
+    assert deduplicated['materials'][0]['pbrMetallicRoughness']['baseColorTexture']['index'] is new_textures[0]
+    assert deduplicated['materials'][0]['occlusionTexture']['index'] is new_textures[0]
+    assert properties['_EmissionMap'] is properties['_SphereAdd'] is new_textures[0]
+    assert properties['_MainTex'] is new_textures[2]
+    assert deduplicated['extensions']['VRM']['meta']['texture'] is new_textures[3]  # サンプラーが異なる
+    assert new_textures[1]['source'] is new_textures[0]['source']
+    assert new_textures[1]['sampler'] is new_textures[0]['sampler']
+
+    # 元のglTFオブジェクトは変更しない
+    assert textures[1]['source'] is images[1]
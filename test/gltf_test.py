@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+import struct
+from array import array
+
+import pytest
+
+import vrm.gltf
+from vrm.gltf import copy_gltf, reference_indexer, accessor_array, accessor_floats, set_accessor_array, \
+    create_accessor, narrow_indices, create_sparse_accessor, accessor_buffer_views, \
+    sparse_accessors
+
+
+def test_reference_indexer():
+    a, b, c = {'name': 'a'}, {'name': 'b'}, {'name': 'a'}
+    index = reference_indexer([a, b, c, a])
+    assert index(a) == 0  # 重複していれば先頭
+    assert index(b) == 1
+    assert index(c) == 2  # 同値でも別インスタンスは区別する
+    assert index({'name': 'b'}) == 1  # リストにないインスタンスは同値の要素
+
+
+def test_copy_gltf():
+    view = {'data': bytearray(b'abc')}
+    accessor = {'bufferView': view}
+    texture = {'source': {}}
+    material = {'name': 'mat', 'pbrMetallicRoughness': {'baseColorTexture': {'index': texture}}}
+    primitive = {'indices': accessor, 'material': material}
+    gltf = {
+        'asset': {}, 'bufferViews': [view], 'accessors': [accessor], 'textures': [texture],
+        'materials': [material], 'meshes': [{'primitives': [primitive]}]
+    }
+
+    copied = copy_gltf(gltf, 'materials')
+    new_material = copied['materials'][0]
+    new_primitive = copied['meshes'][0]['primitives'][0]
+    assert copied == gltf
+    assert new_material is not material
+    assert new_primitive is not primitive and new_primitive['material'] is new_material  # 参照元も複製
+    assert new_primitive['indices'] is accessor  # 変更しない要素は共有
+    assert new_material['pbrMetallicRoughness']['baseColorTexture']['index'] is texture
+    assert copied['accessors'] is not gltf['accessors']  # リストは複製
+    assert copied['asset'] is gltf['asset']
+
+    copied = copy_gltf(gltf)
+    assert copied == gltf
+    assert copied['accessors'][0] is not accessor
+    assert copied['bufferViews'][0]['data'] is view['data']  # バイナリデータは常に共有
+
+
+def test_accessor_array():
+    data = b'xxxx' + struct.pack('4H', 1, 2, 3, 4)
+    accessor = {'bufferView': {'data': data}, 'byteOffset': 4, 'componentType': 5123, 'type': 'VEC2', 'count': 2}
+    values = accessor_array(accessor)
+    assert isinstance(values, memoryview) and list(values) == [1, 2, 3, 4]
+
+    # byteStride
+    data = struct.pack('2fI2fI', 1, 2, 0, 3, 4, 0)
+    accessor = {'bufferView': {'data': data, 'byteStride': 12}, 'componentType': 5126, 'type': 'VEC2', 'count': 2}
+    assert list(accessor_array(accessor)) == [1, 2, 3, 4]
+
+
+def test_accessor_floats():
+    data = struct.pack('4B', 0, 255, 51, 0)
+    accessor = {'bufferView': {'data': data}, 'componentType': 5121, 'type': 'VEC2', 'count': 2, 'normalized': True}
+    assert list(accessor_floats(accessor)) == list(array('f', [0, 1, 0.2, 0]))
+    accessor['normalized'] = False
+    assert list(accessor_floats(accessor)) == [0, 255, 51, 0]
+
+
+def test_set_accessor_array():
+    # 同じ要素数はアクセッサーの範囲だけ書き換える
+    view = {'data': struct.pack('4f', 1, 2, 3, 4)}
+    accessor = {'bufferView': view, 'byteOffset': 8, 'componentType': 5126, 'type': 'SCALAR', 'count': 2,
+                'min': [3], 'max': [4]}
+    set_accessor_array(accessor, [5, 0])
+    assert view['data'] == struct.pack('4f', 1, 2, 5, 0)
+    assert (accessor['min'], accessor['max']) == ([0], [5])
+
+    # byteStride
+    view = {'data': struct.pack('2fI2fI', 1, 2, 7, 3, 4, 7), 'byteStride': 12}
+    accessor = {'bufferView': view, 'componentType': 5126, 'type': 'VEC2', 'count': 2}
+    set_accessor_array(accessor, [5, 6, 7, 8])
+    assert view['data'] == struct.pack('2fI2fI', 5, 6, 7, 7, 8, 7)
+
+    # 要素数、型の変更はbufferView全体を置き換える
+    view = {'data': struct.pack('3I', 0, 1, 2), 'byteLength': 12}
+    accessor = {'bufferView': view, 'byteOffset': 0, 'componentType': 5125, 'type': 'SCALAR', 'count': 3}
+    set_accessor_array(accessor, array('I', [2, 1, 0, 1]), 5123)
+    assert view == {'data': struct.pack('4H', 2, 1, 0, 1), 'byteLength': 8}
+    assert (accessor['componentType'], accessor['count']) == (5123, 4)
+
+
+def test_narrow_indices():
+    small = create_accessor([0, 1, 65534], 5125, 'SCALAR')
+    large = create_accessor([0, 1, 65535], 5125, 'SCALAR')
+    shared = create_accessor([0, 1, 2], 5125, 'SCALAR')
+    shared_view = dict(shared, byteOffset=4, count=2)  # 同じbufferViewの別範囲
+    primitives = [{'indices': accessor} for accessor in [small, small, large, shared, shared_view]]
+    gltf = {'meshes': [{'primitives': primitives}], 'accessors': [small, large, shared, shared_view]}
+
+    narrow_indices(gltf)
+    assert small['componentType'] == 5123
+    assert list(accessor_array(small)) == [0, 1, 65534]
+    assert small['bufferView']['byteLength'] == 6
+    assert large['componentType'] == 5125  # 65535はプリミティブリスタートに使われる
+    assert shared['componentType'] == shared_view['componentType'] == 5125
+
+
+@pytest.mark.parametrize("backend", ['numpy', 'array'])
+def test_sparse_accessor(backend, monkeypatch):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(vrm.gltf, 'numpy', None)
+
+    values = [0.0, 0.0, 0.0, 1.0, -2.0, 0.0] + [0.0] * 3 * 298 + [0.0, 0.0, 3.0]
+    accessor = create_sparse_accessor(values, 5126, 'VEC3', bounds=True)
+    assert 'bufferView' not in accessor
+    sparse = accessor['sparse']
+    assert sparse['count'] == 2 and sparse['indices']['componentType'] == 5123  # 要素番号300は8bitに収まらない
+    assert list(accessor_array(sparse_accessors(accessor)[0])) == [1, 300]
+    assert list(accessor_array(accessor)) == values
+    assert (accessor['min'], accessor['max']) == ([0.0, -2.0, 0.0], [1.0, 0.0, 3.0])
+    assert len(list(accessor_buffer_views(accessor))) == 2
+
+    # 全要素0ならsparseも持たない
+    zeros = create_sparse_accessor([0.0] * 6, 5126, 'VEC3')
+    assert 'sparse' not in zeros and list(accessor_array(zeros)) == [0.0] * 6
+    assert list(accessor_buffer_views(zeros)) == []
+
+
+def test_sparse_accessor_with_buffer_view():
+    # bufferViewの値をsparseの値で置き換える
+    accessor = create_accessor([1, 2, 3, 4], 5123, 'SCALAR')
+    view = accessor['bufferView']
+    accessor['sparse'] = create_sparse_accessor([0, 0, 9, 0], 5123, 'SCALAR')['sparse']
+    assert list(accessor_array(accessor)) == [1, 2, 9, 4]
+    assert list(accessor_buffer_views(accessor))[0] is view
+    assert bytes(view['data']) == struct.pack('4H', 1, 2, 3, 4)  # bufferViewのデータは変更しない
+
+    # 書き換えるとsparseを持たないアクセッサーになる
+    set_accessor_array(accessor, [5, 6, 7, 8])
+    assert 'sparse' not in accessor and list(accessor_array(accessor)) == [5, 6, 7, 8]
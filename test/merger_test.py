@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+from vrm.gltf import accessor_array, accessor_buffer_views, accessor_floats, create_accessor, FLOAT, UNSIGNED_BYTE, \
+    UNSIGNED_SHORT
+from vrm.merger import merged_skinned_meshes
+
+IDENTITY = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+
+def skinned_mesh(name, material, positions, joints, indices, targets=()):
+    attributes = {
+        'POSITION': create_accessor(positions, FLOAT, 'VEC3', bounds=True),
+        'JOINTS_0': create_accessor(joints, UNSIGNED_BYTE, 'VEC4')
+    }
+    primitive = {'mode': 4, 'material': material, 'attributes': attributes,
+                 'indices': create_accessor(indices, UNSIGNED_SHORT, 'SCALAR')}
+    mesh = {'name': name, 'primitives': [primitive]}
+    if targets:
+        primitive['targets'] = [{'POSITION': create_accessor(t, FLOAT, 'VEC3', bounds=True)} for t in targets]
+        mesh['weights'] = [0.0] * len(targets)
+        mesh['extras'] = {'targetNames': ['morph%d' % n for n in range(len(targets))]}
+    return mesh
+
+
+def skin(joints, skeleton=0):
+    return {'joints': joints, 'skeleton': skeleton,
+            'inverseBindMatrices': create_accessor(IDENTITY * len(joints), FLOAT, 'MAT4')}
+
+
+def make_gltf(flags):
+    material = {'name': 'mat'}
+    face = skinned_mesh('Face', material, [0, 0, 0, 1, 0, 0, 0, 1, 0], [0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0],
+                        [0, 1, 2], targets=[[0, 0, 1] * 3, [0, 1, 0] * 3])
+    body = skinned_mesh('Body', material, [0, 0, 0, 2, 0, 0, 0, 2, 0, 2, 2, 0], [0, 0, 0, 0, 1, 0, 0, 0] * 2,
+                        [0, 1, 2, 1, 3, 2])
+    meshes = [face, body]
+    skins = [skin([1, 2]), skin([2, 3])]
+    primitives = [p for m in meshes for p in m['primitives']]
+    accessors = [a for p in primitives for a in [p['indices']] + list(p['attributes'].values())]
+    accessors += [t['POSITION'] for p in primitives for t in p.get('targets', [])]
+    accessors += [s['inverseBindMatrices'] for s in skins]
+    return {
+        'materials': [material], 'meshes': meshes, 'skins': skins,
+        'accessors': accessors, 'bufferViews': [a['bufferView'] for a in accessors],
+        'nodes': [{'name': 'Root'}, {'name': 'J1'}, {'name': 'J2'}, {'name': 'J3'},
+                  {'name': 'Face', 'mesh': face, 'skin': skins[0]}, {'name': 'Body', 'mesh': body, 'skin': skins[1]}],
+        'extensions': {'VRM': {
+            'blendShapeMaster': {'blendShapeGroups': [
+                {'name': 'A', 'binds': [{'mesh': face, 'index': 1, 'weight': 100}]}
+            ]},
+            'firstPerson': {'meshAnnotations': [{'mesh': face, 'firstPersonFlag': flags[0]},
+                                                {'mesh': body, 'firstPersonFlag': flags[1]}]}
+        }}
+    }
+
+
+def test_merged_skinned_meshes():
+    gltf = make_gltf(['Auto', 'Auto'])
+    merged = merged_skinned_meshes(gltf)
+
+    assert len(merged['meshes']) == 1 and len(merged['skins']) == 1
+    mesh, new_skin = merged['meshes'][0], merged['skins'][0]
+    nodes = merged['nodes']
+    assert nodes[4]['mesh'] is mesh and nodes[4]['skin'] is new_skin
+    assert 'mesh' not in nodes[5] and 'skin' not in nodes[5]
+
+    # ジョイントの統合と番号の振り直し
+    assert new_skin['joints'] == [1, 2, 3]
+    assert list(accessor_floats(new_skin['inverseBindMatrices'])) == IDENTITY * 3
+    primitives = mesh['primitives']
+    joints = accessor_array(primitives[0]['attributes']['JOINTS_0'])
+    assert list(joints[::4]) == [0, 1, 0, 1, 2, 1, 2]
+
+    # 頂点の連結とインデックスの変換
+    assert primitives[0]['attributes']['POSITION']['count'] == 7
+    assert primitives[0]['attributes']['POSITION']['max'] == [2, 2, 0]
+    assert list(accessor_array(primitives[0]['indices'])) == [0, 1, 2]
+    assert list(accessor_array(primitives[1]['indices'])) == [3, 4, 5, 4, 6, 5]
+
+    # モーフターゲットはターゲットを持たない頂点を0で埋める
+    assert mesh['weights'] == [0.0, 0.0]
+    assert mesh['extras']['targetNames'] == ['morph0', 'morph1']
+    assert list(accessor_floats(primitives[1]['targets'][0]['POSITION'])) == [0, 0, 1] * 3 + [0, 0, 0] * 4
+    # 0で埋めた頂点はsparseアクセッサーで持たない
+    target = primitives[1]['targets'][0]['POSITION']
+    assert 'bufferView' not in target and target['sparse']['count'] == 3
+    assert all(view in merged['bufferViews'] for view in accessor_buffer_views(target))
+
+    # VRMのメッシュ参照
+    vrm = merged['extensions']['VRM']
+    bind = vrm['blendShapeMaster']['blendShapeGroups'][0]['binds'][0]
+    assert bind['mesh'] is mesh and bind['index'] == 1
+    assert vrm['firstPerson']['meshAnnotations'] == [{'mesh': mesh, 'firstPersonFlag': 'Auto'}]
+
+    # 元のglTFオブジェクトは変更しない
+    assert len(gltf['meshes']) == 2 and gltf['nodes'][5]['mesh'] is gltf['meshes'][1]
+
+
+def test_merged_skinned_meshes_first_person():
+    # 一人称表示の設定が異なるメッシュは統合しない
+    merged = merged_skinned_meshes(make_gltf(['FirstPersonOnly', 'Auto']))
+    assert [m['name'] for m in merged['meshes']] == ['Face', 'Body']
+    assert len(merged['skins']) == 2
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+import random
+
+import pytest
+
+from vrm.debug import count_vertices
+from vrm.gltf import accessor_array, accessor_buffer_views, accessor_floats, create_accessor, FLOAT, UNSIGNED_SHORT
+from vrm.debug import cache_miss_ratio
+from vrm.optimizer import compacted_vertices, count_cache_misses, tipsified_triangles, optimized_vertex_cache, \
+    sparse_morph_targets
+
+
+def make_gltf():
+    positions = create_accessor([float(v) for v in range(15)], FLOAT, 'VEC3', bounds=True)
+    target = create_accessor([0.0] * 14 + [1.0], FLOAT, 'VEC3', bounds=True)
+    primitives = [
+        {'attributes': {'POSITION': positions}, 'targets': [{'POSITION': target}],
+         'indices': create_accessor(indices, UNSIGNED_SHORT, 'SCALAR')}
+        for indices in [[4, 2, 3], [3, 2, 0]]
+    ]
+    accessors = [positions, target] + [p['indices'] for p in primitives]
+    return {'meshes': [{'primitives': primitives}], 'accessors': accessors,
+            'bufferViews': [a['bufferView'] for a in accessors]}
+
+
+@pytest.mark.parametrize(
+    "reorder, positions, indices, moved", [
+        (False, [0, 1, 2, 6, 7, 8, 9, 10, 11, 12, 13, 14], [[3, 1, 2], [2, 1, 0]], 3),
+        (True, [12, 13, 14, 6, 7, 8, 9, 10, 11, 0, 1, 2], [[0, 1, 2], [2, 1, 3]], 0)
+    ]
+)
+def test_compacted_vertices(backend, reorder, positions, indices, moved):
+    gltf = make_gltf()
+    compacted = compacted_vertices(gltf, reorder)
+
+    primitives = compacted['meshes'][0]['primitives']
+    new_positions = primitives[0]['attributes']['POSITION']
+    assert primitives[1]['attributes']['POSITION'] is new_positions
+    assert list(accessor_floats(new_positions)) == positions
+    assert (new_positions['min'], new_positions['max']) == ([0, 1, 2], [12, 13, 14])
+    assert [list(accessor_array(p['indices'])) for p in primitives] == indices
+    assert primitives[0]['indices']['componentType'] == UNSIGNED_SHORT
+    target = primitives[0]['targets'][0]['POSITION']
+    assert list(accessor_floats(target)[moved * 3:moved * 3 + 3]) == [0.0, 0.0, 1.0]  # 頂点4のモーフターゲット
+    assert count_vertices(compacted) == 4
+
+    # 元のglTFオブジェクトは変更しない
+    assert count_vertices(gltf) == 5
+
+
+def test_compacted_vertices_sparse():
+    # sparseのモーフターゲットはsparseのまま詰める
+    gltf = sparse_morph_targets(make_gltf())
+    compacted = compacted_vertices(gltf)
+    target = compacted['meshes'][0]['primitives'][0]['targets'][0]['POSITION']
+    assert 'bufferView' not in target and target['sparse']['count'] == 1
+    assert list(accessor_floats(target)) == [0.0] * 9 + [0.0, 0.0, 1.0]
+    assert all(view in compacted['bufferViews'] for view in accessor_buffer_views(target))
+
+
+def test_compacted_vertices_unchanged():
+    gltf = make_gltf()
+    gltf['meshes'][0]['primitives'][0]['indices'] = create_accessor([0, 1, 2, 3, 4], UNSIGNED_SHORT, 'SCALAR')
+    compacted = compacted_vertices(gltf)
+    assert compacted['accessors'] == gltf['accessors']
+
+
+def shuffled_grid(n):
+    # n x n頂点の格子の三角形をランダムな順番で並べる
+    triangles = []
+    for y in range(n - 1):
+        for x in range(n - 1):
+            a = y * n + x
+            triangles += [(a, a + 1, a + n), (a + 1, a + n + 1, a + n)]
+    random.Random(0).shuffle(triangles)
+    return [v for t in triangles for v in t]
+
+
+def triangle_set(indices):
+    return sorted(tuple(indices[n:n + 3]) for n in range(0, len(indices), 3))
+
+
+@pytest.mark.parametrize(
+    "indices, cache_size, misses", [
+        ([0, 1, 2, 2, 1, 3], 16, 4),
+        ([0, 1, 2, 3, 4, 5, 0, 1, 2], 4, 9),  # FIFOから追い出された頂点は再度変換する
+        ([], 16, 0)
+    ]
+)
+def test_count_cache_misses(indices, cache_size, misses):
+    assert count_cache_misses(indices, cache_size) == misses
+
+
+def test_tipsified_triangles():
+    indices = shuffled_grid(20)
+    optimized = tipsified_triangles(indices, 400)
+    # 三角形(頂点の順番を含む)は変えずに並びだけを変える
+    assert triangle_set(optimized) == triangle_set(indices)
+    assert count_cache_misses(optimized) * 2 < count_cache_misses(indices)
+    assert list(tipsified_triangles([], 0)) == []
+
+
+def test_optimized_vertex_cache():
+    indices = create_accessor(shuffled_grid(10), UNSIGNED_SHORT, 'SCALAR')
+    positions = create_accessor([0.0] * 300, FLOAT, 'VEC3')
+    gltf = {'meshes': [{'primitives': [{'attributes': {'POSITION': positions}, 'indices': indices}]}],
+            'accessors': [positions, indices], 'bufferViews': [positions['bufferView'], indices['bufferView']]}
+
+    optimized = compacted_vertices(optimized_vertex_cache(gltf), reorder=True)
+    new_indices = accessor_array(optimized['meshes'][0]['primitives'][0]['indices'])
+    assert cache_miss_ratio(optimized) < cache_miss_ratio(gltf)
+    assert len(triangle_set(new_indices)) == len(triangle_set(accessor_array(indices)))
+    # 頂点は参照順に並ぶ
+    first_use = list(dict.fromkeys(new_indices))
+    assert first_use == list(range(100))
+
+
+def test_optimized_vertex_cache_blended():
+    # 半透明のマテリアルのプリミティブは三角形の描画順を変えない
+    indices = create_accessor(shuffled_grid(10), UNSIGNED_SHORT, 'SCALAR')
+    positions = create_accessor([0.0] * 300, FLOAT, 'VEC3')
+    materials = [{'name': 'glTF', 'alphaMode': 'BLEND'}, {'name': 'VRM'}]
+    gltf = {'meshes': [{'primitives': [{'attributes': {'POSITION': positions}, 'indices': indices, 'material': m}
+                                       for m in materials]}],
+            'materials': materials, 'accessors': [positions, indices],
+            'bufferViews': [positions['bufferView'], indices['bufferView']],
+            'extensions': {'VRM': {'materialProperties': [
+                {'name': 'VRM', 'keywordMap': {'_ALPHABLEND_ON': True}, 'tagMap': {'RenderType': 'Transparent'}}
+            ]}}}
+
+    optimized = optimized_vertex_cache(gltf)
+    assert all(p['indices'] is indices for p in optimized['meshes'][0]['primitives'])
+
+
+def test_sparse_morph_targets(backend):
+    # 100頂点のうち2頂点だけが動くモーフターゲットと、全頂点が動くモーフターゲット
+    deltas = [0.0] * 300
+    deltas[4], deltas[8] = 0.5, 0.25
+    sparse_target = create_accessor(deltas, FLOAT, 'VEC3', bounds=True)
+    dense_target = create_accessor([0.1] * 300, FLOAT, 'VEC3', bounds=True)
+    positions = create_accessor([0.0] * 300, FLOAT, 'VEC3', bounds=True)
+    primitives = [{'attributes': {'POSITION': positions},
+                   'targets': [{'POSITION': sparse_target}, {'POSITION': dense_target}]} for _ in range(2)]
+    accessors = [positions, sparse_target, dense_target]
+    gltf = {'meshes': [{'primitives': primitives}], 'accessors': accessors,
+            'bufferViews': [a['bufferView'] for a in accessors]}
+
+    converted = sparse_morph_targets(gltf)
+    targets = converted['meshes'][0]['primitives'][0]['targets']
+    accessor = targets[0]['POSITION']
+    assert 'bufferView' not in accessor and accessor['sparse']['count'] == 2
+    assert list(accessor_floats(accessor)) == deltas
+    assert (accessor['min'], accessor['max']) == ([0.0, 0.0, 0.0], [0.0, 0.5, 0.25])
+    assert converted['meshes'][0]['primitives'][1]['targets'][0]['POSITION'] is accessor  # 1回だけ変換する
+    assert targets[1]['POSITION'] is dense_target  # sparseにしても小さくならない
+    assert count_vertices(converted) == 100
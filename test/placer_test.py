@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.placer import atlas_layout, packed_positions, power_of_two_sizes
+
+
+def test_power_of_two_sizes():
+    assert power_of_two_sizes((128, 64), (512, 256), 128 * 128) == [(128, 128), (256, 64), (256, 128), (128, 256),
+                                                                    (512, 64), (256, 256), (512, 128), (512, 256)]
+
+
+@pytest.mark.parametrize(
+    "sizes, atlas_size", [
+        ([(1024, 1024), (512, 512), (512, 512), (512, 256), (512, 256), (512, 512)], (2048, 1024)),
+        ([(300, 200), (200, 300), (100, 100), (250, 250)], (512, 512)),
+    ]
+)
+def test_packed_positions(sizes, atlas_size):
+    positions = packed_positions(sizes, atlas_size)
+    rects = [(x, y, w, h) for (x, y), (w, h) in zip(positions, sizes)]
+    # アトラスの範囲内に重ならずに配置する
+    assert all(0 <= x and 0 <= y and x + w <= atlas_size[0] and y + h <= atlas_size[1] for x, y, w, h in rects)
+    for n, (x1, y1, w1, h1) in enumerate(rects):
+        for x2, y2, w2, h2 in rects[n + 1:]:
+            assert x1 + w1 <= x2 or x2 + w2 <= x1 or y1 + h1 <= y2 or y2 + h2 <= y1
+
+
+def test_packed_positions_overflow():
+    assert packed_positions([(512, 512), (512, 512), (512, 512)], (1024, 512)) is None
+
+
+@pytest.mark.parametrize(
+    "sizes, priorities, max_size, atlas_size, placed", [
+        # 収まる最小の2のべき乗のサイズ
+        ({'a': (128, 128), 'b': (128, 128), 'c': (128, 128)}, {}, (2048, 2048),
+         (256, 256), {'a': (128, 128), 'b': (128, 128), 'c': (128, 128)}),
+        ({'a': (1024, 1024), 'b': (1024, 512), 'c': (1024, 512)}, {}, (2048, 2048),
+         (2048, 1024), {'a': (1024, 1024), 'b': (1024, 512), 'c': (1024, 512)}),
+        # 上限に収まらなければ大きいテクスチャから縮小する
+        ({'a': (2048, 2048), 'b': (1024, 1024)}, {}, (2048, 2048),
+         (2048, 1024), {'a': (1024, 1024), 'b': (1024, 1024)}),
+        # 優先度の高いテクスチャは縮小されにくい
+        ({'a': (1024, 1024), 'b': (1024, 1024), 'c': (1024, 1024)}, {'a': 1}, (1024, 1024),
+         (1024, 1024), {'a': (512, 512), 'b': (512, 512), 'c': (512, 512)}),
+        ({'a': (1024, 1024), 'b': (1024, 1024), 'c': (1024, 1024)}, {'a': 1}, (1024, 2048),
+         (1024, 2048), {'a': (1024, 1024), 'b': (512, 512), 'c': (512, 512)}),
+    ]
+)
+def test_atlas_layout(sizes, priorities, max_size, atlas_size, placed):
+    layout = atlas_layout(sizes, priorities, max_size)
+    assert layout['size'] == atlas_size
+    assert {name: info['size'] for name, info in layout['place'].items()} == placed
+
+
+def test_atlas_layout_empty():
+    assert atlas_layout({}, {}, (2048, 2048)) is None
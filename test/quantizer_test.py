@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.gltf import accessor_array, accessor_floats, create_accessor, FLOAT, UNSIGNED_BYTE, UNSIGNED_SHORT
+from vrm.quantizer import quantized_weights, quantized_meshes, BYTE, SHORT, EXTENSION_NAME
+
+
+@pytest.mark.parametrize(
+    "weights, quantized", [
+        ([1.0, 0.0, 0.0, 0.0], [255, 0, 0, 0]),
+        ([0.5, 0.5, 0.0, 0.0], [127, 128, 0, 0]),  # 128 + 128 = 256を最初の最大のウェイトで合わせる
+        ([0.2, 0.3, 0.2, 0.3], [51, 77, 51, 76]),
+        ([0.0, 0.0, 0.0, 0.0], [0, 0, 0, 0])
+    ]
+)
+def test_quantized_weights(weights, quantized):
+    assert quantized_weights(weights) == quantized
+
+
+def make_gltf(uv, delta):
+    attributes = {
+        'POSITION': create_accessor([0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0], FLOAT, 'VEC3', bounds=True),
+        'NORMAL': create_accessor([0.0, 0.0, 1.0, 0.0, 0.6, 0.8, -1.0, 0.0, 0.0], FLOAT, 'VEC3'),
+        'TEXCOORD_0': create_accessor([0.0, 0.0, 1.0, 0.0, 0.0, uv], FLOAT, 'VEC2'),
+        'JOINTS_0': create_accessor([0, 1, 0, 0] * 3, UNSIGNED_SHORT, 'VEC4'),
+        'WEIGHTS_0': create_accessor([0.7, 0.3, 0.0, 0.0] * 3, FLOAT, 'VEC4'),
+    }
+    target = {'POSITION': create_accessor([0.0, 0.0, delta] * 3, FLOAT, 'VEC3', bounds=True)}
+    indices = create_accessor([0, 1, 2], UNSIGNED_SHORT, 'SCALAR')
+    primitives = [{'attributes': dict(attributes), 'targets': [dict(target)], 'indices': indices} for _ in range(2)]
+    accessors = list(attributes.values()) + list(target.values()) + [indices]
+    return {'meshes': [{'primitives': primitives}], 'accessors': accessors,
+            'bufferViews': [a['bufferView'] for a in accessors], 'extensionsUsed': ['VRM']}
+
+
+def test_quantized_meshes(backend):
+    gltf = make_gltf(1.0, 0.5)
+    quantized = quantized_meshes(gltf)
+    primitives = quantized['meshes'][0]['primitives']
+    attributes, target = primitives[0]['attributes'], primitives[0]['targets'][0]
+
+    # 位置座標は変換しない
+    assert attributes['POSITION'] is gltf['accessors'][0]
+
+    # 法線はBYTEで4バイト境界に揃える
+    normal = attributes['NORMAL']
+    assert (normal['componentType'], normal['normalized']) == (BYTE, True)
+    assert normal['bufferView']['byteStride'] == 4
+    assert list(accessor_array(normal)) == [0, 0, 127, 0, 76, 102, -127, 0, 0]
+    assert list(accessor_floats(normal)) == pytest.approx([0.0, 0.0, 1.0, 0.0, 0.6, 0.8, -1.0, 0.0, 0.0], abs=0.005)
+
+    assert attributes['TEXCOORD_0']['componentType'] == UNSIGNED_SHORT
+    assert list(accessor_array(attributes['TEXCOORD_0'])) == [0, 0, 65535, 0, 0, 65535]
+    assert attributes['JOINTS_0']['componentType'] == UNSIGNED_BYTE
+    assert list(accessor_array(attributes['WEIGHTS_0'])) == [178, 77, 0, 0] * 3
+
+    # モーフターゲットはSHORT、min、maxは格納した整数値
+    position = target['POSITION']
+    assert (position['componentType'], position['bufferView']['byteStride']) == (SHORT, 8)
+    assert list(accessor_array(position)) == [0, 0, 16384] * 3
+    assert position['max'] == [0, 0, 16384]
+
+    # 共有しているアクセッサーは1回だけ変換する
+    assert primitives[1]['attributes']['NORMAL'] is normal and primitives[1]['targets'][0]['POSITION'] is position
+    assert quantized['extensionsUsed'] == ['VRM', EXTENSION_NAME]
+    assert quantized['extensionsRequired'] == [EXTENSION_NAME]
+
+    # 元のglTFオブジェクトは変更しない
+    assert gltf['meshes'][0]['primitives'][0]['attributes']['NORMAL']['componentType'] == FLOAT
+    assert gltf['extensionsUsed'] == ['VRM'] and 'extensionsRequired' not in gltf
+
+
+def test_quantized_meshes_out_of_range():
+    # 0～1の範囲外のUV、-1～1の範囲外のモーフターゲットは実数のまま
+    quantized = quantized_meshes(make_gltf(2.0, 1.5))
+    primitive = quantized['meshes'][0]['primitives'][0]
+    assert primitive['attributes']['TEXCOORD_0']['componentType'] == FLOAT
+    assert primitive['targets'][0]['POSITION']['componentType'] == FLOAT
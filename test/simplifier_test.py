@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.gltf import accessor_array, create_accessor, FLOAT, UNSIGNED_SHORT
+from vrm.simplifier import Simplifier, simplified_meshes, face_normal
+
+
+def grid(n):
+    # n x n頂点の平面(z=0)、法線は+z方向
+    positions = [(float(x), float(y), 0.0) for y in range(n) for x in range(n)]
+    triangles = []
+    for y in range(n - 1):
+        for x in range(n - 1):
+            a = y * n + x
+            triangles += [[a, a + 1, a + n], [a + 1, a + n + 1, a + n]]
+    return positions, triangles
+
+
+def area(positions, triangles):
+    return sum(face_normal(*(positions[v] for v in t))[2] / 2 for t in triangles)
+
+
+def test_simplify_plane():
+    positions, triangles = grid(5)
+    simplifier = Simplifier(positions, triangles, [0] * len(triangles))
+    remains = [t for _, t in simplifier.simplify(0)]
+
+    # 境界の頂点は残して内側の頂点だけを削除する
+    used = {v for t in remains for v in t}
+    assert used == {v for v, (x, y, _) in enumerate(positions) if x in (0, 4) or y in (0, 4)}
+    assert simplifier.vertex_count() == 16
+    # 裏返った三角形がなく、面積が変わらない
+    assert all(face_normal(*(positions[v] for v in t))[2] > 0 for t in remains)
+    assert area(positions, remains) == pytest.approx(16.0)
+
+
+def test_simplify_locked():
+    positions, triangles = grid(4)
+    # 内側の頂点5, 6にUVの継ぎ目(同じ位置の頂点16, 17)、9, 10に複数のマテリアル
+    positions += [positions[5], positions[6]]
+    for triangle in triangles[6:]:
+        triangle[:] = [{5: 16, 6: 17}.get(v, v) for v in triangle]
+    groups = [0] * len(triangles)
+    groups[triangles.index([9, 10, 13])] = 1
+    simplifier = Simplifier(positions, triangles, groups)
+    simplifier.simplify(0)
+    assert simplifier.vertex_count() == 18
+
+
+def test_simplify_morph():
+    positions, triangles = grid(4)
+    # 内側の頂点のうち5だけがモーフで動く
+    deltas = [0.0] * len(positions) * 3
+    deltas[5 * 3 + 2] = 0.1
+    simplifier = Simplifier(positions, triangles, [0] * len(triangles), [deltas])
+    remains = [t for _, t in simplifier.simplify(0)]
+    assert 5 in {v for t in remains for v in t}
+
+
+@pytest.mark.parametrize(
+    "conf, vertex_count", [
+        ({'Hair': 0.5}, 16),  # 境界の頂点は残る
+        ({'Hair': 20}, 20),
+        ({'Body': 0.5}, 25),
+        ({}, 25)
+    ]
+)
+def test_simplified_meshes(conf, vertex_count):
+    positions, triangles = grid(5)
+    indices = create_accessor([v for t in triangles for v in t], UNSIGNED_SHORT, 'SCALAR')
+    attributes = {'POSITION': create_accessor([c for p in positions for c in p], FLOAT, 'VEC3', bounds=True)}
+    gltf = {
+        'meshes': [{'name': 'Hair001.baked', 'primitives': [{'attributes': attributes, 'indices': indices}]}],
+        'accessors': [attributes['POSITION'], indices],
+        'bufferViews': [attributes['POSITION']['bufferView'], indices['bufferView']]
+    }
+    simplified = simplified_meshes(gltf, conf)
+    new_indices = simplified['meshes'][0]['primitives'][0]['indices']
+    assert len(set(accessor_array(new_indices))) == vertex_count
+    assert new_indices['componentType'] == UNSIGNED_SHORT
+    assert len(set(accessor_array(gltf['meshes'][0]['primitives'][0]['indices']))) == 25  # 元のglTFは変更しない
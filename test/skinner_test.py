@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.gltf import accessor_array, accessor_floats, create_accessor, FLOAT, UNSIGNED_BYTE
+from vrm.skinner import limited_influences, reduced_skins
+
+
+@pytest.mark.parametrize(
+    "influences, max_influences, min_weight, limited", [
+        ([(1, 0.5), (2, 0.5), (0, 0.0), (0, 0.0)], 4, 0.0, [(1, 0.5), (2, 0.5)]),
+        ([(1, 0.25), (2, 0.75), (0, 0.0), (0, 0.0)], 1, 0.0, [(2, 1.0)]),  # 大きい方を残して正規化
+        ([(1, 0.5), (2, 0.375), (3, 0.125), (0, 0.0)], 2, 0.0, [(1, 0.5 / 0.875), (2, 0.375 / 0.875)]),
+        ([(1, 0.75), (2, 0.125), (3, 0.125), (0, 0.0)], 4, 0.2, [(1, 1.0)]),
+        ([(3, 0.5), (1, 0.25), (3, 0.25), (0, 0.0)], 4, 0.0, [(3, 0.75), (1, 0.25)]),  # 同じジョイントはまとめる
+        ([(0, 0.0)] * 4, 4, 0.0, [])
+    ]
+)
+def test_limited_influences(influences, max_influences, min_weight, limited):
+    assert limited_influences(influences, max_influences, min_weight) == pytest.approx(limited)
+
+
+def make_gltf():
+    # ジョイント(ノード1～4)のうちノード2はウェイトを持たないヒューマノイドのボーン
+    attributes = {
+        'POSITION': create_accessor([0.0] * 6, FLOAT, 'VEC3'),
+        'JOINTS_0': create_accessor([0, 2, 1, 0, 3, 0, 0, 0], UNSIGNED_BYTE, 'VEC4'),
+        'WEIGHTS_0': create_accessor([0.75, 0.25, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0], FLOAT, 'VEC4'),
+        'JOINTS_1': create_accessor([0] * 8, UNSIGNED_BYTE, 'VEC4'),
+        'WEIGHTS_1': create_accessor([0.0] * 8, FLOAT, 'VEC4'),
+    }
+    ibm = create_accessor([float(n) for n in range(4) for _ in range(16)], FLOAT, 'MAT4')
+    skin = {'joints': [1, 2, 3, 4], 'inverseBindMatrices': ibm}
+    mesh = {'primitives': [{'attributes': dict(attributes)} for _ in range(2)]}
+    accessors = list(attributes.values()) + [ibm]
+    return {
+        'meshes': [mesh], 'skins': [skin], 'accessors': accessors,
+        'bufferViews': [a['bufferView'] for a in accessors],
+        'nodes': [{'children': [1]}, {}, {}, {}, {}, {'mesh': mesh, 'skin': skin}],
+        'extensions': {'VRM': {'humanoid': {'humanBones': [{'bone': 'hips', 'node': 1}, {'bone': 'spine', 'node': 2}]}}}
+    }
+
+
+@pytest.mark.parametrize(
+    "max_influences, joints, matrices, joint_values, weights", [
+        (4, [1, 2, 3, 4], [0.0, 1.0, 2.0, 3.0], [0, 2, 0, 0, 3, 0, 0, 0], [0.75, 0.25, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0]),
+        (1, [1, 2, 4], [0.0, 1.0, 3.0], [0, 0, 0, 0, 2, 0, 0, 0], [1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0]),
+    ]
+)
+def test_reduced_skins(max_influences, joints, matrices, joint_values, weights):
+    gltf = make_gltf()
+    gltf['skins'][0]['joints'].append(5)  # どの頂点にも影響しないジョイント
+    gltf['skins'][0]['inverseBindMatrices'] = create_accessor([float(n) for n in range(5) for _ in range(16)],
+                                                              FLOAT, 'MAT4')
+    reduced = reduced_skins(gltf, max_influences)
+
+    skin = reduced['skins'][0]
+    assert skin['joints'] == joints
+    assert list(accessor_floats(skin['inverseBindMatrices'])[::16]) == matrices
+    assert reduced['nodes'][5]['skin'] is skin
+    for primitive in reduced['meshes'][0]['primitives']:
+        attributes = primitive['attributes']
+        assert sorted(attributes) == ['JOINTS_0', 'POSITION', 'WEIGHTS_0']  # 使わない組は削除する
+        assert list(accessor_array(attributes['JOINTS_0'])) == joint_values
+        assert attributes['JOINTS_0']['componentType'] == UNSIGNED_BYTE
+        assert list(accessor_floats(attributes['WEIGHTS_0'])) == weights
+
+    # 元のglTFオブジェクトは変更しない
+    assert gltf['skins'][0]['joints'] == [1, 2, 3, 4, 5]
+    assert 'JOINTS_1' in gltf['meshes'][0]['primitives'][0]['attributes']
+
+
+def test_reduced_skins_shared_mesh():
+    # 複数のスキンで使われているメッシュのスキンは変更しない
+    gltf = make_gltf()
+    gltf['skins'].append(dict(gltf['skins'][0]))
+    gltf['nodes'].append({'mesh': gltf['meshes'][0], 'skin': gltf['skins'][1]})
+    reduced = reduced_skins(gltf, 1)
+    assert [s['joints'] for s in reduced['skins']] == [[1, 2, 3, 4]] * 2
+    assert 'JOINTS_1' in reduced['meshes'][0]['primitives'][0]['attributes']
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.debug import spring_bone_cost
+from vrm.gltf import accessor_array, accessor_floats, create_accessor, FLOAT, UNSIGNED_BYTE
+from vrm.spring import budgeted_colliders, merged_collider, reduced_spring_bones
+
+
+def collider(x, radius):
+    return {'offset': {'x': x, 'y': 0.0, 'z': 0.0}, 'radius': radius}
+
+
+def make_gltf(bones=(2,), collider_groups=(0,)):
+    # ノード0(頭) -> 1 -> 2 -> 3 -> 4 の髪のチェーン、ノード5はスキンメッシュ
+    # ノード6(頭の子)はウェイトを持たない、物を取り付けるためのジョイント
+    attributes = {
+        'POSITION': create_accessor([0.0] * 9, FLOAT, 'VEC3'),
+        'JOINTS_0': create_accessor([0, 0, 0, 0, 1, 2, 0, 0, 3, 0, 0, 0], UNSIGNED_BYTE, 'VEC4'),
+        'WEIGHTS_0': create_accessor([1.0, 0.0, 0.0, 0.0, 0.5, 0.5, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0], FLOAT, 'VEC4'),
+    }
+    ibm = create_accessor([float(n) for n in range(6) for _ in range(16)], FLOAT, 'MAT4')
+    skin = {'joints': [0, 1, 2, 3, 4, 6], 'inverseBindMatrices': ibm}
+    mesh = {'primitives': [{'attributes': dict(attributes)}]}
+    accessors = list(attributes.values()) + [ibm]
+    return {
+        'meshes': [mesh], 'skins': [skin], 'accessors': accessors,
+        'bufferViews': [a['bufferView'] for a in accessors],
+        'nodes': [{'children': [1, 6]}, {'children': [2]}, {'children': [3]}, {'children': [4]}, {},
+                  {'mesh': mesh, 'skin': skin}, {}],
+        'extensions': {'VRM': {
+            'humanoid': {'humanBones': [{'bone': 'head', 'node': 0}]},
+            'secondaryAnimation': {
+                'boneGroups': [{'comment': 'hair', 'center': -1, 'bones': list(bones),
+                                'colliderGroups': list(collider_groups)}],
+                'colliderGroups': [{'node': 0, 'colliders': [collider(0.0, 0.1), collider(0.1, 0.1)]},
+                                   {'node': 0, 'colliders': [collider(0.0, 0.2)]}]
+            }
+        }}
+    }
+
+
+def test_spring_bone_cost():
+    # ノード1～4が揺れ、2つのコライダーと衝突判定する
+    assert spring_bone_cost(make_gltf([1])) == 4 * (1 + 2)
+    assert spring_bone_cost(make_gltf([1, 3], [0, 1])) == 6 * (1 + 3)
+
+
+@pytest.mark.parametrize(
+    "collider1, collider2, merged", [
+        (collider(0.0, 0.1), collider(0.1, 0.1), collider(0.05, 0.15)),
+        (collider(0.0, 0.3), collider(0.1, 0.1), collider(0.0, 0.3)),  # 包まれている球は統合先の球のまま
+        (collider(0.0, 0.1), collider(0.0, 0.2), collider(0.0, 0.2)),
+    ]
+)
+def test_merged_collider(collider1, collider2, merged):
+    result = merged_collider(collider1, collider2)
+    assert result['radius'] == pytest.approx(merged['radius'])
+    assert [result['offset'][k] for k in 'xyz'] == pytest.approx([merged['offset'][k] for k in 'xyz'])
+
+
+def test_budgeted_colliders():
+    groups = [{'colliders': [collider(0.0, 0.1), collider(1.0, 0.1), collider(0.05, 0.1)]},
+              {'colliders': [collider(0.0, 0.05)]}]
+    budgeted_colliders(groups, 3)
+    # 統合による半径の増加が最も小さい2つのコライダーを統合する
+    assert [c['radius'] for c in groups[0]['colliders']] == pytest.approx([0.125, 0.1])
+    assert len(groups[1]['colliders']) == 1
+
+    budgeted_colliders(groups, 1)
+    # 統合できなくなったら半径の小さいコライダーから削除する
+    assert [len(g['colliders']) for g in groups] == [1, 0]
+
+
+def test_budgeted_colliders_growth():
+    # 中心が近い2つより、大きい球に含まれる小さい球を優先して統合する
+    groups = [{'colliders': [collider(0.0, 1.0), collider(0.5, 0.1), collider(2.0, 0.1), collider(2.05, 0.1)]}]
+    budgeted_colliders(groups, 3)
+    assert [c['radius'] for c in groups[0]['colliders']] == pytest.approx([1.0, 0.1, 0.1])
+
+
+def test_budgeted_colliders_negative():
+    # 負の上限は0とみなして全て削除する
+    groups = [{'colliders': [collider(0.0, 0.1)]}, {'colliders': [collider(1.0, 0.1)]}]
+    budgeted_colliders(groups, -1)
+    assert [len(g['colliders']) for g in groups] == [0, 0]
+
+
+def test_reduced_spring_bones_chain():
+    gltf = make_gltf([1])
+    reduced = reduced_spring_bones(gltf, max_chain_length=2)
+
+    # ノード3、4のウェイトをノード2に移して、ノード2から切り離す
+    assert 'children' not in reduced['nodes'][2]
+    # ウェイトを移していないジョイント(ノード6)はウェイトがなくても残す
+    skin = reduced['skins'][0]
+    assert skin['joints'] == [0, 1, 2, 6]
+    assert list(accessor_floats(skin['inverseBindMatrices'])[::16]) == [0.0, 1.0, 2.0, 5.0]
+    attributes = reduced['meshes'][0]['primitives'][0]['attributes']
+    assert list(accessor_array(attributes['JOINTS_0'])) == [0, 0, 0, 0, 1, 2, 0, 0, 2, 0, 0, 0]
+    assert list(accessor_floats(attributes['WEIGHTS_0']))[8:] == [1.0, 0.0, 0.0, 0.0]
+    assert spring_bone_cost(reduced) == 2 * (1 + 2)
+
+    # 元のglTFオブジェクトは変更しない
+    assert gltf['nodes'][2]['children'] == [3] and gltf['skins'][0]['joints'] == [0, 1, 2, 3, 4, 6]
+
+
+def test_reduced_spring_bones_referenced():
+    # 子孫にコライダーグループのノードがあるチェーンは変更しない
+    gltf = make_gltf([1])
+    gltf['extensions']['VRM']['secondaryAnimation']['colliderGroups'][1]['node'] = 4
+    reduced = reduced_spring_bones(gltf, max_chain_length=2)
+    assert reduced['nodes'][2]['children'] == [3]
+    assert reduced['skins'][0]['joints'] == [0, 1, 2, 3, 4, 6]
+
+
+def test_reduced_spring_bones_pruned():
+    # ノード4はジョイントではない(スキンの削減で削除された)ので、ノード4だけのルートは削除する
+    # 使われていないコライダーグループを削除して、コライダーグループ番号を振り直す
+    gltf = make_gltf([4, 4, 1], [1])
+    gltf['skins'][0]['joints'] = [0, 1, 2, 3]
+    gltf['extensions']['VRM']['secondaryAnimation']['boneGroups'].append(
+        {'comment': 'unused', 'center': -1, 'bones': [4], 'colliderGroups': [0]})
+    reduced = reduced_spring_bones(gltf, max_colliders=0)
+    secondary = reduced['extensions']['VRM']['secondaryAnimation']
+    assert [g['bones'] for g in secondary['boneGroups']] == [[1]]
+    assert secondary['boneGroups'][0]['colliderGroups'] == []
+    assert secondary['colliderGroups'] == []
+
+    reduced = reduced_spring_bones(gltf)
+    secondary = reduced['extensions']['VRM']['secondaryAnimation']
+    assert secondary['boneGroups'][0]['colliderGroups'] == [0]
+    assert secondary['colliderGroups'] == [{'node': 0, 'colliders': [collider(0.0, 0.2)]}]
+
+    # 元のglTFオブジェクトは変更しない
+    assert len(gltf['extensions']['VRM']['secondaryAnimation']['boneGroups']) == 2
@@ -12,12 +12,7 @@ from vrm import placer
                 {'materials': [
                     {'name': 'F00_002_01_Tops_01_CLOTH-10'}
                 ]},
-                {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (2048, 2048)}
-                    }
-                }
+                {}
         ),
         (  # スカートのみ
                 {'materials': [
@@ -25,9 +20,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Bottoms_',
-                    'place': {
-                        '_Bottoms_': {'pos': (0, 0), 'size': (1024, 512)}
-                    }
+                    'names': ['_Bottoms_']
                 }
         ),
         (  # 靴のみ
@@ -36,9 +29,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Shoes_',
-                    'place': {
-                        '_Shoes_': {'pos': (0, 0), 'size': (512, 512)}
-                    }
+                    'names': ['_Shoes_']
                 }
         ),
         (  # アクセサリのみ
@@ -47,9 +38,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Accessory_',
-                    'place': {
-                        '_Accessory_': {'pos': (0, 0), 'size': (256, 256)}
-                    }
+                    'names': ['_Accessory_']
                 }
         ),
         (  # 服上、靴
@@ -58,11 +47,8 @@ from vrm import placer
                     {'name': 'F00_001_01_Shoes_01_CLOTH-13'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)}
-                    }
+                    'main': '_Shoes_',
+                    'names': ['_Shoes_']
                 }
         ),
         (  # 服上、アクセサリ
@@ -71,11 +57,8 @@ from vrm import placer
                     {'name': 'F00_001_01_Accessory_Tie_01_CLOTH-11'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Accessory_': {'pos': (1024, 0), 'size': (256, 256)}
-                    }
+                    'main': '_Accessory_',
+                    'names': ['_Accessory_']
                 }
         ),
         (  # スカート、靴
@@ -85,10 +68,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Bottoms_',
-                    'place': {
-                        '_Bottoms_': {'pos': (0, 0), 'size': (1024, 512)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)}
-                    }
+                    'names': ['_Bottoms_', '_Shoes_']
                 }
         ),
         (  # ペンシルスカート、靴
@@ -98,10 +78,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Bottoms_',
-                    'place': {
-                        '_Bottoms_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)}
-                    }
+                    'names': ['_Bottoms_', '_Shoes_']
                 }
         ),
         (  # 靴、アクセサリ
@@ -111,10 +88,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Shoes_',
-                    'place': {
-                        '_Shoes_': {'pos': (0, 0), 'size': (512, 512)},
-                        '_Accessory_': {'pos': (0, 512), 'size': (256, 256)}
-                    }
+                    'names': ['_Shoes_', '_Accessory_']
                 }
         ),
         (  # 靴、アクセサリ
@@ -124,10 +98,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Bottoms_',
-                    'place': {
-                        '_Bottoms_': {'pos': (0, 0), 'size': (1024, 512)},
-                        '_Accessory_': {'pos': (1024, 0), 'size': (256, 256)}
-                    }
+                    'names': ['_Bottoms_', '_Accessory_']
                 }
         ),
         (  # 学生服スカート
@@ -136,11 +107,8 @@ from vrm import placer
                     {'name': 'F00_001_01_Bottoms_01_CLOTH-12'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 512)}
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_']
                 }
         ),
         (  # 学生服スカート靴
@@ -150,12 +118,8 @@ from vrm import placer
                     {'name': 'F00_001_01_Shoes_01_CLOTH-13'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 512)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)}
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_', '_Shoes_']
                 }
         ),
         (  # 学生服スカート靴リボン
@@ -166,13 +130,8 @@ from vrm import placer
                     {'name': 'F00_001_01_Accessory_Tie_01_CLOTH-11'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 512)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)},
-                        '_Accessory_': {'pos': (1024, 512), 'size': (256, 256)}
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_', '_Shoes_', '_Accessory_']
                 }
         ),
         (  # スカートリボン
@@ -182,10 +141,7 @@ from vrm import placer
                 ]},
                 {
                     'main': '_Bottoms_',
-                    'place': {
-                        '_Bottoms_': {'pos': (0, 0), 'size': (1024, 512)},
-                        '_Accessory_': {'pos': (1024, 0), 'size': (256, 256)}
-                    }
+                    'names': ['_Bottoms_', '_Accessory_']
                 }
         ),
         (  # 学生服ズボン靴ネクタイ
@@ -196,25 +152,15 @@ from vrm import placer
                     {'name': 'M00_001_01_Accessory_Tie_01_CLOTH-11'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 1024)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)},
-                        '_Accessory_': {'pos': (1024, 512), 'size': (256, 256)}
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_', '_Shoes_', '_Accessory_']
                 }
         ),
         (  # Tシャツのみ
                 {'materials': [
                     {'name': 'F00_005_01_Tops_01_CLOTH-12'},
                 ]},
-                {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (2048, 2048)}
-                    }
-                }
+                {}
         ),
         (  # Tシャツスカート靴
                 {'materials': [
@@ -224,24 +170,15 @@ from vrm import placer
                     {'name': 'F00_001_01_Bottoms_01_CLOTH-11'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 512)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)}
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_', '_Shoes_']
                 }
         ),
         (  # パーカーのみ
                 {'materials': [
                     {'name': 'F00_006_01_Tops_01_CLOTH-11'}
                 ]},
-                {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (2048, 2048)}
-                    }
-                }
+                {}
         ),
         (  # パーカースカート靴
                 {'materials': [
@@ -251,24 +188,15 @@ from vrm import placer
                     {'name': 'F00_001_01_Bottoms_01_CLOTH-12'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 512)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)}
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_', '_Shoes_']
                 }
         ),
         (  # ロングコート
                 {'materials': [
                     {'name': 'F00_008_01_Tops_01_CLOTH-10'},
                 ]},
-                {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (2048, 2048)},
-                    }
-                }
+                {}
         ),
         (  # ロングコート、ペンシルスカート
                 {'materials': [
@@ -276,11 +204,8 @@ from vrm import placer
                     {'name': 'F00_004_01_Bottoms_01_CLOTH-11'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 1024)},
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_']
                 }
         ),
         (  # ロングコートズボン靴
@@ -291,12 +216,8 @@ from vrm import placer
                     {'name': 'F00_008_01_Bottoms_01_CLOTH-11'}
                 ]},
                 {
-                    'main': '_Tops_',
-                    'place': {
-                        '_Tops_': {'pos': (0, 0), 'size': (1024, 1024)},
-                        '_Bottoms_': {'pos': (0, 1024), 'size': (1024, 1024)},
-                        '_Shoes_': {'pos': (1024, 0), 'size': (512, 512)}
-                    }
+                    'main': '_Bottoms_',
+                    'names': ['_Bottoms_', '_Shoes_']
                 }
         )
     ]
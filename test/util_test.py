@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+
+import pytest
+
+from vrm.util import unique, parallel_map
+
+
+@pytest.mark.parametrize(
+    "src, dst", [
+        (['a', 'b', 'a', 'c', 'b'], ['a', 'b', 'c']),
+        ([{'a': 1}, {'a': 1}, {'a': 2}], [{'a': 1}, {'a': 2}]),
+        ([], [])
+    ]
+)
+def test_unique(src, dst):
+    assert unique(src) == dst
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_parallel_map(jobs):
+    assert parallel_map(lambda x: x * 2, range(100), jobs) == [x * 2 for x in range(100)]
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+import struct
+from array import array
+
+import pytest
+
+from vrm.reducer import remapped_uvs
+
+
+@pytest.mark.parametrize(
+    "uv, original, indices, rect, dst", [
+        (
+                [0.5, 0.5, 1.0, 1.0, 0.0, 0.0],
+                [0.5, 0.5, 1.0, 1.0, 0.0, 0.0],
+                [0, 1, 1, 0],
+                (0.5, 0.25, 0.5, 0.5),
+                [0.75, 0.5, 1.0, 0.75, 0.0, 0.0]
+        ),
+        (  # 変換済みの頂点はスキップ
+                [0.75, 0.5, 1.0, 1.0],
+                [0.5, 0.5, 1.0, 1.0],
+                [0, 1],
+                (0.5, 0.0, 0.5, 0.5),
+                [0.75, 0.5, 1.0, 0.5]
+        ),
+        ([0.1, 0.2], [0.1, 0.2], [], (0.5, 0.5, 0.5, 0.5), [0.1, 0.2])
+    ]
+)
+def test_remapped_uvs(backend, uv, original, indices, rect, dst):
+    uv = memoryview(struct.pack('%df' % len(uv), *uv)).cast('f')
+    assert list(remapped_uvs(uv, original, indices, rect)) == list(array('f', dst))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import json
+import struct
+
+import pytest
+
+from vrm.cleaner import clean
+from vrm.gltf import accessor_floats
+from vrm.vrm import VRM, load, GLTF_MAGIC
+
+
+def minimal_gltf():
+    return {
+        'accessors': [
+            {'bufferView': 0, 'byteOffset': 0, 'componentType': 5125, 'type': 'SCALAR', 'count': 3}
+        ],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': 12},
+            {'buffer': 0, 'byteOffset': 12, 'byteLength': 5}
+        ],
+        'buffers': [{'byteLength': 20}],
+        'images': [{'name': 'img', 'mimeType': 'image/png', 'bufferView': 1}],
+        'samplers': [{}],
+        'textures': [{'source': 0, 'sampler': 0}],
+        'materials': [{'name': 'mat', 'pbrMetallicRoughness': {'baseColorTexture': {'index': 0}}}],
+        'meshes': [{'name': 'mesh', 'primitives': [{'indices': 0, 'attributes': {}, 'material': 0}]}],
+        'skins': [],
+        'nodes': [{'name': 'mesh', 'mesh': 0}],
+        'extensions': {
+            'VRM': {
+                'meta': {},
+                'blendShapeMaster': {'blendShapeGroups': [{'name': 'A', 'binds': [{'mesh': 0, 'index': 0}]}]},
+                'firstPerson': {'meshAnnotations': [{'mesh': 0, 'firstPersonFlag': 'Auto'}]},
+                'materialProperties': [{'name': 'mat', 'textureProperties': {'_MainTex': 0}}]
+            }
+        }
+    }
+
+
+def chunk_data():
+    return struct.pack('3I', 0, 1, 2) + b'abcde\x00\x00\x00'
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_save_load(tmp_path, use_mmap):
+    path = tmp_path / 'model.vrm'
+    VRM(2, minimal_gltf(), [chunk_data()]).save(path)
+
+    glb = path.read_bytes()
+    magic, version, length = struct.unpack_from('3I', glb)
+    assert (magic, version, length) == (GLTF_MAGIC, 2, len(glb))
+    json_length = struct.unpack_from('I', glb, 12)[0]
+    gltf = json.loads(glb[20:20 + json_length])
+    # 32bitのインデックスは16bitにして保存される
+    assert gltf['accessors'][0]['componentType'] == 5123
+    assert gltf['buffers'] == [{'byteLength': 16}]
+    assert [v['byteOffset'] for v in gltf['bufferViews']] == [0, 8]
+    assert struct.unpack_from('I', glb, 20 + json_length)[0] == 16
+
+    vrm = load(path, use_mmap)
+    assert vrm.version == 2
+    views = vrm.gltf['bufferViews']
+    assert bytes(views[0]['data']) == struct.pack('3H', 0, 1, 2) + b'\x00\x00'
+    assert bytes(views[1]['data']) == b'abcde\x00\x00\x00'  # byteLengthは4バイト境界に揃えて保存される
+    assert vrm.gltf['images'][0]['bufferView'] is views[1]
+    assert isinstance(views[0]['data'], memoryview) == use_mmap
+    mesh = vrm.gltf['meshes'][0]
+    vrm_ext = vrm.gltf['extensions']['VRM']
+    assert vrm.gltf['nodes'][0]['mesh'] is mesh
+    assert vrm_ext['blendShapeMaster']['blendShapeGroups'][0]['binds'][0]['mesh'] is mesh
+    assert vrm_ext['firstPerson']['meshAnnotations'][0]['mesh'] is mesh
+
+    # 再保存しても同じファイルになる
+    resaved = tmp_path / 'resaved.vrm'
+    vrm.save(resaved)
+    assert resaved.read_bytes() == glb
+
+
+def test_save_load_sparse(tmp_path):
+    gltf = minimal_gltf()
+    # bufferViewを持たず、要素2だけを1.5に置き換えるsparseアクセッサー
+    gltf['accessors'].append({'componentType': 5126, 'type': 'SCALAR', 'count': 4, 'sparse': {
+        'count': 1, 'indices': {'bufferView': 2, 'componentType': 5121}, 'values': {'bufferView': 3}
+    }})
+    gltf['bufferViews'] += [{'buffer': 0, 'byteOffset': 20, 'byteLength': 1},
+                            {'buffer': 0, 'byteOffset': 24, 'byteLength': 4}]
+    gltf['buffers'] = [{'byteLength': 28}]
+    gltf['meshes'][0]['primitives'][0]['targets'] = [{'POSITION': 1}]
+    path = tmp_path / 'model.vrm'
+    VRM(2, gltf, [chunk_data() + b'\x02\x00\x00\x00' + struct.pack('f', 1.5)]).save(path)
+
+    vrm = load(path)
+    accessor = vrm.gltf['meshes'][0]['primitives'][0]['targets'][0]['POSITION']
+    assert 'bufferView' not in accessor
+    assert accessor['sparse']['values']['bufferView'] is vrm.gltf['bufferViews'][3]
+    assert list(accessor_floats(accessor)) == [0.0, 0.0, 1.5, 0.0]
+
+
+def test_clean_save_occlusion(tmp_path):
+    # オクルージョンテクスチャだけが使うテクスチャも削除せずに保存できる
+    gltf = minimal_gltf()
+    gltf['textures'].append({'source': 0, 'sampler': 0})
+    gltf['materials'][0]['occlusionTexture'] = {'index': 1}
+    vrm = VRM(2, gltf, [chunk_data()])
+    vrm.gltf = clean(vrm.gltf)
+    path = tmp_path / 'model.vrm'
+    vrm.save(path)
+
+    saved = load(path).gltf
+    assert saved['materials'][0]['occlusionTexture']['index'] is saved['textures'][1]
@@ -29,6 +29,25 @@ def main(argv):
     parser.add_argument('-f', '--force', action='store_true', help='Overwrite file if already exists same file.')
     parser.add_argument('-V', '--version', action='version', version=app_name())
     parser.add_argument('-c', '--conf', help='Set a configuration file path.')
+    parser.add_argument('-m', '--mmap', action='store_true',
+                        help='Memory-map the VRM file instead of reading it into memory.')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel texture jobs. (-j 8)')
+    parser.add_argument('-M', '--merge-meshes', action='store_true',
+                        help='Merge skinned meshes bound to the same skeleton into one mesh.')
+    parser.add_argument('-O', '--optimize-vertex-cache', action='store_true',
+                        help='Reorder triangles and vertices for the GPU vertex cache.')
+    parser.add_argument('-Q', '--quantize', action='store_true',
+                        help='Quantize vertex attributes and morph targets. (KHR_mesh_quantization)')
+    parser.add_argument('-S', '--sparse-morph-targets', action='store_true',
+                        help='Store only the vertices each morph target moves. (sparse accessor)')
+    parser.add_argument('-N', '--flatten-nodes', action='store_true',
+                        help='Remove identity transform nodes that only group other nodes.')
+    parser.add_argument('-P', '--prune-morph-targets', action='store_true',
+                        help='Remove morph targets not bound to any blend shape group.')
+    parser.add_argument('-A', '--prune-attributes', action='store_true',
+                        help='Remove vertex attributes and morph target tangents no material uses.')
+    parser.add_argument('-J', '--reduce-joints', action='store_true',
+                        help='Remove joints without weights and limit joint influences per vertex.')
     opt = parser.parse_args(argv)
 
     if opt.conf:
@@ -39,13 +58,20 @@ def main(argv):
     print(path)
 
     # vrm読み込み
-    vrm = load(path)
+    vrm = load(path, opt.mmap)
 
     print_stat(vrm.gltf)
 
     print('-' * 30)
     vrm.gltf = reduce_vroid(vrm.gltf, opt.replace_shade_color, parse_texture_size(opt.texture_size), opt.emissive_color,
-                            m if opt.conf and (m := opt.conf.get('material')) else None)
+                            m if opt.conf and (m := opt.conf.get('material')) else None,
+                            jobs=opt.jobs, merge_meshes=opt.merge_meshes,
+                            mesh_conf=opt.conf.get('mesh') if opt.conf else None,
+                            optimize_cache=opt.optimize_vertex_cache, quantize=opt.quantize,
+                            sparse_targets=opt.sparse_morph_targets,
+                            spring_conf=opt.conf.get('spring') if opt.conf else None,
+                            flatten_nodes=opt.flatten_nodes, prune_morph_targets=opt.prune_morph_targets,
+                            prune_attributes=opt.prune_attributes, reduce_joints=opt.reduce_joints)
 
     print('-' * 30)
     print_stat(vrm.gltf)
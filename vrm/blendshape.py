@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+from .gltf import copy_gltf
+from .merger import target_count, target_names
+
+"""
+BlendShape(モーフターゲット)の削減
+"""
+
+
+def list_binds(vrm):
+    """
+    BlendShapeグループのバインドを列挙する
+    :param vrm: VRM拡張
+    :return: バインドリスト
+    """
+    return [b for g in vrm.get('blendShapeMaster', {}).get('blendShapeGroups', []) for b in g.get('binds', [])]
+
+
+def animated_meshes(gltf):
+    """
+    アニメーションでモーフのウェイトを変更しているメッシュ
+    :param gltf: glTFオブジェクト
+    :return: メッシュのidのset
+    """
+    nodes = gltf.get('nodes', [])
+    meshes = set()
+    for animation in gltf.get('animations', []):
+        for channel in animation.get('channels', []):
+            target = channel['target']
+            if target.get('path') == 'weights' and 'node' in target and 'mesh' in nodes[target['node']]:
+                meshes.add(id(nodes[target['node']]['mesh']))
+    return meshes
+
+
+def used_targets(mesh, binds, keep_names):
+    """
+    残すモーフターゲット番号を列挙する
+    :param mesh: メッシュ
+    :param binds: BlendShapeグループのバインドリスト
+    :param keep_names: バインドされていなくても残すモーフターゲット名
+    :return: モーフターゲット番号のリスト(昇順)
+    """
+    count = target_count(mesh)
+    used = {b['index'] for b in binds if b['mesh'] is mesh and 0 <= b['index'] < count}
+    # 既定のウェイトが0でないモーフターゲットは常に形状に影響する
+    used.update(n for n, weight in enumerate(mesh.get('weights', [])[:count]) if weight)
+    names = target_names(mesh) or []
+    used.update(n for n, name in enumerate(names[:count]) if name in keep_names)
+    return sorted(used)
+
+
+def select_targets(mesh, used):
+    """
+    メッシュのモーフターゲット、ウェイト、モーフターゲット名を指定した番号のものだけにする(メッシュを直接変更する)
+    :param mesh: メッシュ
+    :param used: 残すモーフターゲット番号のリスト
+    """
+    def select(owner, key):
+        if key in owner:
+            # ウェイト、モーフターゲット名はモーフターゲットより短い(省略されている)ことがある
+            owner[key] = [owner[key][n] for n in used if n < len(owner[key])]
+            if not owner[key]:
+                del owner[key]
+
+    for x in [mesh] + mesh['primitives']:
+        select(x, 'targets')
+        select(x, 'weights')
+        if 'extras' in x:
+            select(x['extras'], 'targetNames')  # VRoidはモーフターゲット名をメッシュとプリミティブのextrasに保存する
+
+
+def pruned_morph_targets(gltf, keep_names=()):
+    """
+    BlendShapeグループからバインドされていないモーフターゲットを削除する
+    実行時にウェイトが変わらないモーフターゲットはファイルサイズとモーフの計算量を増やすだけなので削除する
+    既定のウェイトが0でないモーフターゲット、アニメーションでウェイトを変更しているメッシュのモーフターゲットは削除しない
+    :param gltf: glTFオブジェクト
+    :param keep_names: バインドされていなくても残すモーフターゲット名
+    :return: 削除後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    binds = list_binds(gltf['extensions']['VRM'])
+    animated = animated_meshes(gltf)
+    keep_names = set(keep_names)
+
+    for mesh in gltf['meshes']:
+        if id(mesh) in animated:
+            continue
+        used = used_targets(mesh, binds, keep_names)
+        if len(used) == target_count(mesh):
+            continue
+        select_targets(mesh, used)
+
+        # BlendShapeのバインドを削除後のモーフターゲット番号に変更
+        remap = {old: new for new, old in enumerate(used)}
+        for bind in binds:
+            if bind['mesh'] is mesh and bind['index'] in remap:
+                bind['index'] = remap[bind['index']]
+
+    # 使われなくなったアクセッサーはclean処理で削除される
+    return gltf
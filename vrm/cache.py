@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+import hashlib
+from collections import OrderedDict, defaultdict
+from io import BytesIO
+from threading import Lock
+
+from PIL import Image
+
+"""
+デコード済み画像のキャッシュ
+"""
+
+
+def image_bytes(image):
+    """
+    デコード済み画像のメモリ使用量(概算)
+    :param image: PIL.Imageオブジェクト
+    :return: バイト数
+    """
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageCache(object):
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        """
+        デコード済み画像のLRUキャッシュ
+        画像ファイル(バイトデータ)の内容のハッシュ値をキーにするので、同じ内容の画像は一度だけデコードする
+        キャッシュした画像は共有されるので、取得した画像を変更しないこと
+        :param max_bytes: デコード済み画像の合計サイズの上限(バイト)
+        """
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()  # キー -> PIL.Imageオブジェクト(古い順)
+        self.total_bytes = 0
+        self.hashes = {}  # id(バイトデータ) -> (バイトデータ, キー)、キャッシュにある画像のバイトデータだけ保持する
+        self.lock = Lock()
+        self.key_locks = defaultdict(Lock)  # 同じ画像を複数スレッドで同時にデコードしないためのロック
+
+    def key(self, image_buffer):
+        """
+        :param image_buffer: 画像ファイルのバイトデータ
+        :return: キャッシュのキー(キャッシュにある画像の同じインスタンスはハッシュ値を計算し直さない)
+        """
+        with self.lock:
+            if id(image_buffer) in self.hashes:
+                return self.hashes[id(image_buffer)][1]
+        return hashlib.sha1(image_buffer).digest()
+
+    def remember(self, image_buffer, key):
+        # ロックを取得して呼び出す
+        # idが再利用されないようにバイトデータも保持する(画像をキャッシュから削除するときに解放する)
+        self.hashes[id(image_buffer)] = (image_buffer, key)
+
+    def forget(self, key):
+        # ロックを取得して呼び出す
+        self.hashes = {i: (buffer, k) for i, (buffer, k) in self.hashes.items() if k != key}
+
+    def get(self, image_buffer):
+        """
+        :param image_buffer: 画像ファイルのバイトデータ
+        :return: キャッシュ済みのPIL.Imageオブジェクト、なければNone
+        """
+        key = self.key(image_buffer)
+        with self.lock:
+            if key not in self.images:
+                return None
+            self.images.move_to_end(key)
+            self.remember(image_buffer, key)
+            return self.images[key]
+
+    def put(self, image_buffer, image):
+        """
+        デコード済み画像を追加する(エンコードした画像をデコードせずに引き継ぐ場合にも使う)
+        :param image_buffer: 画像ファイルのバイトデータ
+        :param image: PIL.Imageオブジェクト
+        """
+        key = self.key(image_buffer)
+        with self.lock:
+            if key in self.images:
+                self.total_bytes -= image_bytes(self.images.pop(key))
+            self.images[key] = image
+            self.total_bytes += image_bytes(image)
+            self.remember(image_buffer, key)
+            # 上限を超えたら古いものから削除する(追加した画像は残す)
+            while self.total_bytes > self.max_bytes and len(self.images) > 1:
+                old_key, old = self.images.popitem(last=False)
+                self.total_bytes -= image_bytes(old)
+                self.forget(old_key)
+
+    def load(self, image_buffer):
+        """
+        画像をデコードして返す、キャッシュ済みならキャッシュから返す
+        :param image_buffer: 画像ファイルのバイトデータ
+        :return: PIL.Imageオブジェクト(デコード済み)
+        """
+        with self.key_locks[self.key(image_buffer)]:
+            image = self.get(image_buffer)
+            if image is None:
+                image = Image.open(BytesIO(image_buffer))
+                image.load()
+                self.put(image_buffer, image)
+            return image
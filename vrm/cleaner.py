@@ -1,165 +1,282 @@
 #!/usr/bin/env python
 
-from copy import deepcopy
+from .gltf import copy_gltf, accessor_buffer_views, list_node_references, MATERIAL_TEXTURE_NAMES
+from .optimizer import list_vertex_groups
+from .spring import secondary_animation, spring_nodes, group_roots
 
-from .util import unique
+"""
+未使用要素の削除(マーク&スイープ)
+ルート(スキン、メッシュ、VRM拡張)から参照をたどって使用中の要素に印をつけ、印のない要素を削除する
+要素の同一性はインスタンス(id)で判定する
+マテリアルが使わない頂点属性の削除
+使われていないノードの削除
+"""
 
+# 印をつける要素名
+MARKED_NAMES = ['materials', 'textures', 'images', 'samplers', 'accessors', 'bufferViews']
 
-def used_material_names(gltf):
-    """
-    使用しているマテリアル名リストを取得
-    :param gltf: glTFオブジェクト
-    :return: 使用しているマテリアル名リスト
-    """
-    material_names = [primitive['material']['name'] for mesh in gltf['meshes'] for primitive in mesh['primitives']]
-    return set(material_names)
+# 単位変換のノードのmatrix
+IDENTITY_MATRIX = [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1]
 
+# 取り除いてよいノードが持つキー(名前、階層、変換)
+TRANSFORM_NODE_KEYS = {'name', 'children', 'matrix', 'translation', 'rotation', 'scale'}
 
-def clean_gltf_materials(gltf):
-    """
-    未使用のglTFマテリアルを削除する
-    :param gltf: glTFオブジェクト
-    :return: 新しいマテリアルリスト
-    """
-    return list(filter(lambda m: m['name'] in used_material_names(gltf), gltf['materials']))
+# 省略できるノード番号の参照のキー(スキンのスケルトン、揺れものの中心、一人称のボーン)
+OPTIONAL_NODE_KEYS = {'skeleton', 'center', 'firstPersonBone'}
 
 
-def clean_vrm_materials(gltf):
+def list_vrm_textures(vrm, material_names):
     """
-    未使用のVRMマテリアルを削除する
-    :param gltf: glTFオブジェクト
-    :return: 新しいマテリアルリスト
-    """
-    # VRMマテリアル削除
-    vrm = gltf['extensions']['VRM']
-    return list(filter(lambda m: m['name'] in used_material_names(gltf), vrm['materialProperties']))
-
-
-def list_textures(gltf):
-    """
-    使用中のテクスチャを列挙する
-    :param gltf: glTFオブジェクト
+    VRM拡張が使用しているテクスチャを列挙する
+    :param vrm: VRM拡張
+    :param material_names: 使用中のマテリアル名
     :return: テクスチャリスト(generator)
     """
-    # GLTFテクスチャ
-    for material in gltf['materials']:
-        if 'baseColorTexture' in material['pbrMetallicRoughness']:
-            yield material['pbrMetallicRoughness']['baseColorTexture']['index']
-        for tex_name in ['normalTexture', 'emissiveTexture']:
-            if tex_name in material:
-                yield material[tex_name]['index']
-
-    # VRMテクスチャ
-    vrm = gltf['extensions']['VRM']
     for material in vrm['materialProperties']:
-        for texture in material['textureProperties'].values():
-            yield texture
+        if material['name'] in material_names:
+            yield from material['textureProperties'].values()
 
     if 'texture' in vrm['meta']:
         yield vrm['meta']['texture']
 
 
-def clean_textures(gltf):
+def list_primitive_accessors(primitive):
     """
-    未使用テクスチャを削除したテクスチャリストを返す
-    :param gltf: glTFオブジェクト
-    :return: 新しいテクスチャリスト
+    プリミティブが使用しているアクセッサーを列挙する
+    :param primitive: プリミティブ
+    :return: アクセッサーリスト(generator)
     """
-    return unique(list_textures(gltf))
+    yield primitive['indices']
+    yield from primitive['attributes'].values()
+    for target in primitive.get('targets', []):
+        yield from target.values()
 
 
-def clean_images(gltf):
+def mark(gltf):
     """
-    未使用画像を削除
+    使用中の要素に印をつける
+    各要素は一度だけ走査する
     :param gltf: glTFオブジェクト
-    :return: 新しい画像リスト
+    :return: 要素名 -> 使用中の要素の辞書(id -> 要素、参照順)
     """
-    return list(map(lambda t: t['source'], gltf['textures']))
+    marked = {name: {} for name in MARKED_NAMES}
 
+    def visit(name, x):
+        # 初めて参照された要素ならTrue
+        if id(x) in marked[name]:
+            return False
+        marked[name][id(x)] = x
+        return True
 
-def clean_samplers(gltf):
-    """
-    未使用サンプラーを削除したサンプラーリストを返す
-    :param gltf: glTFオブジェクト
-    :return: 新しいサンプラーリスト
-    """
-    return list(map(lambda t: t['sampler'], gltf['textures']))
-
+    def visit_accessor(accessor):
+        if visit('accessors', accessor):
+            for view in accessor_buffer_views(accessor):
+                visit('bufferViews', view)
 
-def list_accessors(gltf):
-    """
-    アクセサーを列挙する
-    :param gltf: glTFオブジェクト
-    :return: アクセッサー列挙(generator)
-    """
     for skin in gltf['skins']:
-        yield skin['inverseBindMatrices']
+        visit_accessor(skin['inverseBindMatrices'])
 
     for mesh in gltf['meshes']:
         for primitive in mesh['primitives']:
-            yield primitive['indices']
-            for attr_value in primitive['attributes'].values():
-                yield attr_value
-            if 'targets' in primitive:
-                for target in primitive['targets']:
-                    for target_value in target.values():
-                        yield target_value
+            visit('materials', primitive['material'])
+            for accessor in list_primitive_accessors(primitive):
+                visit_accessor(accessor)
+
+    # マテリアルはglTFのマテリアル順でテクスチャを列挙する
+    materials = [m for m in gltf['materials'] if id(m) in marked['materials']]
+    material_names = {m['name'] for m in materials}
+    textures = [info['index'] for m in materials for info in list_texture_infos(m)]
+    textures += list_vrm_textures(gltf['extensions']['VRM'], material_names)
+
+    images = []
+    for texture in textures:
+        if visit('textures', texture):
+            visit('samplers', texture['sampler'])
+            if visit('images', texture['source']):
+                images.append(texture['source'])
+
+    # 画像のbufferViewはアクセッサーのbufferViewの後に並べる
+    for image in images:
+        if 'bufferView' in image:
+            visit('bufferViews', image['bufferView'])
+
+    return marked
 
 
-def clean_accesors(gltf):
+def clean(gltf):
     """
-    未使用アクセッサーを削除したアクセッサーリストを返す
+    不要なマテリアル、テクスチャ、画像、サンプラー、アクセッサー、バッファビューを削除する
     :param gltf: glTFオブジェクト
-    :return: 新しいアクセッサーリスト
+    :return: 削除後のglTFオブジェクト
     """
-    return unique(list_accessors(gltf))
+    gltf = copy_gltf(gltf, 'extensions')
+    marked = mark(gltf)
 
+    # 未参照のマテリアルを削除(VRMマテリアルは名前で対応をとる)
+    gltf['materials'] = [m for m in gltf['materials'] if id(m) in marked['materials']]
+    material_names = {m['name'] for m in gltf['materials']}
+    vrm = gltf['extensions']['VRM']
+    vrm['materialProperties'] = [m for m in vrm['materialProperties'] if m['name'] in material_names]
 
-def list_buffer_views(gltf):
-    # バッファビュー列挙
-    for accessor in gltf['accessors']:
-        yield accessor['bufferView']
-        # TODO: sparse対応
+    # 未参照のテクスチャ、画像、サンプラー、アクセッサー、バッファービューを削除(参照順に並べる)
+    for name in ['textures', 'images', 'samplers', 'accessors', 'bufferViews']:
+        gltf[name] = list(marked[name].values())
 
-    for image in gltf['images']:
-        if 'bufferView' in image:
-            yield image['bufferView']
+    return gltf
 
 
-def clean_buffer_views(gltf):
+def list_texture_infos(material):
     """
-    未使用バッファービューを削除したバッファービューリストを返す
-    :param gltf: glTFオブジェクト
-    :return: 新しいバッファービューリスト
+    glTFマテリアルのテクスチャ参照(textureInfo)を列挙する
+    :param material: glTFマテリアル
+    :return: textureInfoリスト(generator)
     """
-    return unique(list_buffer_views(gltf))
+    pbr = material.get('pbrMetallicRoughness', {})
+    for name in ['baseColorTexture', 'metallicRoughnessTexture']:
+        if name in pbr:
+            yield pbr[name]
+    for name in MATERIAL_TEXTURE_NAMES:
+        if name in material:
+            yield material[name]
 
 
-def clean(gltf):
+def material_attributes(material, vrm_material):
     """
-    不要なマテリアル、テクスチャ、画像、サンプラー、アクセッサー、バッファビューを削除する
-    :param gltf: glTFオブジェクト
-    :return: 削除後のglTFオブジェクト
+    マテリアルの描画に必要な頂点属性のうち、削除できるもの(接線、2番目以降のUV)を列挙する
+    MToonはUVを1つしか使わず、接線は法線マップにしか使わない
+    :param material: glTFマテリアル
+    :param vrm_material: VRMマテリアル(なければNone)
+    :return: 頂点属性名のset
     """
-    gltf = deepcopy(gltf)
+    names = {'TEXCOORD_%d' % info.get('texCoord', 0) for info in list_texture_infos(material)}
+    normal_map = 'normalTexture' in material
+    if vrm_material:
+        normal_map |= '_BumpMap' in vrm_material['textureProperties']
+        normal_map |= bool(vrm_material.get('keywordMap', {}).get('_NORMALMAP'))
+    if normal_map:
+        names.add('TANGENT')
+    return names
+
 
-    # 未参照のマテリアルを削除
-    gltf['materials'] = clean_gltf_materials(gltf)
-    gltf['extensions']['VRM']['materialProperties'] = clean_vrm_materials(gltf)
+def is_optional_attribute(name):
+    # マテリアルが使わなければ削除できる頂点属性
+    return name == 'TANGENT' or (name.startswith('TEXCOORD_') and name != 'TEXCOORD_0')
 
-    # 未参照のテクスチャを削除
-    gltf['textures'] = clean_textures(gltf)
 
-    # 未参照の画像を削除
-    gltf['images'] = clean_images(gltf)
+def pruned_attributes(gltf, keep_morph_normals=True):
+    """
+    マテリアルが使わない頂点属性(接線、2番目以降のUV)と、モーフターゲットの接線(と法線)の差分を削除する
+    削除した頂点属性のアクセッサーはclean処理で削除される
+    :param gltf: glTFオブジェクト
+    :param keep_morph_normals: Falseでモーフターゲットの法線の差分も削除する
+    :return: 削除後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    vrm_materials = {m['name']: m for m in gltf['extensions']['VRM']['materialProperties']}
+
+    # 頂点データを共有するプリミティブは、全てのマテリアルが必要とする頂点属性を残す
+    for primitives in list_vertex_groups(gltf):
+        needed = set()
+        for primitive in primitives:
+            material = primitive.get('material')
+            if material:
+                needed |= material_attributes(material, vrm_materials.get(material['name']))
+
+        for primitive in primitives:
+            attributes = {k: v for k, v in primitive['attributes'].items()
+                          if not is_optional_attribute(k) or k in needed}
+            primitive['attributes'] = attributes
+            if 'targets' not in primitive:
+                continue
+            new_targets = []
+            for target in primitive['targets']:
+                new_target = {k: v for k, v in target.items()
+                              if k in attributes and (keep_morph_normals or k != 'NORMAL')}
+                if not new_target and 'NORMAL' in target:
+                    new_target['NORMAL'] = target['NORMAL']  # モーフターゲットは空にできない
+                new_targets.append(new_target)
+            primitive['targets'] = new_targets
+
+    return gltf
 
-    # 未参照のサンプラーを削除
-    gltf['samplers'] = clean_samplers(gltf)
 
-    # 不要アクセッサーを削除
-    gltf['accessors'] = clean_accesors(gltf)
+def is_identity_node(node):
+    """
+    :param node: ノード
+    :return: 名前、階層、単位変換だけを持つノードならTrue
+    """
+    return node.keys() <= TRANSFORM_NODE_KEYS and node.get('matrix', IDENTITY_MATRIX) == IDENTITY_MATRIX \
+        and node.get('translation', [0, 0, 0]) == [0, 0, 0] and node.get('rotation', [0, 0, 0, 1]) == [0, 0, 0, 1] \
+        and node.get('scale', [1, 1, 1]) == [1, 1, 1]
 
-    # 不要バッファービューを削除
-    gltf['bufferViews'] = clean_buffer_views(gltf)
 
+def pruned_nodes(gltf, flatten=False):
+    """
+    メッシュ、スキン、カメラ、拡張を持たず、どこからも参照されていないノードを削除する
+    (参照: スキンのジョイント、ヒューマノイドのボーン、一人称のボーン、揺れもの、アニメーションの対象)
+    残すノードの祖先は残す。揺れもののルートの子孫は末端まで揺れもののチェーンの形状に使われるので残す
+    flattenを指定した場合、祖先として残すだけのノードのうち単位変換のものを取り除き、子を親に付け替える
+    ノード番号は削除後の番号に振り直す。存在しないノードへの参照は省略できるものだけ削除する
+    (負の番号は未設定としてそのまま残す)
+    :param gltf: glTFオブジェクト
+    :param flatten: Trueで単位変換のノードを取り除き、階層を浅くする
+    :return: 削除後のglTFオブジェクト
+    """
+    if 'nodes' not in gltf:
+        return gltf
+    gltf = copy_gltf(gltf, 'nodes', 'skins', 'scenes', 'animations', 'extensions')
+    nodes = gltf['nodes']
+    # 共有しているリストの参照は1回だけ振り直す
+    all_references = {(id(owner), key): (owner, key) for owner, key in list_node_references(gltf)}.values()
+    references = [(owner, key) for owner, key in all_references if 0 <= owner[key] < len(nodes)]
+    # 存在しないノードへの参照は、省略できるもの(揺れもののボーン、スケルトン、中心、一人称のボーン、
+    # アニメーションの対象)だけ削除する。スキンのジョイントは位置がJOINTSと逆バインド行列に対応するので削除しない
+    bone_lists = {id(g.get('bones')) for g in secondary_animation(gltf).get('boneGroups', [])}
+    dangling = [(owner, key) for owner, key in all_references if owner[key] >= len(nodes)
+                and (id(owner) in bone_lists if isinstance(owner, list) else
+                     key in OPTIONAL_NODE_KEYS or (key == 'node' and 'path' in owner))]
+
+    needed = {owner[key] for owner, key in references}
+    needed.update(n for n, node in enumerate(nodes) if node.keys() & {'mesh', 'skin', 'camera', 'extensions'})
+    for group in secondary_animation(gltf).get('boneGroups', []):
+        for root in group_roots(nodes, group):
+            needed.update(n for n, _ in spring_nodes(nodes, root))
+
+    # 残すノードの祖先をたどる
+    parents = {child: parent for parent, node in enumerate(nodes) for child in node.get('children', [])}
+    kept = set()
+    for n in needed:
+        while n is not None and n not in kept:
+            kept.add(n)
+            n = parents.get(n)
+    collapsed = {n for n in kept - needed if is_identity_node(nodes[n])} if flatten else set()
+    kept -= collapsed
+
+    def expand(children):
+        # 削除したノードを除き、取り除いたノードはその子に置き換える
+        result = []
+        for child in children:
+            if child in collapsed:
+                result += expand(nodes[child].get('children', []))
+            elif child in kept:
+                result.append(child)
+        return result
+
+    order = [n for n in range(len(nodes)) if n in kept]
+    remap = {old: new for new, old in enumerate(order)}
+    for n in order:
+        node = nodes[n]
+        if 'children' in node:
+            node['children'] = [remap[c] for c in expand(node['children'])]
+            if not node['children']:
+                del node['children']
+    for scene in gltf.get('scenes', []):
+        scene['nodes'] = [remap[n] for n in expand(scene.get('nodes', []))]
+    for owner, key in references:
+        owner[key] = remap[owner[key]]
+    # 存在しないノードへの参照は振り直せないので削除する(リストの要素は後ろから削除する)
+    # 削除しない参照は範囲外のまま残る(別のノードを指すことはない)
+    for owner, key in sorted(dangling, key=lambda ref: ref[1] if isinstance(ref[0], list) else 0, reverse=True):
+        del owner[key]
+    gltf['nodes'] = [nodes[n] for n in order]
     return gltf
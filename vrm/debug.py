@@ -1,5 +1,95 @@
 #!/usr/bin/env python
 
+from .gltf import accessor_array, accessor_buffer_views
+from .merger import target_count
+from .optimizer import count_cache_misses
+from .spring import secondary_animation, spring_nodes, group_roots, group_colliders
+
+
+def count_draw_calls(gltf):
+    """
+    描画呼び出し数(プリミティブ数)を数える
+    :param gltf: glTFオブジェクト
+    :return: 描画呼び出し数
+    """
+    return sum(len(mesh['primitives']) for mesh in gltf['meshes'])
+
+
+def count_morph_targets(gltf):
+    """
+    モーフターゲット数を数える
+    :param gltf: glTFオブジェクト
+    :return: 全メッシュのモーフターゲット数の合計
+    """
+    return sum(target_count(mesh) for mesh in gltf['meshes'])
+
+
+def count_joints(gltf):
+    """
+    ジョイント数を数える
+    :param gltf: glTFオブジェクト
+    :return: 全スキンのジョイント数の合計
+    """
+    return sum(len(skin['joints']) for skin in gltf['skins'])
+
+
+def spring_bone_cost(gltf):
+    """
+    揺れものの物理演算の負荷を見積もる
+    ボーングループごとの 揺れるノード数 × (1 + 衝突判定するコライダー数) の合計
+    :param gltf: glTFオブジェクト
+    :return: 負荷の見積もり値
+    """
+    secondary = secondary_animation(gltf)
+    collider_groups = secondary.get('colliderGroups', [])
+    cost = 0
+    for group in secondary.get('boneGroups', []):
+        joints = sum(len(spring_nodes(gltf['nodes'], root)) for root in group_roots(gltf['nodes'], group))
+        cost += joints * (1 + group_colliders(collider_groups, group))
+    return cost
+
+
+def count_vertices(gltf):
+    """
+    頂点数を数える(複数のプリミティブで共有している頂点データは1回だけ数える)
+    :param gltf: glTFオブジェクト
+    :return: 頂点数
+    """
+    positions = {id(p['attributes']['POSITION']): p['attributes']['POSITION']
+                 for mesh in gltf['meshes'] for p in mesh['primitives'] if 'POSITION' in p['attributes']}
+    return sum(accessor['count'] for accessor in positions.values())
+
+
+def vertex_data_size(gltf):
+    """
+    頂点データ(頂点属性、モーフターゲット)のbufferViewのバイト数を数える(共有しているbufferViewは1回だけ数える)
+    byteStrideによる要素間の隙間、sparseアクセッサーの要素番号と値を含める
+    :param gltf: glTFオブジェクト
+    :return: バイト数
+    """
+    views = {}
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            for values in [primitive['attributes']] + primitive.get('targets', []):
+                views.update((id(v), v) for a in values.values() for v in accessor_buffer_views(a))
+    return sum(len(view['data']) for view in views.values())
+
+
+def cache_miss_ratio(gltf):
+    """
+    頂点キャッシュの平均キャッシュミス率(ACMR: 三角形1つあたりの頂点シェーダー実行回数)を求める
+    :param gltf: glTFオブジェクト
+    :return: ACMR(三角形がなければ0)
+    """
+    misses = triangles = 0
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            if 'indices' in primitive and primitive.get('mode', 4) == 4:
+                indices = accessor_array(primitive['indices'])
+                misses += count_cache_misses(indices)
+                triangles += len(indices) // 3
+    return misses / triangles if triangles else 0
+
 
 def print_stat(gltf):
     """
@@ -14,6 +104,6 @@ def print_stat(gltf):
 
     meshes = gltf['meshes']
     print('meshes:', len(meshes))
-    print('primitives:', sum([len(m['primitives']) for m in meshes]))
+    print('primitives:', count_draw_calls(gltf))
     for mesh in meshes:
         print('\t', mesh['name'], ':', len(mesh['primitives']))
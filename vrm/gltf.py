@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 
 import re
+import struct
+from array import array
 from copy import deepcopy
 
 from .version import app_name
 
+try:
+    import numpy
+except ImportError:
+    numpy = None  # NumPyがなければarrayで処理する
+
 
 def remove_instance(name):
     if '(Instance)' not in name:
@@ -21,6 +28,455 @@ def normalize_material_name(name):
     return remove_clone(remove_instance(name))
 
 
+# 要素名 -> その要素をインスタンス参照している要素名
+REFERRERS = {
+    'bufferViews': ['accessors', 'images'],
+    'accessors': ['meshes', 'skins'],
+    'meshes': ['nodes', 'extensions'],
+    'skins': ['nodes'],
+    'images': ['textures'],
+    'samplers': ['textures'],
+    'textures': ['materials', 'extensions'],
+    'materials': ['meshes'],
+}
+
+# glTFマテリアルが直接持つテクスチャ参照(textureInfo)のキー(pbrMetallicRoughness以外)
+MATERIAL_TEXTURE_NAMES = ['normalTexture', 'occlusionTexture', 'emissiveTexture']
+
+
+def referrer_names(names):
+    """
+    指定した要素と、それを(間接的に)参照している要素の名前を列挙する
+    :param names: 要素名リスト
+    :return: 要素名のset
+    """
+    found = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name not in found:
+            found.add(name)
+            stack.extend(REFERRERS.get(name, []))
+    return found
+
+
+def copy_gltf(gltf, *names):
+    """
+    glTFオブジェクトを複製する
+    要素名を指定した場合は、その要素と参照元の要素だけを複製し、それ以外の要素は元のglTFオブジェクトと共有する
+    (共有する要素のリスト自体は複製するので、要素の追加、削除はしてよい)
+    bufferViewのデータ(bytes, memoryview)は書き換えずに差し替える前提なので、常に共有する
+    :param gltf: glTFオブジェクト
+    :param names: 変更する要素名(gltfのキー)、指定しなければ全て複製する
+    :return: 複製したglTFオブジェクト
+    """
+    memo = {id(view['data']): view['data'] for view in gltf.get('bufferViews', []) if 'data' in view}
+    if names:
+        copy_names = referrer_names(names)
+        for key, value in gltf.items():
+            if key in copy_names:
+                continue
+            if isinstance(value, list):
+                memo.update((id(x), x) for x in value)
+            else:
+                memo[id(value)] = value
+    return deepcopy(gltf, memo)
+
+
+def reference_indexer(seq):
+    """
+    参照 -> インデックス番号の変換関数を返す
+    同一インスタンスは対応表から引くので、要素の比較(list.index)をしない
+    :param seq: 参照先のリスト
+    :return: 参照をインデックス番号に変換する関数
+    """
+    table = {}
+    for n, x in enumerate(seq):
+        table.setdefault(id(x), n)  # 重複していれば先頭のインデックス
+
+    def index(x):
+        n = table.get(id(x))
+        if n is None:
+            return seq.index(x)  # 同値の別インスタンスはリストから検索する
+        return n
+
+    return index
+
+
+# componentType -> 型コード(array, memoryview, struct共通)
+COMPONENT_FORMATS = {5120: 'b', 5121: 'B', 5122: 'h', 5123: 'H', 5125: 'I', 5126: 'f'}
+UNSIGNED_BYTE = 5121
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+FLOAT = 5126
+
+# bufferViewのtarget
+ARRAY_BUFFER = 34962  # 頂点属性
+ELEMENT_ARRAY_BUFFER = 34963  # インデックス
+
+# type -> 要素の成分数
+TYPE_COMPONENTS = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+
+# normalizedの整数 -> 実数変換の除数
+NORMALIZE_DIVISORS = {5120: 127.0, 5121: 255.0, 5122: 32767.0, 5123: 65535.0, 5125: 4294967295.0}
+
+
+def accessor_layout(accessor):
+    """
+    アクセッサーのデータ配置を返す
+    :param accessor: アクセッサー
+    :return: 型コード, 成分数, 要素のバイト数, 要素の間隔(バイト数)
+    """
+    fmt = COMPONENT_FORMATS[accessor['componentType']]
+    components = TYPE_COMPONENTS[accessor['type']]
+    element_size = struct.calcsize(fmt) * components
+    stride = accessor.get('bufferView', {}).get('byteStride') or element_size
+    return fmt, components, element_size, stride
+
+
+def sparse_accessors(accessor):
+    """
+    sparseアクセッサーの置き換え先の要素番号と置き換える値を、それぞれアクセッサーとして返す
+    :param accessor: sparseを持つアクセッサー
+    :return: 要素番号のアクセッサー, 値のアクセッサー
+    """
+    sparse = accessor['sparse']
+    indices = dict(sparse['indices'], type='SCALAR', count=sparse['count'])
+    values = dict(sparse['values'], componentType=accessor['componentType'], type=accessor['type'],
+                  count=sparse['count'])
+    return indices, values
+
+
+def accessor_buffer_views(accessor):
+    """
+    アクセッサーが参照しているbufferViewを列挙する(sparseの要素番号、値のbufferViewを含む)
+    :param accessor: アクセッサー
+    :return: bufferViewリスト(generator)
+    """
+    if 'bufferView' in accessor:
+        yield accessor['bufferView']
+    if 'sparse' in accessor:
+        sparse = accessor['sparse']
+        yield sparse['indices']['bufferView']
+        yield sparse['values']['bufferView']
+
+
+def typed_array(values, fmt):
+    """
+    値を指定した型のarrayに変換する
+    :param values: 値リスト(list, array, memoryview, numpy.ndarray)
+    :param fmt: 型コード
+    :return: array(同じ型のarrayはそのまま返す)
+    """
+    if isinstance(values, array) and values.typecode == fmt:
+        return values
+    typed = array(fmt)
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        typed.frombytes(numpy.ascontiguousarray(values, dtype=fmt).tobytes())
+    elif isinstance(values, memoryview) and values.format == fmt:
+        typed.frombytes(values.cast('B'))  # frombytesはバイト単位のmemoryviewしか受け付けない
+    else:
+        typed.extend(iter(values))  # 型の異なるarrayはそのままextendできない
+    return typed
+
+
+def accessor_array(accessor):
+    """
+    アクセッサーの値を型付き配列で返す
+    要素の各成分を順に並べた1次元配列で、normalizedの場合も格納されている整数値のまま返す
+    要素が詰めて配置されていればbufferViewのデータを参照するmemoryview(コピーなし)、
+    byteStrideで間隔が空いていればarray(コピー)を返す
+    bufferViewがなければ全要素0、sparseがあれば値を置き換えたarray(コピー)を返す
+    :param accessor: アクセッサー
+    :return: 値の配列(memoryview or array)
+    """
+    fmt, components, element_size, stride = accessor_layout(accessor)
+    count = accessor['count']
+    if 'bufferView' not in accessor:
+        values = array(fmt, bytes(count * element_size))
+    else:
+        offset = accessor.get('byteOffset', 0)
+        data = memoryview(accessor['bufferView']['data']).cast('B')
+        if stride == element_size:
+            values = data[offset:offset + count * element_size].cast(fmt)
+        else:
+            values = array(fmt)
+            for n in range(count):
+                start = offset + n * stride
+                values.frombytes(data[start:start + element_size])
+
+    if 'sparse' not in accessor:
+        return values
+
+    values = typed_array(values, fmt)  # memoryviewはarrayにコピーする(bufferViewのデータは書き換えない)
+    indices, sparse_values = sparse_accessors(accessor)
+    sparse_values = typed_array(accessor_array(sparse_values), fmt)
+    for n, i in enumerate(accessor_array(indices)):
+        values[i * components:(i + 1) * components] = sparse_values[n * components:(n + 1) * components]
+    return values
+
+
+def accessor_floats(accessor):
+    """
+    アクセッサーの値を実数の配列で返す
+    normalizedの整数値は0～1(符号付きは-1～1)に変換する
+    :param accessor: アクセッサー
+    :return: 値の配列(FLOATの場合はaccessor_arrayと同じ、それ以外はarray('f'))
+    """
+    values = accessor_array(accessor)
+    component_type = accessor['componentType']
+    if component_type == FLOAT:
+        return values
+    if not accessor.get('normalized'):
+        return array('f', values)
+    divisor = NORMALIZE_DIVISORS[component_type]
+    return array('f', [max(v / divisor, -1.0) for v in values])
+
+
+def set_accessor_array(accessor, values, component_type=None):
+    """
+    アクセッサーの値を書き換える
+    要素数、componentTypeが変わらなければbufferView内のアクセッサーの範囲だけを書き換える
+    変わる場合はbufferViewのデータ全体をアクセッサーの値で置き換える(bufferViewを他のアクセッサーと共有していないこと)
+    sparseアクセッサーはsparseを削除してbufferViewのデータ全体を置き換える(bufferViewを持つこと)
+    bufferViewのデータは変更せずに新しいデータに差し替える、min、maxを持つアクセッサーは更新する
+    :param accessor: アクセッサー
+    :param values: 要素の各成分を順に並べた1次元配列
+    :param component_type: 変更後のcomponentType(省略時は変更しない)
+    """
+    component_type = component_type or accessor['componentType']
+    fmt, components, element_size, stride = accessor_layout(accessor)
+    values = typed_array(values, COMPONENT_FORMATS[component_type])
+    count = len(values) // components
+    view = accessor['bufferView']
+    data = values.tobytes()
+
+    if component_type == accessor['componentType'] and count == accessor['count'] and 'sparse' not in accessor:
+        # アクセッサーの範囲だけ書き換える
+        offset = accessor.get('byteOffset', 0)
+        new_data = bytearray(view['data'])
+        if stride == element_size:
+            new_data[offset:offset + len(data)] = data
+        else:
+            for n in range(count):
+                start = offset + n * stride
+                new_data[start:start + element_size] = data[n * element_size:(n + 1) * element_size]
+        view['data'] = bytes(new_data)
+    else:
+        # bufferView全体を置き換える
+        view['data'] = data
+        view['byteLength'] = len(data)
+        view.pop('byteStride', None)
+        accessor.pop('sparse', None)
+        accessor['byteOffset'] = 0
+        accessor['count'] = count
+        if component_type == FLOAT and accessor.get('normalized'):
+            accessor['normalized'] = False
+        accessor['componentType'] = component_type
+
+    if count and 'min' in accessor:
+        accessor['min'] = [min(values[c::components]) for c in range(components)]
+    if count and 'max' in accessor:
+        accessor['max'] = [max(values[c::components]) for c in range(components)]
+
+
+def create_accessor(values, component_type, accessor_type, target=None, normalized=False, bounds=False):
+    """
+    値から新しいアクセッサーとbufferViewを作成する(glTFオブジェクトへの追加は呼び出し側で行う)
+    :param values: 要素の各成分を順に並べた1次元配列
+    :param component_type: componentType
+    :param accessor_type: type(SCALAR, VEC3など)
+    :param target: bufferViewのtarget(34962: 頂点属性, 34963: インデックス、Noneの場合は設定しない)
+    :param normalized: Trueで整数値を正規化して扱う
+    :param bounds: Trueでmin、maxを設定する
+    :return: アクセッサー(bufferViewはaccessor['bufferView']で参照する)
+    """
+    view = {'buffer': 0, 'byteOffset': 0, 'byteLength': 0, 'data': b''}
+    if target:
+        view['target'] = target
+    accessor = {'bufferView': view, 'byteOffset': 0, 'componentType': component_type, 'count': 0,
+                'type': accessor_type}
+    if normalized:
+        accessor['normalized'] = True
+    if bounds:
+        accessor['min'], accessor['max'] = [], []
+    set_accessor_array(accessor, values)
+    return accessor
+
+
+def gathered_accessor(accessor, order):
+    """
+    指定した順番で要素を並べた新しいアクセッサーを作成する(glTFオブジェクトへの追加は呼び出し側で行う)
+    :param accessor: アクセッサー
+    :param order: 新しい要素順に並べた元の要素番号のリスト
+    :return: アクセッサー
+    """
+    fmt, components, element_size, _ = accessor_layout(accessor)
+    values = accessor_array(accessor)
+    if numpy is not None:
+        picked = numpy.frombuffer(values, dtype=fmt).reshape(-1, components)[numpy.asarray(order, dtype=numpy.intp)]
+    else:
+        data = values.tobytes()
+        picked = array(fmt, b''.join(data[n * element_size:(n + 1) * element_size] for n in order))
+    return create_accessor(picked, accessor['componentType'], accessor['type'],
+                           accessor.get('bufferView', {}).get('target'), accessor.get('normalized', False),
+                           'min' in accessor)
+
+
+def create_sparse_accessor(values, component_type, accessor_type, normalized=False, bounds=False):
+    """
+    値から0以外の要素だけを持つsparseアクセッサーを作成する(glTFオブジェクトへの追加は呼び出し側で行う)
+    bufferViewは持たず、0以外の要素の番号と値をsparseのbufferViewに格納する(全要素0ならsparseも持たない)
+    :param values: 要素の各成分を順に並べた1次元配列
+    :param component_type: componentType
+    :param accessor_type: type(SCALAR, VEC3など)
+    :param normalized: Trueで整数値を正規化して扱う
+    :param bounds: Trueでmin、maxを設定する
+    :return: アクセッサー(bufferViewはaccessor_buffer_viewsで列挙する)
+    """
+    fmt = COMPONENT_FORMATS[component_type]
+    components = TYPE_COMPONENTS[accessor_type]
+    values = typed_array(values, fmt)
+    count = len(values) // components
+    if numpy is not None:
+        elements = numpy.frombuffer(values, dtype=fmt).reshape(-1, components)
+        indices = numpy.flatnonzero(elements.any(axis=1))
+        sparse_values = elements[indices]
+    else:
+        indices = [n for n in range(count) if any(values[n * components:(n + 1) * components])]
+        sparse_values = array(fmt)
+        for n in indices:
+            sparse_values.extend(values[n * components:(n + 1) * components])
+
+    accessor = {'componentType': component_type, 'count': count, 'type': accessor_type}
+    if normalized:
+        accessor['normalized'] = True
+    if bounds and count:
+        accessor['min'] = [min(values[c::components]) for c in range(components)]
+        accessor['max'] = [max(values[c::components]) for c in range(components)]
+    if len(indices):
+        last = int(indices[-1])
+        index_type = UNSIGNED_BYTE if last <= 255 else UNSIGNED_SHORT if last <= 65535 else UNSIGNED_INT
+        index_accessor = create_accessor(indices, index_type, 'SCALAR')
+        value_accessor = create_accessor(sparse_values, component_type, accessor_type)
+        accessor['sparse'] = {
+            'count': len(indices),
+            'indices': {'bufferView': index_accessor['bufferView'], 'byteOffset': 0, 'componentType': index_type},
+            'values': {'bufferView': value_accessor['bufferView'], 'byteOffset': 0}
+        }
+    return accessor
+
+
+def aligned_size(size):
+    # bufferViewは4バイト境界に揃えて保存される
+    return (size + 3) // 4 * 4
+
+
+def sparse_target(accessor):
+    """
+    モーフターゲットのアクセッサーを、差分が0でない頂点だけを持つsparseアクセッサーに変換する
+    :param accessor: モーフターゲットのアクセッサー
+    :return: 変換後のアクセッサー、小さくならない場合は元のアクセッサー
+    """
+    if 'sparse' in accessor or 'bufferView' not in accessor:
+        return accessor
+    sparse = create_sparse_accessor(accessor_array(accessor), accessor['componentType'], accessor['type'],
+                                    accessor.get('normalized', False), 'min' in accessor)
+    dense_size = aligned_size(accessor['count'] * accessor_layout(accessor)[3])
+    sparse_size = sum(aligned_size(len(view['data'])) for view in accessor_buffer_views(sparse))
+    return sparse if sparse_size < dense_size else accessor
+
+
+def narrow_indices(gltf):
+    """
+    最大値が65535未満のUNSIGNED_INTのインデックスをUNSIGNED_SHORTに変換する(glTFオブジェクトを直接変更する)
+    65535はプリミティブリスタートに使われるので含めない
+    UNSIGNED_BYTEはDirect3DやUnityのインデックスバッファが対応しておらず読み込み時に変換されるだけなので使わない
+    bufferViewを他のアクセッサー、画像と共有しているアクセッサー、sparseアクセッサーはデータ全体を置き換えられないので変換しない
+    :param gltf: glTFオブジェクト
+    """
+    view_users = {}
+    views = [v for a in gltf['accessors'] for v in accessor_buffer_views(a)]
+    views += [image['bufferView'] for image in gltf.get('images', []) if 'bufferView' in image]
+    for view in views:
+        view_users[id(view)] = view_users.get(id(view), 0) + 1
+
+    narrowed = set()
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            accessor = primitive.get('indices')
+            if not accessor or id(accessor) in narrowed or accessor['componentType'] != UNSIGNED_INT:
+                continue
+            if 'sparse' in accessor or view_users.get(id(accessor.get('bufferView'))) != 1:
+                continue
+            values = accessor_array(accessor)
+            if max(values, default=0) < 65535:
+                set_accessor_array(accessor, values, UNSIGNED_SHORT)
+                narrowed.add(id(accessor))
+
+
+def list_vrm_mesh_references(vrm):
+    """
+    VRM拡張でメッシュを参照している要素(BlendShapeのバインド、一人称表示の設定)を列挙する
+    :param vrm: VRM拡張
+    :return: 'mesh'キーでメッシュを参照している辞書のリスト(generator)
+    """
+    for group in vrm.get('blendShapeMaster', {}).get('blendShapeGroups', []):
+        yield from group.get('binds', [])
+    yield from vrm.get('firstPerson', {}).get('meshAnnotations', [])
+
+
+def blended_materials(gltf):
+    """
+    半透明(アルファブレンド)で描画するマテリアルを列挙する
+    三角形は描画順に合成されるので、これらのマテリアルの三角形、プリミティブの描画順は変えてはいけない
+    (glTFのalphaModeがBLEND、またはVRMマテリアルの_ALPHABLEND_ONかRenderTypeがTransparent)
+    :param gltf: glTFオブジェクト
+    :return: マテリアルのidのset
+    """
+    vrm_materials = {m['name']: m for m in gltf.get('extensions', {}).get('VRM', {}).get('materialProperties', [])}
+    materials = [p['material'] for mesh in gltf.get('meshes', []) for p in mesh['primitives'] if 'material' in p]
+    blended = set()
+    for material in materials:
+        vrm_material = vrm_materials.get(material.get('name'), {})
+        if material.get('alphaMode') == 'BLEND' or vrm_material.get('keywordMap', {}).get('_ALPHABLEND_ON') \
+                or vrm_material.get('tagMap', {}).get('RenderType') == 'Transparent':
+            blended.add(id(material))
+    return blended
+
+
+def list_node_references(gltf):
+    """
+    ノード番号による参照(ノードの階層、シーン以外)を列挙する
+    スキンのジョイント、スケルトン、アニメーションの対象、ヒューマノイドのボーン、一人称のボーン、
+    揺れもののルート、中心、コライダーグループのノード
+    :param gltf: glTFオブジェクト
+    :return: (参照を持つ辞書またはリスト, キーまたは位置)のリスト(generator)
+    """
+    for skin in gltf.get('skins', []):
+        yield from ((skin['joints'], n) for n in range(len(skin['joints'])))
+        if 'skeleton' in skin:
+            yield skin, 'skeleton'
+    for animation in gltf.get('animations', []):
+        for channel in animation.get('channels', []):
+            if 'node' in channel['target']:
+                yield channel['target'], 'node'
+
+    vrm = gltf['extensions']['VRM']
+    for bone in vrm.get('humanoid', {}).get('humanBones', []):
+        yield bone, 'node'
+    if 'firstPersonBone' in vrm.get('firstPerson', {}):
+        yield vrm['firstPerson'], 'firstPersonBone'
+    secondary = vrm.get('secondaryAnimation', {})
+    for group in secondary.get('boneGroups', []):
+        bones = group.get('bones', [])
+        yield from ((bones, n) for n in range(len(bones)))
+        if 'center' in group:
+            yield group, 'center'
+    for group in secondary.get('colliderGroups', []):
+        yield group, 'node'
+
+
 def instancing(gltf, chunks=None):
     """
     インデックス番号による参照をインスタンスデータへの直接参照に変換する
@@ -36,7 +492,12 @@ def instancing(gltf, chunks=None):
 
     # accessorsのbufferViewをインスタンス参照に更新
     for accessor in accessors:
-        accessor['bufferView'] = buffer_views[accessor['bufferView']]
+        if 'bufferView' in accessor:
+            accessor['bufferView'] = buffer_views[accessor['bufferView']]
+        if 'sparse' in accessor:
+            sparse = accessor['sparse']
+            for x in [sparse['indices'], sparse['values']]:
+                x['bufferView'] = buffer_views[x['bufferView']]
 
     meshes = gltf['meshes']
     for mesh in meshes:
@@ -57,6 +518,17 @@ def instancing(gltf, chunks=None):
     for skin in skins:
         skin['inverseBindMatrices'] = accessors[skin['inverseBindMatrices']]
 
+    # ノードのメッシュ、スキンをインスタンス参照に更新
+    for node in gltf.get('nodes', []):
+        if 'mesh' in node:
+            node['mesh'] = meshes[node['mesh']]
+        if 'skin' in node:
+            node['skin'] = skins[node['skin']]
+
+    # VRMのメッシュ参照(BlendShapeのバインド、一人称表示の設定)をインスタンス参照に更新
+    for bind in list_vrm_mesh_references(gltf['extensions']['VRM']):
+        bind['mesh'] = meshes[bind['mesh']]
+
     # 画像変換
     images = gltf['images']
     for image in images:
@@ -80,7 +552,7 @@ def instancing(gltf, chunks=None):
                 texture = pbr[name]
                 texture['index'] = textures[texture['index']]
 
-        for name in ['normalTexture', 'occulusionTexture', 'emissiveTexture']:
+        for name in MATERIAL_TEXTURE_NAMES:
             if name in material:
                 texture = material[name]
                 texture['index'] = textures[texture['index']]
@@ -110,7 +582,7 @@ def instancing(gltf, chunks=None):
         offset = buffer_view['byteOffset']
         length = buffer_view['byteLength']
         chunk = chunks[buffer_view['buffer']]
-        buffer_view['data'] = chunk[offset:][:length]
+        buffer_view['data'] = chunk[offset:offset + length]  # memoryviewの場合はコピーせずに参照する
 
     return gltf
 
@@ -119,89 +591,113 @@ def indexing(gltf):
     """
     参照をインデックス番号に戻す
     :param gltf: glTFオブジェクト
-    :return: 変換後のglTFオブジェクト
+    :return: 変換後のglTFオブジェクト、バッファに順番に書き出すbufferViewのデータリスト(4バイトアラインメント前)
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf)
+
+    # インデックスを可能なら16bitにする
+    narrow_indices(gltf)
 
     # bufferをchunkに戻す
     buffer_views = gltf['bufferViews']
 
-    # bufferViewからchunkを生成
-    chunk = b''
+    # bufferViewのオフセットを決める(データは連結せずに保存時に順番に書き出す)
+    datas = []
     offset = 0
     for buffer_view in buffer_views:
         data = buffer_view.pop('data')
-        data = data.ljust((len(data) + 3) // 4 * 4, b'\x00')  # 4バイトアラインメント
-        length = len(data)
+        length = (len(data) + 3) // 4 * 4  # 4バイトアラインメント
         buffer_view['buffer'] = 0  # 1バッファにまとめるのでインデックスは0
         buffer_view['byteOffset'] = offset
         buffer_view['byteLength'] = length
-        chunk += data
+        datas.append(data)
         offset += length
-    gltf['buffers'] = [{'byteLength': len(chunk)}]
-    chunks = [chunk]
+    gltf['buffers'] = [{'byteLength': offset}]
 
-    # bufferViewインデックスに戻す
+    # 参照 -> インデックス番号の対応表
     accessors = gltf['accessors']
+    images = gltf['images']
+    materials = gltf['materials']
+    samplers = gltf['samplers']
+    textures = gltf['textures']
+    buffer_view_index = reference_indexer(buffer_views)
+    accessor_index = reference_indexer(accessors)
+    image_index = reference_indexer(images)
+    material_index = reference_indexer(materials)
+    sampler_index = reference_indexer(samplers)
+    texture_index = reference_indexer(textures)
+
+    # bufferViewインデックスに戻す
     for accessor in accessors:
-        accessor['bufferView'] = buffer_views.index(accessor['bufferView'])
+        if 'bufferView' in accessor:
+            accessor['bufferView'] = buffer_view_index(accessor['bufferView'])
+        if 'sparse' in accessor:
+            sparse = accessor['sparse']
+            for x in [sparse['indices'], sparse['values']]:
+                x['bufferView'] = buffer_view_index(x['bufferView'])
 
-    images = gltf['images']
     for image in images:
         if 'bufferView' in image:
-            image['bufferView'] = buffer_views.index(image['bufferView'])
+            image['bufferView'] = buffer_view_index(image['bufferView'])
 
     # accessorインデックス、materialインデックスに戻す
     meshes = gltf['meshes']
-    materials = gltf['materials']
     for mesh in meshes:
         primitives = mesh['primitives']
         for primitive in primitives:
-            primitive['indices'] = accessors.index(primitive['indices'])
+            primitive['indices'] = accessor_index(primitive['indices'])
             attributes = primitive['attributes']
-            primitive['material'] = materials.index(primitive['material'])
+            primitive['material'] = material_index(primitive['material'])
             for name in attributes:
-                attributes[name] = accessors.index(attributes[name])
+                attributes[name] = accessor_index(attributes[name])
             if 'targets' in primitive:
                 targets = primitive['targets']
                 for target in targets:
                     for name in target:
-                        target[name] = accessors.index(target[name])
+                        target[name] = accessor_index(target[name])
 
     skins = gltf['skins']
     for skin in skins:
-        skin['inverseBindMatrices'] = accessors.index(skin['inverseBindMatrices'])
+        skin['inverseBindMatrices'] = accessor_index(skin['inverseBindMatrices'])
 
-    samplers = gltf['samplers']
-    textures = gltf['textures']
+    # メッシュ、スキンインデックスに戻す
+    mesh_index = reference_indexer(meshes)
+    skin_index = reference_indexer(skins)
+    for node in gltf.get('nodes', []):
+        if 'mesh' in node:
+            node['mesh'] = mesh_index(node['mesh'])
+        if 'skin' in node:
+            node['skin'] = skin_index(node['skin'])
+
+    for bind in list_vrm_mesh_references(gltf['extensions']['VRM']):
+        bind['mesh'] = mesh_index(bind['mesh'])
 
     # 材質テクスチャ変換
-    materials = gltf['materials']
     for material in materials:
         pbr = material['pbrMetallicRoughness']
         for name in ['baseColorTexture', 'metallicRoughnessTexture']:
             if name in pbr:
                 texture = pbr[name]
-                texture['index'] = textures.index(texture['index'])
-        for name in ['normalTexture', 'occulusionTexture', 'emissiveTexture']:
+                texture['index'] = texture_index(texture['index'])
+        for name in MATERIAL_TEXTURE_NAMES:
             if name in material:
                 texture = material[name]
-                texture['index'] = textures.index(texture['index'])
+                texture['index'] = texture_index(texture['index'])
 
     # VRMシェーダーテクスチャ変換
     vrm = gltf['extensions']['VRM']
     if 'texture' in vrm['meta']:
-        vrm['meta']['texture'] = textures.index(vrm['meta']['texture'])
+        vrm['meta']['texture'] = texture_index(vrm['meta']['texture'])
 
     vrm_materials = vrm['materialProperties']
     for material in vrm_materials:
         properties = material['textureProperties']
         for name in properties:
-            properties[name] = textures.index(properties[name])
+            properties[name] = texture_index(properties[name])
 
     for texture in textures:
-        texture['source'] = images.index(texture['source'])
-        texture['sampler'] = samplers.index(texture['sampler'])
+        texture['source'] = image_index(texture['source'])
+        texture['sampler'] = sampler_index(texture['sampler'])
 
     # マテリアル名を戻す
     replace_reg = re.compile(r'(.+)-\d+')
@@ -211,4 +707,4 @@ def indexing(gltf):
     # Exporter名を変更
     vrm['exporterVersion'] = app_name()
 
-    return gltf, chunks
+    return gltf, datas
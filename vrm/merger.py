@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+
+from array import array
+
+from .gltf import copy_gltf, accessor_array, accessor_buffer_views, accessor_floats, create_accessor, sparse_target, \
+    COMPONENT_FORMATS, UNSIGNED_BYTE, UNSIGNED_SHORT, UNSIGNED_INT, FLOAT, ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER
+
+"""
+スキンメッシュの統合
+同じ骨格にバインドされたメッシュの頂点データを連結して、1つのメッシュ、1つのスキンにまとめる
+"""
+
+# インデックスの型 -> 参照できる頂点数(最大値はプリミティブリスタートに使われるので使わない)
+INDEX_LIMITS = {UNSIGNED_BYTE: 255, UNSIGNED_SHORT: 65535, UNSIGNED_INT: 4294967295}
+
+# 逆バインド行列を同じとみなす誤差
+MATRIX_TOLERANCE = 1e-5
+
+IDENTITY_MATRIX = (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+
+
+def is_joints(name):
+    return name.startswith('JOINTS_')
+
+
+def block_key(primitive):
+    """
+    :param primitive: プリミティブ
+    :return: 同じ頂点データ(頂点属性とモーフターゲットのアクセッサー)を参照するプリミティブは同じ値
+    """
+    return (tuple((k, id(v)) for k, v in sorted(primitive['attributes'].items())),
+            tuple(tuple((k, id(v)) for k, v in sorted(t.items())) for t in primitive.get('targets', [])))
+
+
+def vertex_blocks(mesh):
+    """
+    メッシュのプリミティブが参照している頂点データ(頂点属性とモーフターゲットの組)を列挙する
+    :param mesh: メッシュ
+    :return: block_keyの値 -> (頂点属性, モーフターゲットリスト) の辞書(最初に参照された順)
+    """
+    blocks = {}
+    for primitive in mesh['primitives']:
+        blocks.setdefault(block_key(primitive), (primitive['attributes'], primitive.get('targets', [])))
+    return blocks
+
+
+def attribute_signature(mesh):
+    """
+    頂点属性の構成を返す(ジョイント番号は振り直すので型を比較しない)
+    :param mesh: メッシュ
+    :return: 比較用の値、プリミティブごとに構成が異なる場合はNone
+    """
+    signatures = {tuple(sorted((k, None if is_joints(k) else (a['componentType'], a.get('normalized', False)),
+                                a['type']) for k, a in attributes.items()))
+                  for attributes, _ in vertex_blocks(mesh).values()}
+    return signatures.pop() if len(signatures) == 1 else None
+
+
+def target_signature(mesh):
+    """
+    モーフターゲットの属性名を返す
+    :param mesh: メッシュ
+    :return: 属性名のset(モーフターゲットがない場合は空)、プリミティブごとに異なる場合はNone
+    """
+    signatures = {frozenset(k for t in targets for k in t) for _, targets in vertex_blocks(mesh).values()}
+    counts = {len(p.get('targets', [])) for p in mesh['primitives']}
+    return signatures.pop() if len(signatures) == 1 and len(counts) == 1 else None
+
+
+def target_count(mesh):
+    primitives = mesh['primitives']
+    return len(primitives[0].get('targets', [])) if primitives else 0
+
+
+def target_names(mesh):
+    """
+    モーフターゲット名(VRoidはメッシュとプリミティブのextrasに保存する)
+    :param mesh: メッシュ
+    :return: モーフターゲット名リスト、なければNone
+    """
+    if 'targetNames' in mesh.get('extras', {}):
+        return mesh['extras']['targetNames']
+    for primitive in mesh['primitives']:
+        if 'targetNames' in primitive.get('extras', {}):
+            return primitive['extras']['targetNames']
+    return None
+
+
+def joint_matrices(skin):
+    """
+    :param skin: スキン
+    :return: ジョイント(ノード番号) -> 逆バインド行列 の辞書
+    """
+    if 'inverseBindMatrices' not in skin:
+        return {joint: IDENTITY_MATRIX for joint in skin['joints']}
+    values = accessor_floats(skin['inverseBindMatrices'])
+    return {joint: tuple(values[n * 16:(n + 1) * 16]) for n, joint in enumerate(skin['joints'])}
+
+
+def same_matrix(a, b):
+    return all(abs(x - y) <= MATRIX_TOLERANCE for x, y in zip(a, b))
+
+
+class MeshGroup(object):
+    def __init__(self, node, flag):
+        """
+        統合するメッシュのグループ
+        :param node: 先頭のノード(統合後のメッシュ、スキンを設定する)
+        :param flag: 一人称表示の設定(firstPersonFlag)
+        """
+        mesh = node['mesh']
+        self.nodes = [node]
+        self.skeleton = node['skin'].get('skeleton')
+        self.flag = flag
+        self.attributes = attribute_signature(mesh)
+        self.target_names = target_signature(mesh)
+        self.matrices = dict(joint_matrices(node['skin']))
+
+    def compatible(self, node, flag):
+        """
+        :param node: 追加するノード
+        :param flag: 一人称表示の設定
+        :return: グループに追加できればTrue
+        """
+        mesh, skin = node['mesh'], node['skin']
+        if skin.get('skeleton') != self.skeleton or flag != self.flag:
+            return False
+        if attribute_signature(mesh) != self.attributes:
+            return False
+        names = target_signature(mesh)
+        if names and self.target_names and names != self.target_names:
+            return False
+        # 共通のジョイントは逆バインド行列が同じであること
+        matrices = joint_matrices(skin)
+        return all(same_matrix(m, self.matrices[j]) for j, m in matrices.items() if j in self.matrices)
+
+    def add(self, node):
+        self.nodes.append(node)
+        self.target_names = self.target_names or target_signature(node['mesh'])
+        for joint, matrix in joint_matrices(node['skin']).items():
+            self.matrices.setdefault(joint, matrix)
+
+
+def list_mesh_groups(gltf):
+    """
+    統合できるスキンメッシュのグループを列挙する
+    (同じスケルトン、頂点属性の構成、モーフターゲットの属性、一人称表示の設定が同じで、
+    共通のジョイントの逆バインド行列が一致するメッシュ)
+    :param gltf: glTFオブジェクト
+    :return: メッシュグループリスト
+    """
+    nodes = [node for node in gltf['nodes'] if 'mesh' in node and 'skin' in node]
+    # 複数のノードで使われているメッシュは統合しない
+    mesh_users = {}
+    for node in gltf['nodes']:
+        if 'mesh' in node:
+            mesh_users[id(node['mesh'])] = mesh_users.get(id(node['mesh']), 0) + 1
+    nodes = [node for node in nodes if mesh_users[id(node['mesh'])] == 1 and attribute_signature(node['mesh'])
+             and target_signature(node['mesh']) is not None]
+
+    flags = {id(a['mesh']): a.get('firstPersonFlag', 'Auto')
+             for a in gltf['extensions']['VRM'].get('firstPerson', {}).get('meshAnnotations', [])}
+
+    groups = []
+    for node in nodes:
+        flag = flags.get(id(node['mesh']), 'Auto')
+        group = next((g for g in groups if g.compatible(node, flag)), None)
+        if group:
+            group.add(node)
+        else:
+            groups.append(MeshGroup(node, flag))
+    return groups
+
+
+def concatenated_attribute(name, blocks, joint_maps):
+    """
+    各頂点データの頂点属性を連結したアクセッサーを作成する
+    :param name: 頂点属性名
+    :param blocks: 頂点データリスト
+    :param joint_maps: 頂点データごとのジョイント番号の変換表
+    :return: アクセッサー
+    """
+    head = blocks[0][0][name]
+    if not is_joints(name):
+        values = array(COMPONENT_FORMATS[head['componentType']])
+        for attributes, _ in blocks:
+            values.frombytes(accessor_array(attributes[name]).tobytes())
+        return create_accessor(values, head['componentType'], head['type'], ARRAY_BUFFER,
+                               head.get('normalized', False), 'min' in head)
+
+    values = array('I')
+    for (attributes, _), joint_map in zip(blocks, joint_maps):
+        values.extend(joint_map[j] for j in accessor_array(attributes[name]))
+    component_type = UNSIGNED_BYTE if max(values, default=0) <= 255 and all(
+        a[name]['componentType'] == UNSIGNED_BYTE for a, _ in blocks) else UNSIGNED_SHORT
+    return create_accessor(values, component_type, head['type'], ARRAY_BUFFER)
+
+
+def concatenated_target(name, blocks, target_index):
+    """
+    各頂点データのモーフターゲットを連結したアクセッサーを作成する(ターゲットを持たない頂点は0で埋める)
+    0で埋めた頂点があれば、差分が0でない頂点だけを持つsparseアクセッサーにする(小さくなる場合のみ)
+    :param name: 属性名(POSITION, NORMAL, TANGENT)
+    :param blocks: (頂点データ, 統合後のモーフターゲットの開始番号)リスト
+    :param target_index: 統合後のモーフターゲット番号
+    :return: アクセッサー
+    """
+    values = array('f')
+    filled = False
+    for (attributes, targets), offset in blocks:
+        count = attributes['POSITION']['count']
+        n = target_index - offset
+        if 0 <= n < len(targets) and name in targets[n]:
+            values.frombytes(array('f', accessor_floats(targets[n][name])).tobytes())
+        else:
+            values.frombytes(bytes(count * 3 * 4))  # 差分なし
+            filled = True
+    accessor = create_accessor(values, FLOAT, 'VEC3', ARRAY_BUFFER, bounds=name == 'POSITION')
+    # 統合したメッシュの頂点数だけモーフターゲットのデータが増えないようにする
+    return sparse_target(accessor) if filled else accessor
+
+
+def merge_group(gltf, group):
+    """
+    メッシュグループを1つのメッシュ、1つのスキンに統合する
+    :param gltf: glTFオブジェクト
+    :param group: メッシュグループ
+    :return: 統合後のメッシュ、統合後のスキン、元のメッシュ -> モーフターゲットの開始番号 の辞書
+    """
+    meshes = [node['mesh'] for node in group.nodes]
+    skins = [node['skin'] for node in group.nodes]
+
+    # ジョイントを統合(最初に出現した順)
+    joints = list(group.matrices)
+    joint_index = {joint: n for n, joint in enumerate(joints)}
+    ibm = create_accessor([v for joint in joints for v in group.matrices[joint]], FLOAT, 'MAT4')
+
+    # 頂点データを連結
+    blocks, joint_maps, target_offsets, bases = [], [], {}, {}
+    vertex_count = target_total = 0
+    for mesh, skin in zip(meshes, skins):
+        target_offsets[id(mesh)] = target_total
+        joint_map = [joint_index[joint] for joint in skin['joints']]
+        for key, (attributes, targets) in vertex_blocks(mesh).items():
+            bases[key] = vertex_count
+            blocks.append((attributes, targets))
+            joint_maps.append(joint_map)
+            vertex_count += attributes['POSITION']['count']
+        target_total += target_count(mesh)
+
+    new_attributes = {name: concatenated_attribute(name, blocks, joint_maps) for name in blocks[0][0]}
+    mesh_offsets = [target_offsets[id(mesh)] for mesh in meshes for _ in vertex_blocks(mesh)]
+    target_blocks = list(zip(blocks, mesh_offsets))
+    new_targets = [{name: concatenated_target(name, target_blocks, n) for name in sorted(group.target_names)}
+                   for n in range(target_total)]
+
+    # モーフターゲット名、ウェイトを連結
+    names, weights = [], []
+    for mesh in meshes:
+        count = target_count(mesh)
+        names += target_names(mesh) or [''] * count
+        weights += mesh.get('weights', [0.0] * count)
+
+    # VRoidはモーフターゲット名をプリミティブのextrasにも保存している
+    primitive_names = any('targetNames' in p.get('extras', {}) for m in meshes for p in m['primitives'])
+    mesh_names = any('targetNames' in m.get('extras', {}) for m in meshes)
+
+    # プリミティブのインデックスを連結後の頂点番号に変換
+    new_primitives = []
+    for mesh in meshes:
+        for primitive in mesh['primitives']:
+            base = bases[block_key(primitive)]
+            indices = primitive['indices']
+            component_type = indices['componentType']
+            if vertex_count > INDEX_LIMITS[component_type]:
+                component_type = UNSIGNED_INT
+            values = array('I', (i + base for i in accessor_array(indices)))
+            # 頂点属性、モーフターゲットの辞書はindexingで書き換えるのでプリミティブごとに作る
+            new_primitive = dict(primitive, attributes=dict(new_attributes),
+                                 indices=create_accessor(values, component_type, 'SCALAR', ELEMENT_ARRAY_BUFFER))
+            new_primitive.pop('targets', None)
+            if new_targets:
+                new_primitive['targets'] = [dict(target) for target in new_targets]
+            if new_targets and primitive_names:
+                new_primitive['extras'] = dict(primitive.get('extras', {}), targetNames=names)
+            new_primitives.append(new_primitive)
+
+    new_mesh = dict(meshes[0], primitives=new_primitives)
+    new_mesh.pop('weights', None)
+    if new_targets:
+        new_mesh['weights'] = weights
+    if new_targets and mesh_names:
+        new_mesh['extras'] = dict(new_mesh.get('extras', {}), targetNames=names)
+
+    new_skin = dict(skins[0], joints=joints, inverseBindMatrices=ibm)
+
+    # 追加したアクセッサー、bufferViewを登録(使われなくなった要素はclean処理で削除される)
+    accessors = list(new_attributes.values()) + [a for t in new_targets for a in t.values()]
+    accessors += [p['indices'] for p in new_primitives] + [ibm]
+    gltf['accessors'] += accessors
+    gltf['bufferViews'] += [view for a in accessors for view in accessor_buffer_views(a)]
+
+    return new_mesh, new_skin, target_offsets
+
+
+def merged_skinned_meshes(gltf):
+    """
+    同じ骨格にバインドされたスキンメッシュを1つのメッシュに統合する
+    BlendShapeのバインド、一人称表示の設定は統合後のメッシュを参照するように変更する
+    :param gltf: glTFオブジェクト
+    :return: 統合後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes', 'skins')
+    vrm = gltf['extensions']['VRM']
+    binds = [b for g in vrm.get('blendShapeMaster', {}).get('blendShapeGroups', []) for b in g.get('binds', [])]
+    annotations = vrm.get('firstPerson', {}).get('meshAnnotations', [])
+
+    for group in list_mesh_groups(gltf):
+        if len(group.nodes) < 2:
+            continue
+        new_mesh, new_skin, target_offsets = merge_group(gltf, group)
+        head, *others = group.nodes
+        head_mesh, head_skin = head['mesh'], head['skin']
+        old_meshes = {id(node['mesh']) for node in group.nodes}
+
+        # 統合後のメッシュ、スキンは先頭のメッシュ、スキンの位置に置く
+        gltf['meshes'] = [new_mesh if m is head_mesh else m for m in gltf['meshes']
+                          if m is head_mesh or id(m) not in old_meshes]
+        gltf['skins'] = [x for s in gltf['skins'] for x in ([new_skin, s] if s is head_skin else [s])]
+
+        # 先頭のノードに統合後のメッシュを設定し、他のノードからはメッシュを外す
+        head['mesh'], head['skin'] = new_mesh, new_skin
+        for node in others:
+            del node['mesh'], node['skin']
+
+        # BlendShapeのバインドを統合後のモーフターゲット番号に変更
+        for bind in binds:
+            if id(bind['mesh']) in old_meshes:
+                bind['index'] += target_offsets[id(bind['mesh'])]
+                bind['mesh'] = new_mesh
+
+        # 一人称表示の設定を1つにまとめる
+        merged = [a for a in annotations if id(a['mesh']) in old_meshes]
+        for annotation in merged:
+            annotation['mesh'] = new_mesh
+        duplicated = {id(a) for a in merged[1:]}
+        annotations[:] = [a for a in annotations if id(a) not in duplicated]
+
+    # どのノードからも参照されなくなったスキンを削除
+    used_skins = {id(node['skin']) for node in gltf['nodes'] if 'skin' in node}
+    gltf['skins'] = [skin for skin in gltf['skins'] if id(skin) in used_skins]
+
+    return gltf
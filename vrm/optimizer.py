@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+from array import array
+from collections import deque
+
+from .gltf import copy_gltf, accessor_array, accessor_buffer_views, blended_materials, create_accessor, \
+    gathered_accessor, sparse_target, ELEMENT_ARRAY_BUFFER
+from .merger import block_key
+
+"""
+頂点データ、インデックスの最適化
+"""
+
+# 頂点キャッシュ(変換済み頂点のキャッシュ)のサイズ、FIFOとして扱う
+CACHE_SIZE = 16
+
+
+def list_vertex_groups(gltf):
+    """
+    同じ頂点データ(頂点属性とモーフターゲットのアクセッサー)を参照するプリミティブをまとめる
+    :param gltf: glTFオブジェクト
+    :return: プリミティブリストのリスト(最初に参照された順)
+    """
+    groups = {}
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            groups.setdefault(block_key(primitive), []).append(primitive)
+    return list(groups.values())
+
+
+def vertex_count(primitive):
+    """
+    :param primitive: プリミティブ
+    :return: プリミティブが参照している頂点データの頂点数
+    """
+    return next(iter(primitive['attributes'].values()))['count']
+
+
+def vertex_order(index_arrays, reorder=False):
+    """
+    インデックスから参照されている頂点を列挙する
+    :param index_arrays: インデックス配列のリスト
+    :param reorder: Trueでインデックスから最初に参照された順に並べる(頂点フェッチの局所性が上がる)、Falseで元の順番
+    :return: 新しい頂点順に並べた元の頂点番号のリスト
+    """
+    if not reorder:
+        return sorted(set().union(*map(set, index_arrays)))
+
+    order = []
+    seen = set()
+    for indices in index_arrays:
+        for i in indices:
+            if i not in seen:
+                seen.add(i)
+                order.append(i)
+    return order
+
+
+def compacted_vertices(gltf, reorder=False):
+    """
+    インデックスから参照されていない頂点を頂点データ(頂点属性、モーフターゲット)から削除し、インデックスを振り直す
+    プリミティブの削除や統合で使われなくなった頂点を削除する
+    :param gltf: glTFオブジェクト
+    :param reorder: Trueで頂点をインデックスから最初に参照された順に並べ替える
+    :return: 変換後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    for primitives in list_vertex_groups(gltf):
+        if not all('indices' in p for p in primitives):
+            continue  # インデックスを持たないプリミティブは全頂点を使う
+
+        index_arrays = [accessor_array(p['indices']) for p in primitives]
+        order = vertex_order(index_arrays, reorder)
+        if order == list(range(vertex_count(primitives[0]))):
+            continue  # 変更なし
+
+        # 頂点データを新しい頂点順で作り直す
+        head = primitives[0]
+        new_attributes = {name: gathered_accessor(a, order) for name, a in head['attributes'].items()}
+        # sparseのモーフターゲットはsparseのまま
+        new_targets = [{name: sparse_target(gathered_accessor(a, order)) if 'sparse' in a
+                        else gathered_accessor(a, order) for name, a in target.items()}
+                       for target in head.get('targets', [])]
+        accessors = list(new_attributes.values()) + [a for target in new_targets for a in target.values()]
+
+        remap = {old: new for new, old in enumerate(order)}
+        for primitive, indices in zip(primitives, index_arrays):
+            new_indices = create_accessor(array('I', (remap[i] for i in indices)),
+                                          primitive['indices']['componentType'], 'SCALAR', ELEMENT_ARRAY_BUFFER)
+            primitive['indices'] = new_indices
+            # 頂点属性、モーフターゲットの辞書はindexingで書き換えるのでプリミティブごとに作る
+            primitive['attributes'] = dict(new_attributes)
+            if new_targets:
+                primitive['targets'] = [dict(target) for target in new_targets]
+            accessors.append(new_indices)
+
+        # 使われなくなった元のアクセッサーはclean処理で削除される
+        gltf['accessors'] += accessors
+        gltf['bufferViews'] += [view for a in accessors for view in accessor_buffer_views(a)]
+
+    return gltf
+
+
+def count_cache_misses(indices, cache_size=CACHE_SIZE):
+    """
+    FIFOの頂点キャッシュで描画したときのキャッシュミス数を数える
+    :param indices: インデックス配列(三角形リスト)
+    :param cache_size: キャッシュサイズ
+    :return: キャッシュミス数
+    """
+    cache = deque()
+    cached = set()
+    misses = 0
+    for i in indices:
+        if i in cached:
+            continue
+        misses += 1
+        cache.append(i)
+        cached.add(i)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    return misses
+
+
+def tipsified_triangles(indices, vertex_count, cache_size=CACHE_SIZE):
+    """
+    頂点キャッシュのヒット率が上がるように三角形の描画順を並べ替える(Tipsify)
+    キャッシュに残っている頂点を中心に、その頂点を使う三角形を扇状に順に描画する
+    :param indices: インデックス配列(三角形リスト)
+    :param vertex_count: 頂点数
+    :param cache_size: キャッシュサイズ
+    :return: 並べ替えたインデックス配列
+    """
+    triangle_count = len(indices) // 3
+    vertex_triangles = [[] for _ in range(vertex_count)]
+    for t in range(triangle_count):
+        for v in indices[t * 3:t * 3 + 3]:
+            vertex_triangles[v].append(t)
+    live = [len(triangles) for triangles in vertex_triangles]  # 未描画の三角形の数
+    timestamps = [0] * vertex_count  # キャッシュに入った時刻
+    emitted = bytearray(triangle_count)
+    dead_end = []  # 描画した頂点(次の中心頂点の候補)
+    time = cache_size + 1
+    cursor = 0
+    output = array('I')
+
+    fan = indices[0] if triangle_count else -1
+    while fan >= 0:
+        candidates = []
+        for t in vertex_triangles[fan]:
+            if emitted[t]:
+                continue
+            emitted[t] = 1
+            for v in indices[t * 3:t * 3 + 3]:
+                output.append(v)
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - timestamps[v] > cache_size:
+                    timestamps[v] = time  # キャッシュミス
+                    time += 1
+
+        # 次の中心頂点: 三角形を描画し終えるまでキャッシュに残る頂点のうち、最も古い頂点
+        fan, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = time - timestamps[v] if time - timestamps[v] + 2 * live[v] <= cache_size else 0
+                if priority > best:
+                    fan, best = v, priority
+        if fan < 0:
+            # 候補がなければ最近描画した頂点、それもなければ未描画の三角形を持つ頂点を順に探す
+            while dead_end and fan < 0:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fan = v
+            while fan < 0 and cursor < vertex_count:
+                if live[cursor] > 0:
+                    fan = cursor
+                cursor += 1
+    return output
+
+
+def optimized_vertex_cache(gltf, cache_size=CACHE_SIZE):
+    """
+    プリミティブごとに三角形の描画順を頂点キャッシュ向けに並べ替える(描画結果は変わらない)
+    半透明のマテリアルのプリミティブは三角形の描画順で合成結果が変わるので並べ替えない
+    頂点の並びはcompacted_vertices(reorder=True)で参照順に並べ替えること
+    :param gltf: glTFオブジェクト
+    :param cache_size: キャッシュサイズ
+    :return: 変換後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    blended = blended_materials(gltf)
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            if 'indices' not in primitive or primitive.get('mode', 4) != 4 or id(primitive.get('material')) in blended:
+                continue
+            indices = primitive['indices']
+            values = tipsified_triangles(accessor_array(indices), vertex_count(primitive), cache_size)
+            new_indices = create_accessor(values, indices['componentType'], 'SCALAR', ELEMENT_ARRAY_BUFFER)
+            primitive['indices'] = new_indices
+            gltf['accessors'].append(new_indices)
+            gltf['bufferViews'].append(new_indices['bufferView'])
+    return gltf
+
+
+def sparse_morph_targets(gltf):
+    """
+    モーフターゲットを、差分が0でない頂点の番号と値だけを持つsparseアクセッサーに変換する(小さくなる場合のみ)
+    表情のモーフターゲットは顔の一部の頂点しか動かさないので、多くの頂点の差分が0になる
+    :param gltf: glTFオブジェクト
+    :return: 変換後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    converted = {}  # 変換元アクセッサーのid -> 変換後のアクセッサー(共有しているアクセッサーは1回だけ変換する)
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            for target in primitive.get('targets', []):
+                for name, accessor in target.items():
+                    if id(accessor) not in converted:
+                        new_accessor = converted[id(accessor)] = sparse_target(accessor)
+                        if new_accessor is not accessor:
+                            gltf['accessors'].append(new_accessor)
+                            gltf['bufferViews'] += accessor_buffer_views(new_accessor)
+                    target[name] = converted[id(accessor)]
+
+    # 使われなくなった元のアクセッサーはclean処理で削除される
+    return gltf
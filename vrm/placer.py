@@ -1,13 +1,5 @@
 #!/usr/bin/env python
-from typing import List
-
-
-def startswith(start_match: str, targets: List[str]) -> bool:
-    # リスト内要素のstartswith
-    for e in targets:
-        if e.startswith(start_match):
-            return True
-    return False
+from typing import Dict, List, Optional, Tuple
 
 
 def contains(start_match: str, targets: List[str]) -> bool:
@@ -18,41 +10,134 @@ def contains(start_match: str, targets: List[str]) -> bool:
     return False
 
 
+# 結合する服のマテリアル名(先頭にあるものを結合先にする)
+# トップスはclusterの解像度の制限(512px)いっぱいに使えるように結合しない
+CLOTH_MATERIAL_NAMES = ['_Bottoms_', '_Shoes_', '_Accessory_']
+
+
 def get_cloth_place(gltf: dict) -> dict:
     """
-    服のテクスチャの配置を決める
+    結合する服のマテリアルを決める(テクスチャの配置はatlas_layoutで決める)
     :param gltf: glTFオブジェクト(VRM拡張を含む)
-    :return: 配置座標と配置サイズ
+    :return: 結合先マテリアル名と、結合するマテリアル名リスト(服がなければ空)
     """
     material_names = [material['name'] for material in gltf['materials']]
-    has_tops = contains('_Tops_', material_names)
-    has_accessory = contains('_Accessory_', material_names)
-    has_shoes = contains('_Shoes_', material_names)
-    has_bottom = contains('_Bottoms_', material_names)
-    is_skirt = startswith('F00_001_01_Bottoms_', material_names) or startswith('M00_003_01_Bottoms_', material_names)
-
-    place = {}
-    main = None  # 結合先マテリアル
-    ox, oy = 0, 0  # オフセット
-
-    if has_bottom:
-        main = main or '_Bottoms_'
-        place['_Bottoms_'] = {'pos': (0, oy), 'size': (1024, 1024)}
-        oy = 1024
-        if is_skirt:
-            place['_Bottoms_']['size'] = (1024, 512)
-            oy = 512
-    
-    if has_shoes:
-        main = main or '_Shoes_'
-        place['_Shoes_'] = {'pos': (0, oy), 'size': (512, 512)}
-        ox = ox + 512
-
-    if has_accessory:
-        main = main or '_Accessory_' 
-        place['_Accessory_'] = {'pos': (512, oy), 'size': (512, 512)}
-
-    if not main:
+    names = [name for name in CLOTH_MATERIAL_NAMES if contains(name, material_names)]
+    if not names:
         return {}  # 素体の場合
 
-    return {'main': main, 'place': place}
+    return {'main': names[0], 'names': names}
+
+
+def power_of_two_sizes(min_size: Tuple[int, int], max_size: Tuple[int, int], area: int) -> List[Tuple[int, int]]:
+    """
+    アトラスサイズの候補(2のべき乗)を小さい順に列挙する
+    :param min_size: 最小の幅、高さ
+    :param max_size: 最大の幅、高さ
+    :param area: 最小の面積
+    :return: (幅, 高さ)リスト(面積、長辺、高さの順)
+    """
+    def powers(low, high):
+        n = 1
+        while n <= high:
+            if n >= low:
+                yield n
+            n *= 2
+
+    sizes = [(w, h) for w in powers(min_size[0], max_size[0]) for h in powers(min_size[1], max_size[1])
+             if w * h >= area]
+    return sorted(sizes, key=lambda s: (s[0] * s[1], max(s), s[1]))
+
+
+def contains_rect(outer: Tuple[int, int, int, int], inner: Tuple[int, int, int, int]) -> bool:
+    """
+    :param outer: 矩形(x, y, 幅, 高さ)
+    :param inner: 矩形(x, y, 幅, 高さ)
+    :return: outerがinnerを含んでいればTrue
+    """
+    ox, oy, ow, oh = outer
+    ix, iy, iw, ih = inner
+    return ox <= ix and oy <= iy and ix + iw <= ox + ow and iy + ih <= oy + oh
+
+
+def packed_positions(sizes: List[Tuple[int, int]], atlas_size: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+    """
+    矩形をアトラスに重ならないように配置する(MaxRects法、空き領域の短辺の余りが最小の位置に置く)
+    大きい矩形から順に配置する。テクスチャは回転しない
+    :param sizes: 矩形の(幅, 高さ)リスト
+    :param atlas_size: アトラスの幅、高さ
+    :return: 矩形の配置座標リスト、配置できなければNone
+    """
+    free = [(0, 0) + tuple(atlas_size)]  # 空き領域(x, y, 幅, 高さ)
+    positions = [None] * len(sizes)
+    for n in sorted(range(len(sizes)), key=lambda i: (-max(sizes[i]), -sizes[i][0] * sizes[i][1], i)):
+        w, h = sizes[n]
+        fits = [((min(fw - w, fh - h), max(fw - w, fh - h), fy, fx), (fx, fy)) for fx, fy, fw, fh in free
+                if w <= fw and h <= fh]
+        if not fits:
+            return None
+        x, y = min(fits)[1]
+        positions[n] = (x, y)
+
+        # 配置した矩形と重なる空き領域を、重ならない部分(最大4つ)に分割する
+        split = []
+        for fx, fy, fw, fh in free:
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                split.append((fx, fy, fw, fh))
+                continue
+            if x > fx:
+                split.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                split.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                split.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                split.append((fx, y + h, fw, fy + fh - y - h))
+        # 他の空き領域に含まれる空き領域は除く(同じ領域は先頭だけ残す)
+        free = [r for i, r in enumerate(split)
+                if not any(j != i and contains_rect(o, r) and (o != r or j < i) for j, o in enumerate(split))]
+    return positions
+
+
+def packed_layout(sizes: Dict[str, Tuple[int, int]], max_size: Tuple[int, int]) -> Optional[dict]:
+    """
+    テクスチャを配置できる最小(面積)の2のべき乗のアトラスを求める
+    :param sizes: マテリアル名 -> テクスチャの幅、高さ
+    :param max_size: アトラスの幅、高さの上限
+    :return: アトラスの幅、高さと、マテリアル名 -> 配置座標と配置サイズ。上限に収まらなければNone
+    """
+    names = list(sizes)
+    rects = [sizes[name] for name in names]
+    min_size = (max(w for w, _ in rects), max(h for _, h in rects))
+    for atlas_size in power_of_two_sizes(min_size, max_size, sum(w * h for w, h in rects)):
+        positions = packed_positions(rects, atlas_size)
+        if positions:
+            place = {name: {'pos': pos, 'size': size} for name, pos, size in zip(names, positions, rects)}
+            return {'size': atlas_size, 'place': place}
+    return None
+
+
+def atlas_layout(sizes: Dict[str, Tuple[int, int]], priorities: Dict[str, int],
+                 max_size: Tuple[int, int]) -> Optional[dict]:
+    """
+    テクスチャを1枚のアトラスにまとめる配置を決める
+    上限以下の全てのアトラスサイズに配置できない場合だけ、優先度を考慮して最も大きいテクスチャを縦横半分に縮小して配置し直す
+    (優先度が1大きいテクスチャは、縦横2倍のサイズまで縮小されない)
+    縮小は1枚ずつ縦横半分にするだけなので、上限の面積を使い切るとは限らない
+    (例: 2048x2048と1024x1024を上限2048x2048に配置すると、2048x2048を1024x1024に縮小した2048x1024のアトラスになる)
+    :param sizes: マテリアル名 -> テクスチャの幅、高さ
+    :param priorities: マテリアル名 -> 優先度(指定がなければ0)
+    :param max_size: アトラスの幅、高さの上限
+    :return: アトラスの幅、高さと、マテリアル名 -> 配置座標と配置サイズ。配置できなければNone
+    """
+    if not sizes:
+        return None
+    sizes = dict(sizes)
+    while not (layout := packed_layout(sizes, max_size)):
+        shrinkable = [name for name, (w, h) in sizes.items() if w > 1 or h > 1]
+        if not shrinkable:
+            return None
+        name = max(shrinkable, key=lambda n: sizes[n][0] * sizes[n][1] / 4 ** priorities.get(n, 0))
+        w, h = sizes[name]
+        sizes[name] = (max(1, w // 2), max(1, h // 2))
+    return layout
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+from array import array
+
+from .gltf import copy_gltf, accessor_array, accessor_buffer_views, accessor_floats, accessor_layout, \
+    create_accessor, sparse_target, FLOAT, UNSIGNED_BYTE, UNSIGNED_SHORT, ARRAY_BUFFER
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # NumPyがなければarrayで処理する
+
+"""
+頂点属性の量子化(KHR_mesh_quantization)
+"""
+
+EXTENSION_NAME = 'KHR_mesh_quantization'
+
+BYTE = 5120
+SHORT = 5122
+
+# componentType -> 正規化した整数の最大値
+NORMALIZED_MAX = {BYTE: 127, UNSIGNED_BYTE: 255, SHORT: 32767, UNSIGNED_SHORT: 65535}
+
+# 頂点属性名 -> 量子化後のcomponentType(正規化する)
+ATTRIBUTE_TYPES = {
+    'NORMAL': BYTE,
+    'TANGENT': BYTE,
+    'TEXCOORD': UNSIGNED_SHORT,
+    'WEIGHTS': UNSIGNED_BYTE,
+}
+
+# glTF本体で使える量子化(KHR_mesh_quantizationを宣言しなくてよい)
+CORE_ATTRIBUTES = ('WEIGHTS', 'JOINTS')
+
+
+def attribute_kind(name):
+    """
+    :param name: 頂点属性名
+    :return: 添字を除いた頂点属性名(TEXCOORD_0 -> TEXCOORD)
+    """
+    return name.split('_')[0] if name.startswith(('TEXCOORD_', 'COLOR_', 'JOINTS_', 'WEIGHTS_')) else name
+
+
+def quantized_values(values, component_type):
+    """
+    実数値を正規化した整数値に変換する(範囲外の値は丸める)
+    :param values: 実数値の配列
+    :param component_type: 変換後のcomponentType
+    :return: 整数値のリスト
+    """
+    scale = NORMALIZED_MAX[component_type]
+    low = -scale if component_type in (BYTE, SHORT) else 0
+    return [min(max(round(v * scale), low), scale) for v in values]
+
+
+def quantized_weights(values, component_type=UNSIGNED_BYTE):
+    """
+    スキンウェイトを正規化値に変換する
+    丸め誤差で合計が1からずれないように、各頂点の最大のウェイトで合計を最大値(UNSIGNED_BYTEは255)に合わせる
+    :param values: 実数値の配列(VEC4)
+    :param component_type: 変換後のcomponentType(UNSIGNED_BYTE, UNSIGNED_SHORT)
+    :return: 整数値のリスト
+    """
+    quantized = quantized_values(values, component_type)
+    total = NORMALIZED_MAX[component_type]
+    for n in range(0, len(quantized), 4):
+        weights = quantized[n:n + 4]
+        if not any(weights):
+            continue  # ウェイトを持たない頂点
+        largest = n + weights.index(max(weights))
+        quantized[largest] += total - sum(weights)
+    return quantized
+
+
+def padded_accessor(accessor):
+    """
+    要素の間隔が4バイトの倍数になるようにbufferViewのデータを詰め直す(byteStrideを設定する)
+    頂点属性の要素は4バイト境界に配置しなければならない
+    :param accessor: 作成したばかりのアクセッサー(bufferViewを他と共有していないこと)
+    :return: アクセッサー
+    """
+    _, _, element_size, _ = accessor_layout(accessor)
+    stride = (element_size + 3) // 4 * 4
+    if stride == element_size:
+        return accessor
+
+    view = accessor['bufferView']
+    if numpy is not None:
+        padded = numpy.zeros((accessor['count'], stride), dtype=numpy.uint8)
+        padded[:, :element_size] = numpy.frombuffer(view['data'], dtype=numpy.uint8).reshape(-1, element_size)
+        data = padded.tobytes()
+    else:
+        data = bytes(view['data'])
+        padding = bytes(stride - element_size)
+        data = b''.join(data[n:n + element_size] + padding for n in range(0, len(data), element_size))
+    view['data'] = data
+    view['byteLength'] = len(data)
+    view['byteStride'] = stride
+    return accessor
+
+
+def quantized_accessor(accessor, component_type, weights=False):
+    """
+    実数のアクセッサーを正規化した整数のアクセッサーに変換する(glTFオブジェクトへの追加は呼び出し側で行う)
+    :param accessor: FLOATのアクセッサー
+    :param component_type: 変換後のcomponentType
+    :param weights: Trueでスキンウェイトとして各頂点の合計を保つ
+    :return: アクセッサー
+    """
+    values = accessor_floats(accessor)
+    quantized = quantized_weights(values) if weights else quantized_values(values, component_type)
+    return padded_accessor(create_accessor(quantized, component_type, accessor['type'], ARRAY_BUFFER, True,
+                                           'min' in accessor))
+
+
+def attribute_component_type(name, accessor):
+    """
+    頂点属性の量子化後のcomponentTypeを決める
+    :param name: 頂点属性名
+    :param accessor: アクセッサー
+    :return: componentType、量子化しない場合はNone
+    """
+    kind = attribute_kind(name)
+    if kind not in ATTRIBUTE_TYPES or accessor['componentType'] != FLOAT:
+        return None
+    if kind == 'TEXCOORD':
+        # 0～1の範囲外のUVは正規化できない(テクスチャ座標の変換が必要になる)
+        values = accessor_floats(accessor)
+        if len(values) and (min(values) < 0.0 or max(values) > 1.0):
+            return None
+    return ATTRIBUTE_TYPES[kind]
+
+
+def target_component_type(accessor):
+    """
+    モーフターゲット(差分)の量子化後のcomponentTypeを決める
+    SHORTの正規化値の誤差は最大でも0.5/32767なので、値が-1～1の範囲に収まれば量子化する
+    :param accessor: アクセッサー
+    :return: componentType、量子化しない場合はNone
+    """
+    if accessor['componentType'] != FLOAT:
+        return None
+    values = accessor_floats(accessor)
+    if len(values) and max(max(values), -min(values)) > 1.0:
+        return None
+    return SHORT
+
+
+def quantized_joints(accessor):
+    """
+    ジョイント番号を可能ならUNSIGNED_BYTEにする(glTFオブジェクトへの追加は呼び出し側で行う)
+    :param accessor: JOINTSのアクセッサー
+    :return: アクセッサー、変換しない場合はNone
+    """
+    if accessor['componentType'] == UNSIGNED_BYTE:
+        return None
+    values = accessor_array(accessor)
+    if len(values) and max(values) > 255:
+        return None
+    return create_accessor(array('B', values), UNSIGNED_BYTE, accessor['type'], ARRAY_BUFFER)
+
+
+def quantized_meshes(gltf):
+    """
+    頂点属性とモーフターゲットを整数に量子化してデータ量を減らす
+    法線、接線はBYTE、UVはUNSIGNED_SHORT、スキンウェイトはUNSIGNED_BYTE、ジョイント番号はUNSIGNED_BYTE、
+    モーフターゲットはSHORT(いずれも正規化)に変換し、glTF本体で扱えない型を使う場合はKHR_mesh_quantizationを宣言する
+    位置座標はノードの変換で元に戻す必要があるので変換しない
+    :param gltf: glTFオブジェクト
+    :return: 変換後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    converted = {}  # 変換元アクセッサーのid -> 変換後のアクセッサー(共有しているアクセッサーは1回だけ変換する)
+    extended = False
+
+    def convert(name, accessor, target=False):
+        nonlocal extended
+        if id(accessor) not in converted:
+            kind = attribute_kind(name)
+            if kind == 'JOINTS':
+                new_accessor = quantized_joints(accessor)
+            else:
+                component_type = target_component_type(accessor) if target \
+                    else attribute_component_type(name, accessor)
+                new_accessor = component_type and quantized_accessor(accessor, component_type, kind == 'WEIGHTS')
+                if new_accessor and 'sparse' in accessor:
+                    new_accessor = sparse_target(new_accessor)  # sparseのモーフターゲットはsparseのまま
+            converted[id(accessor)] = new_accessor or accessor
+            if new_accessor:
+                gltf['accessors'].append(new_accessor)
+                gltf['bufferViews'] += accessor_buffer_views(new_accessor)
+                extended |= target or kind not in CORE_ATTRIBUTES
+        return converted[id(accessor)]
+
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            attributes = primitive['attributes']
+            for name in attributes:
+                attributes[name] = convert(name, attributes[name])
+            for target in primitive.get('targets', []):
+                for name in target:
+                    target[name] = convert(name, target[name], True)
+
+    if extended:
+        # 量子化した頂点属性を読めない環境では表示できないので必須拡張にする
+        for key in ['extensionsUsed', 'extensionsRequired']:
+            names = gltf.setdefault(key, [])
+            if EXTENSION_NAME not in names:
+                names.append(EXTENSION_NAME)
+
+    # 使われなくなった元のアクセッサーはclean処理で削除される
+    return gltf
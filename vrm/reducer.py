@@ -1,55 +1,124 @@
 #!/usr/bin/env python
 
-import struct
-from copy import deepcopy
+import hashlib
+from array import array
 from io import BytesIO
 from itertools import groupby
 
 from PIL import Image
 
-from .cleaner import clean
-from .placer import get_cloth_place
-from .util import find, exists, unique, distance
+try:
+    import numpy
+except ImportError:
+    numpy = None  # NumPyがなければarrayで処理する
+
+from .blendshape import pruned_morph_targets
+from .cache import ImageCache
+from .cleaner import clean, pruned_attributes, pruned_nodes
+from .debug import count_draw_calls, count_joints, count_morph_targets, count_vertices, cache_miss_ratio, \
+    spring_bone_cost, vertex_data_size
+from .gltf import copy_gltf, accessor_array, accessor_floats, blended_materials, set_accessor_array, FLOAT, \
+    MATERIAL_TEXTURE_NAMES
+from .merger import block_key, merged_skinned_meshes
+from .optimizer import compacted_vertices, optimized_vertex_cache, sparse_morph_targets
+from .placer import atlas_layout, get_cloth_place
+from .quantizer import quantized_meshes
+from .simplifier import simplified_meshes
+from .skinner import reduced_skins, MAX_INFLUENCES
+from .spring import reduced_spring_bones
+from .util import find, exists, unique, distance, parallel_map
 
 """
 VRoidモデルの削減処理
 """
 
+# インデックスを連結して1つの描画呼び出しにできる描画モード(POINTS, LINES, TRIANGLES)
+BATCHABLE_MODES = (0, 1, 4)
 
-def unique_vrm_materials(vrm_materials):
+
+# 列挙値、フラグを表す実数のMToonプロパティ(重複排除で丸めずに比較する)
+ENUM_FLOAT_PROPERTIES = {'_MToonVersion', '_DebugMode', '_BlendMode', '_OutlineWidthMode', '_OutlineColorMode',
+                         '_CullMode', '_OutlineCullMode', '_SrcBlend', '_DstBlend', '_ZWrite', '_AlphaToMask'}
+
+
+def frozen(value):
+    """
+    JSON値をハッシュ化可能な値に変換する
+    :param value: JSON値(辞書、リスト、数値など)
+    :return: ハッシュ化可能な値
+    """
+    if isinstance(value, dict):
+        return tuple(sorted(((k, frozen(v)) for k, v in value.items()), key=lambda kv: kv[0]))
+    if isinstance(value, list):
+        return tuple(frozen(v) for v in value)
+    if isinstance(value, bytearray):
+        return bytes(value)
+    return value
+
+
+def rounded(value, tolerance):
+    """
+    実数(リストの場合は各要素)を幅toleranceの区間の番号に丸める
+    同じ区間の値の差はtolerance未満になるが、区間の境界をまたぐ値は差がtolerance未満でも別の区間になる
+    (差が小さい値同士が必ず同じ区間になるわけではない)
+    :param value: 実数、実数のリスト
+    :param tolerance: 区間の幅
+    :return: 区間の番号、区間の番号のリスト
+    """
+    if isinstance(value, list):
+        return [rounded(v, tolerance) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(value / tolerance)
+    return value
+
+
+def material_fingerprint(material, tolerance=None):
+    """
+    VRMマテリアルの比較用の値を返す
+    :param material: VRMマテリアル
+    :param tolerance: 色、係数などの実数値を丸める幅(Noneの場合は完全一致で比較)
+    :return: ハッシュ化可能な値
+    """
+    # 読み込み時に別々になるように書き換えているため、nameキーを除外して比較
+    copied = {k: v for k, v in material.items() if k != 'name'}
+    if '_OutlineColor' in copied['vectorProperties']:
+        # 0.4.0-p1でOutlineColorが統一されないバグがあるので除外する
+        copied['vectorProperties'] = {k: v for k, v in copied['vectorProperties'].items() if k != '_OutlineColor'}
+    if tolerance:
+        # 色、係数だけを丸める(列挙値、renderQueue、テクスチャなどは完全一致で比較)
+        copied['vectorProperties'] = {k: rounded(v, tolerance) for k, v in copied['vectorProperties'].items()}
+        if 'floatProperties' in copied:
+            copied['floatProperties'] = {k: v if k in ENUM_FLOAT_PROPERTIES else rounded(v, tolerance)
+                                         for k, v in copied['floatProperties'].items()}
+    return frozen(copied)
+
+
+def unique_vrm_materials(vrm_materials, tolerance=None):
     """
     マテリアル名 -> 重複元マテリアル の対応辞書を返す
     :param vrm_materials: VRMマテリアルリスト
+    :param tolerance: 色などの実数値を丸める幅(Noneの場合は完全一致で比較)
     :return: マテリアル名 -> 重複元マテリアル名 の対応辞書
     """
-    # ハッシュ化の関係で辞書が使えなかったので、リスト2つで代用
-    copied_materials = []  # nameキーを削除したマテリアルのリスト
-    unique_material_names = []  # 重複しないマテリアル名リスト
+    unique_material_names = {}  # 比較用の値 -> 重複元マテリアル名
     for material in vrm_materials:
-        copied = deepcopy(material)
-        del copied['name']  # 読み込み時に別々になるように書き換えているため、nameキーを除外して比較
-        if '_OutlineColor' in copied['vectorProperties']:
-            # 0.4.0-p1でOutlineColorが統一されないバグがあるので除外する
-            del copied['vectorProperties']['_OutlineColor']
+        key = material_fingerprint(material, tolerance)
+        yield material['name'], unique_material_names.setdefault(key, material['name'])
 
-        if copied not in copied_materials:
-            copied_materials.append(copied)
-            unique_material_names.append(material['name'])
-        yield material['name'], unique_material_names[copied_materials.index(copied)]
 
-
-def deduplicated_materials(gltf):
+def deduplicated_materials(gltf, tolerance=None):
     """
     重複マテリアルを排除する
     :param gltf: glTFオブジェクト
+    :param tolerance: 色などの実数値を丸める幅(Noneの場合は完全一致で比較)
     :return: 重複排除後のglTFオブジェクト
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'meshes', 'extensions')
 
     # VRMマテリアルを元に重複排除
     vrm = gltf['extensions']['VRM']
     # マテリアル名 -> 重複元マテリアル名の対応
-    unique_name_map = dict(unique_vrm_materials(vrm['materialProperties']))
+    unique_name_map = dict(unique_vrm_materials(vrm['materialProperties'], tolerance))
     unique_material_name_set = unique(unique_name_map.values())
 
     # マテリアル名 -> マテリアルの対応
@@ -83,7 +152,7 @@ def find_meshes(meshes, name):
 def combine_primitives(primitives):
     """
     プリミティブリストを1つのプリミティブに結合する
-    ※連続したプリミティブであることを前提
+    ※頂点属性、描画モード、インデックスの型が同じプリミティブであることを前提
     :param primitives: プリミティブリスト
     :return: 結合済みプリミティブ、追加アクセッサー、追加bufferView
     """
@@ -91,43 +160,32 @@ def combine_primitives(primitives):
     # ヘアメッシュ内のプリミティブインデックスのアクセッサーを列挙
     primitive_indices = [primitive['indices'] for primitive in primitives]
 
-    # プリミティブのbufferView列挙
-    buffer_views = list(map(lambda indices: indices['bufferView'], primitive_indices))
-    head_view = buffer_views[0]
     # 統合したbufferViewを作成
-    buf = head_view['buffer']
-    offset = head_view['byteOffset']
-    data = b''.join(map(lambda view: view['data'], buffer_views))  # バイトデータ
+    head_view = primitive_indices[0]['bufferView']
+    data = b''.join(map(lambda indices: accessor_array(indices).tobytes(), primitive_indices))  # バイトデータ
     new_view = {
-        'buffer': buf,
-        'byteOffset': offset,
+        'buffer': head_view['buffer'],
+        'byteOffset': 0,  # 保存時に設定し直される(元のbufferViewの位置は使わない)
         'byteLength': len(data),
-        'target': head_view['target'],
         'data': data
     }
-    if 'byteStride' in head_view:
-        new_view['byteStride'] = head_view['byteStride']  # NOTE; VRoidでは出力されない
+    if 'target' in head_view:  # targetは省略できる
+        new_view['target'] = head_view['target']
 
     # アクセッサーを統合
     accessor_count = sum(map(lambda x: x['count'], primitive_indices))  # アクセッサー総要素数
     head_indices = primitive_indices[0]
     new_accessor = {
         'count': accessor_count,
-        'byteOffset': head_indices['byteOffset'],
+        'byteOffset': 0,
         'bufferView': new_view,
         'componentType': head_indices['componentType'],
         'type': head_indices['type'],
-        'normalized': head_indices['normalized']
+        'normalized': head_indices.get('normalized', False)
     }
 
-    # 髪メッシュのプリミティブを統合
-    head_primitive = primitives[0]
-    new_primitive = {
-        'mode': head_primitive['mode'],
-        'indices': new_accessor,
-        'attributes': head_primitive['attributes'],
-        'material': head_primitive['material']
-    }
+    # 先頭のプリミティブの頂点属性、モーフターゲットを引き継いで統合
+    new_primitive = dict(primitives[0], indices=new_accessor)
 
     return new_primitive, new_accessor, new_view
 
@@ -139,7 +197,7 @@ def combine_all_primitives(gltf, name):
     :param name: マテリアル名
     :return: プリミティブ結合後のgltfオブジェクト
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'meshes')
     # ヘアメッシュ
     hair_meshes = find_meshes(gltf['meshes'], name)
     if not hair_meshes:
@@ -162,6 +220,53 @@ def combine_all_primitives(gltf, name):
     return gltf
 
 
+def batch_key(primitive):
+    """
+    1つの描画呼び出しにまとめられるプリミティブは同じ値を返す
+    (マテリアル、描画モード、インデックスの型、頂点属性とモーフターゲットのアクセッサーが同じ)
+    :param primitive: プリミティブ
+    :return: 比較用の値
+    """
+    indices = primitive['indices']
+    return id(primitive.get('material')), primitive.get('mode', 4), indices['componentType'], block_key(primitive)
+
+
+def batched_primitives(gltf):
+    """
+    全メッシュで同じ描画呼び出しにまとめられるプリミティブを統合する(隣接していないプリミティブも統合する)
+    半透明のマテリアルのプリミティブは描画順で合成結果が変わるので、隣接しているものだけ統合する
+    :param gltf: glTFオブジェクト
+    :return: プリミティブ統合後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    blended = blended_materials(gltf)
+    for mesh in gltf['meshes']:
+        # 統合先のキー -> プリミティブリスト(最初に出現した順)
+        batches = {}
+        last_key, last_batch = None, None  # 直前のプリミティブの比較用の値、統合先のキー
+        for primitive in mesh['primitives']:
+            # インデックスを連結できない描画モード(ストリップ、ファン)は統合しない
+            mergeable = 'indices' in primitive and primitive.get('mode', 4) in BATCHABLE_MODES
+            key = batch = batch_key(primitive) if mergeable else id(primitive)
+            if mergeable and id(primitive.get('material')) in blended:
+                batch = last_batch if key == last_key else ('adjacent', id(primitive))
+            batches.setdefault(batch, []).append(primitive)
+            last_key, last_batch = key, batch
+
+        new_primitives = []
+        for primitives in batches.values():
+            if len(primitives) == 1:
+                new_primitives.append(primitives[0])
+                continue
+            primitive, accessor, buffer_view = combine_primitives(primitives)
+            new_primitives.append(primitive)
+            gltf['accessors'].append(accessor)
+            gltf['bufferViews'].append(buffer_view)
+        mesh['primitives'] = new_primitives
+
+    return gltf
+
+
 def remove_primitives(gltf, material_names):
     """
     指定したマテリアル名のプリミティブを削除する
@@ -169,7 +274,7 @@ def remove_primitives(gltf, material_names):
     :param material_names: マテリアル名リスト
     :return: プリミティブ削除後のglTFオブジェクト
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'meshes')
 
     def contain_name(name):
         for material_name in material_names:
@@ -214,7 +319,7 @@ def shrink_materials(gltf):
     バンプマップ、スフィアマップを削除する
     :param gltf: glTFオブジェクト
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'materials', 'extensions')
     shrink_gltf_materials(gltf['materials'])
     shrink_vrm_materials(gltf['extensions']['VRM']['materialProperties'])
     return gltf
@@ -243,7 +348,7 @@ def emissive_mtoon_materials(gltf):
     :param gltf: glTFオブジェクト
     :return:
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'extensions')
     for material in gltf['extensions']['VRM']['materialProperties']:
         emissive_mtoon_material(material)
     return gltf
@@ -276,7 +381,7 @@ def sorted_mesh_primitives(gltf, mesh_name, material_name_order):
     :param material_name_order: 描画順のマテリアル部分名
     :return: マテリアル順にプリミティブをソートしたglTFオブジェクト
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'meshes')
     for mesh in find_meshes(gltf['meshes'], mesh_name):
         mesh['primitives'] = sorted_primitives(mesh['primitives'], material_name_order)
 
@@ -331,12 +436,15 @@ def find_vrm_material(gltf, name):
     return find_material_from_name(gltf['extensions']['VRM']['materialProperties'], name)
 
 
-def load_img(image_buffer):
+def load_img(image_buffer, cache=None):
     """
     画像ファイル(バイトデータ)をPILで読み込む
     :param image_buffer: 画像ファイルのバイトデータ
+    :param cache: デコード済み画像のキャッシュ(指定した場合はキャッシュから取得、なければデコードして追加する)
     :return: PIL.Imageオブジェクト
     """
+    if cache is not None:
+        return cache.load(image_buffer)
     return Image.open(BytesIO(image_buffer))
 
 
@@ -383,15 +491,14 @@ def primitives_has_material(gltf, material_name):
 def list_primitives(gltf, names):
     """
     指定したマテリアル名を持つプリミティブの情報を列挙する
-    マテリアル名、プリミティブ、bufferViewインデックスを列挙
+    マテリアル名、プリミティブを列挙
     :param gltf: glTFオブジェクト
     :param names: マテリアル名リスト
-    :return: (マテリアル名、プリミティブ、bufferViewインデックス)リスト(generator)
+    :return: (マテリアル名、プリミティブ)リスト(generator)
     """
     for name in names:
         for primitive in primitives_has_material(gltf, name):
-            view_index = gltf['bufferViews'].index(primitive['attributes']['TEXCOORD_0']['bufferView'])
-            yield name, primitive, view_index
+            yield name, primitive
 
 
 def merge_dict_recursive(source, destination):
@@ -410,7 +517,41 @@ def merge_dict_recursive(source, destination):
     # return destination
 
 
-def combine_material(gltf, resize_info, base_material_name, texture_size=(2048, 2048)):
+def remapped_uvs(uvs, original_uvs, indices, rect):
+    """
+    頂点インデックスが参照するUV座標を結合後のテクスチャ上の配置先に変換する
+    結合前の値から変更されているUV座標は変換済みとしてスキップする
+    :param uvs: UV座標の配列(u, vの順に並べた1次元配列)
+    :param original_uvs: 結合前のUV座標の配列
+    :param indices: 頂点インデックスリスト
+    :param rect: 配置先(x, y, w, h)
+    :return: 変換後のUV座標の配列
+    """
+    x, y, w, h = rect
+    if numpy is not None:
+        uv = numpy.array(uvs, dtype=numpy.float32)
+        original = numpy.asarray(original_uvs, dtype=numpy.float32)
+        u_index = numpy.unique(numpy.asarray(indices, dtype=numpy.int64)) * 2
+        v_index = u_index + 1
+        u_index = u_index[(uv[u_index] == original[u_index]) & (uv[v_index] == original[v_index])]
+        v_index = u_index + 1
+        # 1頂点ずつ計算する場合と結果が同じになるように倍精度で計算する
+        uv[u_index] = x + uv[u_index].astype(numpy.float64) * w
+        uv[v_index] = y + uv[v_index].astype(numpy.float64) * h
+        return uv
+
+    uv = array('f', uvs)
+    for index in set(indices):
+        i = index * 2
+        u, v = uv[i], uv[i + 1]
+        if u != original_uvs[i] or v != original_uvs[i + 1]:
+            continue  # 更新されていればスキップ
+        uv[i], uv[i + 1] = x + u * w, y + v * h
+    return uv
+
+
+def combine_material(gltf, resize_info, base_material_name, texture_size=(2048, 2048), jobs=1, cache=None,
+                     atlas_size=None):
     """
     再配置情報で指定されたマテリアルを結合する
     テクスチャも結合する
@@ -418,20 +559,23 @@ def combine_material(gltf, resize_info, base_material_name, texture_size=(2048,
     :param resize_info: マテリアル名とテクスチャ配置情報
     :param base_material_name: 統合先にするマテリアル
     :param texture_size: 指定したサイズ以下に縮小する
+    :param jobs: テクスチャの読み込み、縮小の並列数
+    :param cache: デコード済み画像のキャッシュ
+    :param atlas_size: 結合した画像のサイズ(Noneの場合は配置情報の全体を含むサイズ)
     :return: マテリアル結合したglTFオブジェクト
     """
     no_base_materials = [find_vrm_material(gltf, name) for name in resize_info if base_material_name != name]
     if not no_base_materials:
         return gltf  # 結合先でないマテリアルがない場合、結合済み
 
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'bufferViews')
 
     vrm_materials = {name: find_vrm_material(gltf, name) for name in resize_info}
     main_tex_sources = {name: material['textureProperties']['_MainTex']['source'] for name, material in
                         vrm_materials.items() if material}
 
     # リサイズ指定サイズ
-    resize_w, resize_h = max_size(resize_info)
+    resize_w, resize_h = atlas_size or max_size(resize_info)
     # テクスチャ指定サイズ
     tex_w, tex_h = texture_size
 
@@ -450,14 +594,20 @@ def combine_material(gltf, resize_info, base_material_name, texture_size=(2048,
 
     scaled_info = dict(scaled())
 
-    # 再配置情報を元に1つの画像にまとめる
+    def resized_image(item):
+        # テクスチャを配置サイズに縮小する
+        name, tex_source = item
+        pil_image = load_img(tex_source['bufferView']['data'], cache)
+        return pil_image.resize(scaled_info[name]['size'], Image.BICUBIC)  # 透過境界部分にノイズが出ないようにBICUBICを使用
+
+    # 再配置情報を元に1つの画像にまとめる(縮小は並列に処理し、貼り付けは順番に行う)
     one_image = Image.new("RGBA", (image_w, image_h), (0, 0, 0, 0))
-    for name, tex_source in main_tex_sources.items():
-        pil_image = load_img(tex_source['bufferView']['data'])
-        info = scaled_info[name]
-        resized = pil_image.resize(info['size'], Image.BICUBIC)  # 透過境界部分にノイズが出ないようにBICUBICを使用
-        one_image.paste(resized, info['pos'])
+    resized_images = parallel_map(resized_image, main_tex_sources.items(), jobs)
+    for name, resized in zip(main_tex_sources, resized_images):
+        one_image.paste(resized, scaled_info[name]['pos'])
     new_view = {'data': image2bytes(one_image, 'png')}  # pngファイルデータに変換
+    if cache is not None:
+        cache.put(new_view['data'], one_image)  # 結合画像はデコードし直さずに引き継ぐ
     # 結合画像名は各画像名を結合した名前にする
     image_names = [source['name'] for source in main_tex_sources.values() if source['name']]
     new_image = {'name': '-'.join(image_names), 'mimeType': 'image/png', 'bufferView': new_view}
@@ -485,50 +635,62 @@ def combine_material(gltf, resize_info, base_material_name, texture_size=(2048,
         w, h = (paste_w / width, paste_h / height)
         return x, y, w, h
 
-    # オリジナルバッファー
-    original_view_datas = {}
-    for _, _, view_index in list_primitives(gltf, resize_info.keys()):
-        if view_index not in original_view_datas:
-            original_view_datas[view_index] = deepcopy(gltf['bufferViews'][view_index]['data'])
+    # 結合前のUV座標(データは書き換えずに差し替えるので参照のみ保持)
+    original_uvs = {}
+    for _, primitive in list_primitives(gltf, resize_info.keys()):
+        uv_accessor = primitive['attributes']['TEXCOORD_0']
+        original_uvs.setdefault(id(uv_accessor), accessor_floats(uv_accessor))
 
-    for name, primitive, view_index in list_primitives(gltf, resize_info.keys()):
+    for name, primitive in list_primitives(gltf, resize_info.keys()):
         # マテリアル更新
         primitive['material'] = new_material
         # 頂点インデックス一覧
-        accessor = primitive['indices']
-        indices_buffer = accessor['bufferView']['data']
-        indices_offset = accessor['byteOffset']
-        indices = list(map(lambda i: struct.unpack_from('I', indices_buffer, indices_offset + i * 4)[0],
-                           range(accessor['count'])))
+        indices = accessor_array(primitive['indices'])
         # uvバッファ
-        original_data = original_view_datas[view_index]
         uv_accessor = primitive['attributes']['TEXCOORD_0']
-        uv_view = uv_accessor['bufferView']
-        uv_data = uv_view['data']
-
-        # スケール率計算
-        x, y, w, h = uv_scale(name)
-        for index in set(indices):
-            uv_offset = index * 8
-            ou, ov = struct.unpack_from('2f', original_data, uv_offset)
-            u, v = struct.unpack_from('2f', uv_data, uv_offset)
-            if ou != u or ov != v:
-                continue  # 更新されていればスキップ
-            u, v = (x + u * w, y + v * h)
-            uv_data = uv_data[:uv_offset] + struct.pack('2f', u, v) + uv_data[uv_offset + 8:]
-        uv_view['data'] = uv_data  # 更新
+        uvs = remapped_uvs(accessor_floats(uv_accessor), original_uvs[id(uv_accessor)], indices, uv_scale(name))
+        set_accessor_array(uv_accessor, uvs, FLOAT)  # 更新
 
     return gltf
 
 
-def reduced_image(image_buffer, texture_size):
+def combine_packed_material(gltf, priorities, base_material_name, texture_size=(2048, 2048), jobs=1, cache=None):
+    """
+    マテリアルのテクスチャを自動で配置したアトラスにまとめて、マテリアルを結合する
+    アトラスはテクスチャサイズの上限に収まる最小の2のべき乗のサイズにする
+    :param gltf: glTFオブジェクト
+    :param priorities: 結合するマテリアル名 -> 優先度(大きいほど縮小されにくい)
+    :param base_material_name: 統合先にするマテリアル
+    :param texture_size: アトラスのサイズの上限
+    :param jobs: テクスチャの読み込み、縮小の並列数
+    :param cache: デコード済み画像のキャッシュ
+    :return: マテリアル結合したglTFオブジェクト
+    """
+    sizes = {}
+    for name in priorities:
+        material = find_vrm_material(gltf, name) if name else None
+        if material:
+            source = material['textureProperties']['_MainTex']['source']
+            sizes[name] = load_img(source['bufferView']['data'], cache).size
+    if base_material_name not in sizes:
+        return gltf  # 結合先がない
+    layout = atlas_layout(sizes, priorities, texture_size)
+    if not layout:
+        return gltf
+    return combine_material(gltf, layout['place'], base_material_name, texture_size, jobs, cache, layout['size'])
+
+
+def reduced_image(image_buffer, texture_size, cache=None):
     """
     画像を指定サイズ以下に縮小する
     :param image_buffer: イメージファイルバイトデータ
     :param texture_size: 画像の縮小上限値
+    :param cache: デコード済み画像のキャッシュ
     :return: 新しいイメージファイルバイトデータ
     """
-    pil_image = load_img(image_buffer)
+    pil_image = cache.get(image_buffer) if cache is not None else None
+    if pil_image is None:
+        pil_image = load_img(image_buffer)  # サイズの確認だけならデコード不要なので、ヘッダーだけ読み込む
     w, h = pil_image.size
     max_w, max_h = texture_size
     if w <= max_w and h <= max_h:
@@ -540,27 +702,102 @@ def reduced_image(image_buffer, texture_size):
     return image2bytes(new_image, 'png')
 
 
-def reduced_images(gltf, texture_size):
+def reduced_images(gltf, texture_size, jobs=1, cache=None):
     """
     画像を指定サイズ以下に縮小する
     :param gltf: glTFオブジェクト
     :param texture_size: テクスチャサイズ
+    :param jobs: 画像の縮小、変換の並列数
+    :param cache: デコード済み画像のキャッシュ
     :return: 画像リサイズ後のglTFオブジェクト
     """
-    gltf = deepcopy(gltf)
-    for image in gltf['images']:
-        buffer_view = image['bufferView']
-        buffer_view['data'] = reduced_image(buffer_view['data'], texture_size)
+    gltf = copy_gltf(gltf, 'bufferViews')
+    images = gltf['images']
+
+    def reduced(image):
+        return reduced_image(image['bufferView']['data'], texture_size, cache)
+
+    datas = parallel_map(reduced, images, jobs)
+    for image, data in zip(images, datas):
+        image['bufferView']['data'] = data
+    return gltf
+
+
+def image_key(image):
+    """
+    :param image: 画像
+    :return: 画像の内容(MIMEタイプとバイトデータのハッシュ値、またはURI)を表すキー
+    """
+    if 'bufferView' in image:
+        return image.get('mimeType'), hashlib.sha1(image['bufferView']['data']).digest()
+    return image.get('mimeType'), image.get('uri')
+
+
+def dict_key(d):
+    """
+    :param d: サンプラーなどの値がJSON値の辞書
+    :return: name以外の内容を表すキー
+    """
+    return repr(sorted((k, v) for k, v in d.items() if k != 'name'))
+
+
+def deduplicated_textures(gltf):
+    """
+    内容が同じ画像、サンプラー、テクスチャを1つにまとめる
+    未参照になった要素はclean処理で削除される
+    :param gltf: glTFオブジェクト
+    :return: 重複排除後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'textures')
+
+    # 内容 -> 最初に見つかった要素
+    unique_images = {}
+    unique_samplers = {}
+    unique_textures = {}
+
+    def unique_texture(texture):
+        texture['source'] = unique_images.setdefault(image_key(texture['source']), texture['source'])
+        texture['sampler'] = unique_samplers.setdefault(dict_key(texture['sampler']), texture['sampler'])
+        key = dict_key(dict(texture, source=id(texture['source']), sampler=id(texture['sampler'])))
+        return unique_textures.setdefault(key, texture)
+
+    for texture in gltf['textures']:
+        unique_texture(texture)
+
+    # テクスチャの参照を置換
+    for material in gltf['materials']:
+        pbr = material['pbrMetallicRoughness']
+        for texture_info in [pbr.get('baseColorTexture'), pbr.get('metallicRoughnessTexture'),
+                             *map(material.get, MATERIAL_TEXTURE_NAMES)]:
+            if texture_info:
+                texture_info['index'] = unique_texture(texture_info['index'])
+
+    vrm = gltf['extensions']['VRM']
+    for material in vrm['materialProperties']:
+        properties = material['textureProperties']
+        for name in properties:
+            properties[name] = unique_texture(properties[name])
+    if 'texture' in vrm['meta']:
+        vrm['meta']['texture'] = unique_texture(vrm['meta']['texture'])
+
     return gltf
 
 
+def image_data_size(gltf):
+    """
+    :param gltf: glTFオブジェクト
+    :return: 画像データの合計バイト数
+    """
+    return sum(len(image['bufferView']['data']) for image in gltf['images'] if 'bufferView' in image)
+
+
 def replace_shade(gltf):
     """
     陰部分の色を光の当たる部分と同色にする(陰色の無視)
     :param gltf: glTFオブジェクト
     :return: 編集護のglTFオブジェクト
     """
-    gltf = deepcopy(gltf)
+    gltf = copy_gltf(gltf, 'extensions')
     for material in gltf['extensions']['VRM']['materialProperties']:
         vec_props = material['vectorProperties']
         vec_props['_ShadeColor'] = vec_props['_Color']
@@ -587,7 +824,10 @@ def find_eye_extra_name(gltf):
     return find(contain_extra_eye, material_names)
 
 
-def reduce_vroid(gltf, replace_shade_color, texture_size, emissive, material_conf=None):
+def reduce_vroid(gltf, replace_shade_color, texture_size, emissive, material_conf=None, *, jobs=1,
+                 merge_meshes=False, mesh_conf=None, optimize_cache=False, quantize=False, sparse_targets=False,
+                 spring_conf=None, flatten_nodes=False, prune_morph_targets=False, prune_attributes=False,
+                 reduce_joints=False):
     """
     VRoidモデルを軽量化する
     :param gltf: glTFオブジェクト(VRM拡張を含む)
@@ -595,10 +835,24 @@ def reduce_vroid(gltf, replace_shade_color, texture_size, emissive, material_con
     :param texture_size: テクスチャサイズの上限値
     :param emissive: TrueでEmissiveテクスチャで表示(光源の影響を無視する)
     :param material_conf: ユーザー定義のマテリアル設定(Noneの場合は内蔵定義に基づいて動作)
+    :param jobs: テクスチャ処理の並列数
+    :param merge_meshes: Trueで同じ骨格のスキンメッシュを1つのメッシュに統合する
+    :param mesh_conf: ユーザー定義のメッシュ設定(Noneの場合は簡略化しない)
+    :param optimize_cache: Trueで三角形、頂点の並びを頂点キャッシュ向けに並べ替える
+    :param quantize: Trueで頂点属性を整数に量子化する(KHR_mesh_quantization)
+    :param sparse_targets: Trueでモーフターゲットをsparseアクセッサーに変換する
+    :param spring_conf: ユーザー定義の揺れもの設定(Noneの場合は揺れものを削減しない)
+    :param flatten_nodes: Trueで単位変換のノードを取り除き、ノードの階層を浅くする
+    :param prune_morph_targets: TrueでBlendShapeからバインドされていないモーフターゲットを削除する
+    :param prune_attributes: Trueでマテリアルが使わない頂点属性、モーフターゲットの接線を削除する
+    :param reduce_joints: Trueでウェイトを持たないジョイントを削除し、頂点に影響するジョイント数を制限する
     :return: 軽量化したglTFオブジェクト
     """
+    # デコード済み画像のキャッシュ(同じ画像のデコードは1回だけにする)
+    cache = ImageCache()
+
     # マテリアルの重複排除
-    gltf = deduplicated_materials(gltf)
+    gltf = deduplicated_materials(gltf, material_conf.get('dedup_tolerance') if material_conf else None)
 
     # 髪プリミティブ統合
     print('combine hair primitives...')
@@ -620,7 +874,7 @@ def reduce_vroid(gltf, replace_shade_color, texture_size, emissive, material_con
     if material_conf:
         if resize_info_list := material_conf.get('resize_info'):
             for base_material_name, resize_info in resize_info_list.items():
-                gltf = combine_material(gltf, resize_info, base_material_name, texture_size)
+                gltf = combine_material(gltf, resize_info, base_material_name, texture_size, jobs, cache)
 
         if resize_info_near_list := material_conf.get('resize_info_near'):
             for base_material_name, resize_info_near in resize_info_near_list.items():
@@ -635,7 +889,12 @@ def reduce_vroid(gltf, replace_shade_color, texture_size, emissive, material_con
                     near_material = find_near_vrm_material(gltf, near_key, base_material)
                     if near_material:
                         near_resize[near_material['name']] = {'pos': near_pos, 'size': near_size}
-                        gltf = combine_material(gltf, near_resize, near_material['name'], texture_size)
+                        gltf = combine_material(gltf, near_resize, near_material['name'], texture_size, jobs, cache)
+
+        if pack_list := material_conf.get('pack'):
+            for base_material_name, priorities in pack_list.items():
+                gltf = combine_packed_material(gltf, dict({base_material_name: 0}, **priorities), base_material_name,
+                                               texture_size, jobs, cache)
 
         if modify_list := material_conf.get('modify'):
             for material_name, modifiers in modify_list.items():
@@ -643,40 +902,33 @@ def reduce_vroid(gltf, replace_shade_color, texture_size, emissive, material_con
                 merge_dict_recursive(modifiers, material)
 
     else:
-        # 服の結合
+        # 服の結合(結合するマテリアルと結合先だけを使い、配置は自動で決める)
         if cloth_place := get_cloth_place(gltf):
-            gltf = combine_material(gltf, cloth_place['place'], cloth_place['main'], texture_size)
+            gltf = combine_packed_material(gltf, dict.fromkeys(cloth_place['names'], 0), cloth_place['main'],
+                                           texture_size, jobs, cache)
 
         # レンダータイプを変更
         face_mat = find_vrm_material(gltf, '_Face_')
         face_mat['keywordMap']['_ALPHATEST_ON'] = True
         face_mat['tagMap']["RenderType"] = 'TransparentCutout'
 
-        # 顔、口、目
-        gltf = combine_material(gltf, {
-            '_Face_': {'pos': (0, 0), 'size': (1024, 1024)},
-            '_FaceMouth_': {'pos': (0, 1024), 'size': (1024, 1024)},
-            '_EyeIris_': {'pos': (1024, 0), 'size': (1024, 512)},
-            '_EyeHighlight_': {'pos': (1024, 512), 'size': (1024, 512)},
-            '_EyeWhite_': {'pos': (1024, 1024), 'size': (1024, 512)},
-            find_eye_extra_name(gltf): {'pos': (1024, 1536), 'size': (1024, 512)},
-        }, '_Face_', texture_size)
+        # 顔、口、目(顔と口は目より縮小されにくくする)
+        gltf = combine_packed_material(gltf, {
+            '_Face_': 1, '_FaceMouth_': 1, '_EyeIris_': 0, '_EyeHighlight_': 0, '_EyeWhite_': 0,
+            find_eye_extra_name(gltf): 0,
+        }, '_Face_', texture_size, jobs, cache)
 
         # アイライン、まつ毛、眉毛
-        gltf = combine_material(gltf, {
-            '_FaceEyeline_': {'pos': (0, 0), 'size': (1024, 512)},
-            '_FaceEyelash_': {'pos': (0, 512), 'size': (1024, 512)},
-            '_FaceBrow_': {'pos': (0, 1024), 'size': (1024, 512)},
-        }, '_FaceEyeline_', texture_size)
+        gltf = combine_packed_material(gltf, {'_FaceEyeline_': 0, '_FaceEyelash_': 0, '_FaceBrow_': 0},
+                                       '_FaceEyeline_', texture_size, jobs, cache)
 
         # 髪の毛、頭の下毛
         hair_back_material = find_vrm_material(gltf, '_HairBack_')
         if hair_back_material:
-            hair_resize = {'_HairBack_': {'pos': (512, 0), 'size': (1024, 1024)}}
             hair_material = find_near_vrm_material(gltf, '_Hair_', hair_back_material)
             if hair_material:
-                hair_resize[hair_material['name']] = {'pos': (0, 0), 'size': (512, 1024)}
-                gltf = combine_material(gltf, hair_resize, hair_material['name'], texture_size)
+                gltf = combine_packed_material(gltf, {'_HairBack_': 0, hair_material['name']: 0},
+                                               hair_material['name'], texture_size, jobs, cache)
 
     if replace_shade_color:
         # 陰色を消す
@@ -686,11 +938,97 @@ def reduce_vroid(gltf, replace_shade_color, texture_size, emissive, material_con
         # Emissiveテクスチャで表示、光源を無視する
         gltf = emissive_mtoon_materials(gltf)
 
+    if prune_morph_targets:
+        # BlendShapeからバインドされていないモーフターゲットを削除
+        print('prune morph targets...')
+        morph_targets = count_morph_targets(gltf)
+        gltf = pruned_morph_targets(gltf, mesh_conf.get('keep_morph_targets', []) if mesh_conf else [])
+        print('morph targets:', morph_targets, '->', count_morph_targets(gltf))
+
+    if prune_attributes:
+        # マテリアルが使わない頂点属性、モーフターゲットの接線(と法線)を削除
+        print('prune vertex attributes...')
+        data_size = vertex_data_size(gltf)
+        gltf = pruned_attributes(gltf, mesh_conf.get('keep_morph_normals', True) if mesh_conf else True)
+        print('vertex data bytes:', data_size, '->', vertex_data_size(gltf))
+
+    if mesh_conf and (simplify_conf := mesh_conf.get('simplify')):
+        # メッシュの簡略化
+        print('simplify meshes...')
+        vertices = count_vertices(gltf)
+        gltf = compacted_vertices(simplified_meshes(gltf, simplify_conf))
+        print('vertices:', vertices, '->', count_vertices(gltf))
+
+    if merge_meshes:
+        # 同じ骨格のスキンメッシュを統合
+        print('merge skinned meshes...')
+        gltf = merged_skinned_meshes(gltf)
+
+    if reduce_joints:
+        # ウェイトを持たないジョイントを削除し、頂点に影響するジョイント数を制限
+        print('reduce skins...')
+        joints = count_joints(gltf)
+        gltf = reduced_skins(gltf, mesh_conf.get('max_influences', MAX_INFLUENCES) if mesh_conf else MAX_INFLUENCES,
+                             mesh_conf.get('min_weight', 0.0) if mesh_conf else 0.0)
+        print('joints:', joints, '->', count_joints(gltf))
+
+    if spring_conf is not None:
+        # 揺れるノードがないボーン、使われていないコライダーを削除し、チェーンの長さとコライダー数を制限
+        print('reduce spring bones...')
+        cost = spring_bone_cost(gltf)
+        gltf = reduced_spring_bones(gltf, spring_conf.get('max_chain_length'), spring_conf.get('max_colliders'))
+        print('spring bone cost:', cost, '->', spring_bone_cost(gltf))
+
+    # どこからも参照されていないノードを削除
+    print('prune nodes...')
+    nodes = len(gltf['nodes'])
+    gltf = pruned_nodes(gltf, flatten_nodes)
+    print('nodes:', nodes, '->', len(gltf['nodes']))
+
+    # 同じマテリアルのプリミティブを統合して描画呼び出しを減らす
+    print('batch primitives...')
+    draw_calls = count_draw_calls(gltf)
+    gltf = batched_primitives(gltf)
+    print('draw calls:', draw_calls, '->', count_draw_calls(gltf))
+
+    # 使われていない頂点を削除
+    print('compact vertices...')
+    vertices = count_vertices(gltf)
+    gltf = compacted_vertices(gltf)
+    print('vertices:', vertices, '->', count_vertices(gltf))
+
+    if optimize_cache:
+        # 三角形を頂点キャッシュ向けに並べ替え、頂点を参照順に並べ替える
+        print('optimize vertex cache...')
+        acmr = cache_miss_ratio(gltf)
+        gltf = compacted_vertices(optimized_vertex_cache(gltf), reorder=True)
+        print('ACMR:', round(acmr, 3), '->', round(cache_miss_ratio(gltf), 3))
+
+    if quantize:
+        # 法線、UV、スキンウェイト、モーフターゲットを整数に量子化
+        print('quantize vertex attributes...')
+        data_size = vertex_data_size(gltf)
+        gltf = quantized_meshes(gltf)
+        print('vertex data bytes:', data_size, '->', vertex_data_size(gltf))
+
+    if sparse_targets:
+        # モーフターゲットの差分0の頂点を省く
+        print('sparse morph targets...')
+        data_size = vertex_data_size(gltf)
+        gltf = sparse_morph_targets(gltf)
+        print('vertex data bytes:', data_size, '->', vertex_data_size(gltf))
+
     # 不要要素削除
     gltf = clean(gltf)
 
+    # 同じ内容の画像、テクスチャを統合
+    print('deduplicate textures...')
+    deduplicated = clean(deduplicated_textures(gltf))
+    print('deduplicated image bytes:', image_data_size(gltf) - image_data_size(deduplicated))
+    gltf = deduplicated
+
     # 他のテクスチャ画像サイズの変換
     print('reduced images...')
-    gltf = reduced_images(gltf, texture_size)
+    gltf = reduced_images(gltf, texture_size, jobs, cache)
 
     return clean(gltf)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+
+import heapq
+from array import array
+
+from .gltf import copy_gltf, accessor_array, accessor_floats, create_accessor, ELEMENT_ARRAY_BUFFER
+from .merger import block_key
+
+"""
+メッシュの簡略化(二次誤差尺度によるハーフエッジ縮約)
+辺の片側の頂点をもう一方の頂点に統合してポリゴンを減らす
+統合先の頂点の属性(UV、スキンウェイト、モーフターゲット)はそのまま使うので、頂点データの補間はしない
+以下の頂点は動かさない
+・UVの継ぎ目(同じ位置に複数の頂点がある)
+・メッシュの境界(1つのポリゴンだけが使っている辺)
+・複数のマテリアル(プリミティブ)で使われている頂点
+"""
+
+# モーフターゲットの差分がこれより異なる頂点は統合しない
+MORPH_TOLERANCE = 1e-4
+
+# 縮約前後の三角形の法線のなす角の余弦がこれ以下になる(裏返る、大きく傾く、潰れる)場合は縮約しない
+FLIP_THRESHOLD = 0.2
+
+# スキンウェイトの差(各ジョイントのウェイトの差の合計)がこれより大きい頂点は統合しない
+SKIN_TOLERANCE = 0.25
+
+
+def sub(a, b):
+    return a[0] - b[0], a[1] - b[1], a[2] - b[2]
+
+
+def cross(a, b):
+    return a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]
+
+
+def dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def face_normal(a, b, c):
+    return cross(sub(b, a), sub(c, a))
+
+
+def plane_quadric(a, b, c):
+    """
+    三角形を含む平面からの距離の二乗を表す二次形式(面積で重み付け)
+    :param a: 頂点座標
+    :param b: 頂点座標
+    :param c: 頂点座標
+    :return: 対称4x4行列の上三角成分(10要素)
+    """
+    n = face_normal(a, b, c)
+    length = dot(n, n) ** 0.5
+    if length == 0:
+        return [0.0] * 10
+    x, y, z = n[0] / length, n[1] / length, n[2] / length
+    d = -(x * a[0] + y * a[1] + z * a[2])
+    w = length / 2
+    return [w * x * x, w * x * y, w * x * z, w * x * d, w * y * y, w * y * z, w * y * d, w * z * z, w * z * d,
+            w * d * d]
+
+
+def quadric_error(q, p):
+    """
+    :param q: 二次形式
+    :param p: 座標
+    :return: 座標における誤差
+    """
+    x, y, z = p
+    return (q[0] * x * x + 2 * q[1] * x * y + 2 * q[2] * x * z + 2 * q[3] * x + q[4] * y * y + 2 * q[5] * y * z
+            + 2 * q[6] * y + q[7] * z * z + 2 * q[8] * z + q[9])
+
+
+class Simplifier(object):
+    def __init__(self, positions, triangles, groups, morphs=(), skin=None):
+        """
+        頂点データを共有するプリミティブの簡略化
+        :param positions: 頂点座標リスト
+        :param triangles: 三角形(頂点番号の3要素リスト)リスト
+        :param groups: 三角形ごとのプリミティブ番号
+        :param morphs: モーフターゲットごとの頂点差分(実数配列)リスト
+        :param skin: 頂点ごとのスキンウェイト(ジョイント -> ウェイトの辞書)リスト、スキンなしはNone
+        """
+        self.positions = positions
+        self.triangles = triangles
+        self.alive = bytearray(b'\x01' * len(triangles))
+        self.morphs = morphs
+        self.skin = skin
+        self.vertex_triangles = [set() for _ in positions]
+        for t, triangle in enumerate(triangles):
+            for v in triangle:
+                self.vertex_triangles[v].add(t)
+        self.version = [0] * len(positions)
+
+        # 頂点の二次形式
+        self.quadrics = [[0.0] * 10 for _ in positions]
+        for triangle in triangles:
+            q = plane_quadric(*(positions[v] for v in triangle))
+            for v in triangle:
+                qv = self.quadrics[v]
+                for n in range(10):
+                    qv[n] += q[n]
+
+        # 動かさない頂点
+        self.locked = bytearray(len(positions))
+        shared_positions = {}
+        for v, t in enumerate(self.vertex_triangles):
+            if t:
+                shared_positions.setdefault(tuple(positions[v]), []).append(v)
+        for vertices in shared_positions.values():
+            if len(vertices) > 1:
+                for v in vertices:
+                    self.locked[v] = 1  # UVの継ぎ目
+        edge_counts = {}
+        for triangle in triangles:
+            for n in range(3):
+                edge = tuple(sorted((triangle[n], triangle[n - 1])))
+                edge_counts[edge] = edge_counts.get(edge, 0) + 1
+        for (a, b), count in edge_counts.items():
+            if count == 1:
+                self.locked[a] = self.locked[b] = 1  # 境界
+        for v, t in enumerate(self.vertex_triangles):
+            if len({groups[n] for n in t}) > 1:
+                self.locked[v] = 1  # 複数のマテリアル
+
+    def neighbors(self, v):
+        return {u for t in self.vertex_triangles[v] for u in self.triangles[t]} - {v}
+
+    def vertex_count(self):
+        return sum(1 for t in self.vertex_triangles if t)
+
+    def cost(self, u, v):
+        """
+        :return: 頂点uを頂点vに統合したときの誤差
+        """
+        pv = self.positions[v]
+        return quadric_error(self.quadrics[u], pv) + quadric_error(self.quadrics[v], pv)
+
+    def similar(self, u, v):
+        """
+        :return: モーフターゲット、スキンウェイトが近ければTrue
+        """
+        for deltas in self.morphs:
+            for n in range(3):
+                if abs(deltas[u * 3 + n] - deltas[v * 3 + n]) > MORPH_TOLERANCE:
+                    return False
+        if self.skin is not None:
+            wu, wv = self.skin[u], self.skin[v]
+            if sum(abs(wu.get(j, 0.0) - wv.get(j, 0.0)) for j in set(wu) | set(wv)) > SKIN_TOLERANCE:
+                return False
+        return True
+
+    def collapsible(self, u, v):
+        """
+        :return: 頂点uを頂点vに統合できればTrue
+        """
+        # 辺を共有する三角形の数と共通の隣接頂点の数が同じ(統合後も多様体)
+        shared = [t for t in self.vertex_triangles[u] if v in self.triangles[t]]
+        if not shared or len(self.neighbors(u) & self.neighbors(v)) != len(shared):
+            return False
+
+        # 三角形が裏返る、大きく傾く、または潰れる場合は統合しない
+        pv = self.positions[v]
+        for t in self.vertex_triangles[u]:
+            triangle = self.triangles[t]
+            if v in triangle:
+                continue
+            points = [self.positions[x] for x in triangle]
+            before = face_normal(*points)
+            points[triangle.index(u)] = pv
+            after = face_normal(*points)
+            if dot(before, after) <= FLIP_THRESHOLD * (dot(before, before) * dot(after, after)) ** 0.5:
+                return False
+
+        return self.similar(u, v)
+
+    def collapse(self, u, v):
+        """
+        頂点uを頂点vに統合する
+        """
+        for t in list(self.vertex_triangles[u]):
+            triangle = self.triangles[t]
+            if v in triangle:
+                # 辺を共有する三角形は削除
+                self.alive[t] = 0
+                for x in triangle:
+                    self.vertex_triangles[x].discard(t)
+            else:
+                triangle[triangle.index(u)] = v
+                self.vertex_triangles[v].add(t)
+        self.vertex_triangles[u] = set()
+        qu, qv = self.quadrics[u], self.quadrics[v]
+        for n in range(10):
+            qv[n] += qu[n]
+        self.version[u] += 1
+        self.version[v] += 1
+
+    def push_candidates(self, heap, v):
+        # 頂点vに関係する縮約候補を追加
+        for u in self.neighbors(v):
+            for a, b in ((u, v), (v, u)):
+                if not self.locked[a]:
+                    heapq.heappush(heap, (self.cost(a, b), a, b, self.version[a], self.version[b]))
+
+    def simplify(self, target_vertex_count):
+        """
+        頂点数が目標以下になるまで誤差の小さい辺から縮約する
+        :param target_vertex_count: 目標頂点数
+        :return: 残った三角形のリスト(三角形番号、三角形)
+        """
+        heap = []
+        for v, t in enumerate(self.vertex_triangles):
+            if t and not self.locked[v]:
+                for u in self.neighbors(v):
+                    heap.append((self.cost(v, u), v, u, self.version[v], self.version[u]))
+        heapq.heapify(heap)
+
+        count = self.vertex_count()
+        while count > target_vertex_count and heap:
+            _, u, v, version_u, version_v = heapq.heappop(heap)
+            if version_u != self.version[u] or version_v != self.version[v] or not self.vertex_triangles[u]:
+                continue  # 古い候補
+            if not self.collapsible(u, v):
+                continue
+            self.collapse(u, v)
+            count -= 1
+            self.push_candidates(heap, v)
+
+        return [(t, triangle) for t, triangle in enumerate(self.triangles) if self.alive[t]]
+
+
+def vertex_skin(attributes):
+    """
+    :param attributes: 頂点属性
+    :return: 頂点ごとのジョイント -> ウェイトの辞書リスト、スキンがなければNone
+    """
+    if 'JOINTS_0' not in attributes or 'WEIGHTS_0' not in attributes:
+        return None
+    skin = [{} for _ in range(attributes['JOINTS_0']['count'])]
+    for n in range(10):
+        joints_name, weights_name = 'JOINTS_%d' % n, 'WEIGHTS_%d' % n
+        if joints_name not in attributes or weights_name not in attributes:
+            break
+        joints = accessor_array(attributes[joints_name])
+        weights = accessor_floats(attributes[weights_name])
+        for i, (joint, weight) in enumerate(zip(joints, weights)):
+            if weight:
+                vertex = skin[i // 4]
+                vertex[joint] = vertex.get(joint, 0.0) + weight
+    return skin
+
+
+def simplified_primitives(primitives, target_vertex_count):
+    """
+    頂点データを共有するプリミティブを簡略化する(インデックスだけを書き換える)
+    :param primitives: プリミティブリスト(三角形リスト、インデックスあり)
+    :param target_vertex_count: 目標頂点数
+    :return: 追加したアクセッサーリスト
+    """
+    head = primitives[0]
+    attributes = head['attributes']
+    values = accessor_floats(attributes['POSITION'])
+    positions = [tuple(values[n:n + 3]) for n in range(0, len(values), 3)]
+    morphs = [accessor_floats(target['POSITION']) for target in head.get('targets', []) if 'POSITION' in target]
+
+    triangles, groups = [], []
+    for n, primitive in enumerate(primitives):
+        indices = accessor_array(primitive['indices'])
+        for i in range(0, len(indices) - 2, 3):
+            triangles.append(list(indices[i:i + 3]))
+            groups.append(n)
+
+    simplifier = Simplifier(positions, triangles, groups, morphs, vertex_skin(attributes))
+    remains = simplifier.simplify(target_vertex_count)
+
+    accessors = []
+    for n, primitive in enumerate(primitives):
+        values = array('I', (v for t, triangle in remains if groups[t] == n for v in triangle))
+        indices = create_accessor(values, primitive['indices']['componentType'], 'SCALAR', ELEMENT_ARRAY_BUFFER)
+        primitive['indices'] = indices
+        accessors.append(indices)
+    return accessors
+
+
+def find_budget(simplify_conf, mesh_name):
+    """
+    :param simplify_conf: メッシュ名(部分一致) -> 削減率(実数) or 頂点数(整数)
+    :param mesh_name: メッシュ名
+    :return: 削減率 or 頂点数、設定がなければNone
+    """
+    for name, budget in simplify_conf.items():
+        if name in mesh_name:
+            return budget
+    return None
+
+
+def simplified_meshes(gltf, simplify_conf):
+    """
+    設定したメッシュを簡略化する
+    使われなくなった頂点は頂点データに残るので、compacted_verticesで削除すること
+    :param gltf: glTFオブジェクト
+    :param simplify_conf: メッシュ名(部分一致) -> 残す頂点の割合(実数、例: 0.5) or 頂点数(整数、例: 8000)
+    :return: 簡略化後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes')
+    for mesh in gltf['meshes']:
+        budget = find_budget(simplify_conf, mesh['name'])
+        if budget is None:
+            continue
+
+        # 頂点データを共有するプリミティブごとに簡略化する(三角形リストのみ)
+        groups = {}
+        for primitive in mesh['primitives']:
+            if 'indices' in primitive and primitive.get('mode', 4) == 4:
+                groups.setdefault(block_key(primitive), []).append(primitive)
+        used_counts = [len({i for p in primitives for i in accessor_array(p['indices'])})
+                       for primitives in groups.values()]
+        total = sum(used_counts)
+        if not total:
+            continue
+
+        # 頂点数の指定はプリミティブグループの頂点数の比で割り振る
+        ratio = budget if isinstance(budget, float) else budget / total
+        for primitives, used_count in zip(groups.values(), used_counts):
+            accessors = simplified_primitives(primitives, int(used_count * min(ratio, 1.0)))
+            gltf['accessors'] += accessors
+            gltf['bufferViews'] += [a['bufferView'] for a in accessors]
+
+    return gltf
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+from array import array
+
+from .gltf import copy_gltf, accessor_array, accessor_floats, create_accessor, gathered_accessor, FLOAT, \
+    ARRAY_BUFFER
+from .merger import block_key
+from .quantizer import quantized_weights
+
+"""
+スキン(ジョイント、スキンウェイト)の削減
+"""
+
+# 1つの頂点に影響するジョイント数の上限(glTFの頂点属性1組分)
+MAX_INFLUENCES = 4
+
+# ウェイトの合計と1との許容誤差(これより大きくずれていれば正規化し直す)
+WEIGHT_TOLERANCE = 1e-5
+
+
+def influence_sets(attributes):
+    """
+    :param attributes: 頂点属性
+    :return: JOINTS_n, WEIGHTS_nの組がそろっている番号nのリスト
+    """
+    return sorted(int(name[7:]) for name in attributes
+                  if name.startswith('JOINTS_') and 'WEIGHTS_' + name[7:] in attributes)
+
+
+def vertex_influences(attributes):
+    """
+    頂点ごとの影響するジョイントとウェイトを列挙する
+    :param attributes: 頂点属性
+    :return: 頂点ごとの(ジョイント番号, ウェイト)リストのリスト
+    """
+    sets = influence_sets(attributes)
+    joints = [accessor_array(attributes['JOINTS_%d' % n]) for n in sets]
+    weights = [accessor_floats(attributes['WEIGHTS_%d' % n]) for n in sets]
+    count = attributes['JOINTS_%d' % sets[0]]['count']
+    return [[(j[v * 4 + c], w[v * 4 + c]) for j, w in zip(joints, weights) for c in range(4)] for v in range(count)]
+
+
+def limited_influences(influences, max_influences, min_weight):
+    """
+    ウェイトが0(min_weight以下)の影響を除き、ウェイトの大きい順にmax_influences個まで残す
+    影響を除いた頂点と、ウェイトの合計が1からずれている頂点は合計が1になるように正規化し直す
+    :param influences: 頂点の(ジョイント番号, ウェイト)リスト
+    :param max_influences: 影響するジョイント数の上限
+    :param min_weight: これ以下のウェイトは除く
+    :return: 残した(ジョイント番号, ウェイト)リスト(元の順番)
+    """
+    merged = {}
+    for joint, weight in influences:
+        if weight > 0.0:
+            merged[joint] = merged.get(joint, 0.0) + weight  # 同じジョイントの重複はまとめる
+    kept = sorted(merged, key=lambda j: -merged[j])
+    kept = {j for j in kept[:max_influences] if merged[j] > min_weight}
+    result = [(j, merged[j]) for j in dict.fromkeys(j for j, w in influences if j in kept)]
+
+    total = sum(w for _, w in result)
+    if not result or (len(kept) == len(merged) and abs(total - 1.0) <= WEIGHT_TOLERANCE):
+        return result
+    return [(j, w / total) for j, w in result]
+
+
+def skinned_meshes(gltf):
+    """
+    スキンごとに、そのスキンでだけ使われているメッシュを列挙する
+    :param gltf: glTFオブジェクト
+    :return: スキンのリスト, スキンのid -> メッシュリスト の辞書
+    """
+    skins, meshes, mesh_skins = [], {}, {}
+    for node in gltf.get('nodes', []):
+        if 'mesh' in node:
+            mesh_skins.setdefault(id(node['mesh']), set()).add(id(node.get('skin')))
+    for node in gltf.get('nodes', []):
+        if 'mesh' not in node or 'skin' not in node:
+            continue
+        skin, mesh = node['skin'], node['mesh']
+        if id(skin) not in meshes:
+            skins.append(skin)
+            meshes[id(skin)] = []
+        if all(m is not mesh for m in meshes[id(skin)]):
+            meshes[id(skin)].append(mesh)
+
+    # 複数のスキン(またはスキンなし)で使われているメッシュを含むスキンは変更しない
+    skins = [s for s in skins if all(mesh_skins[id(m)] == {id(s)} for m in meshes[id(s)])]
+    return skins, meshes
+
+
+def humanoid_nodes(gltf):
+    """
+    :param gltf: glTFオブジェクト
+    :return: ヒューマノイドのボーンのノードのset
+    """
+    return {bone['node'] for bone in gltf['extensions']['VRM'].get('humanoid', {}).get('humanBones', [])}
+
+
+def reduce_skin(gltf, skin, meshes, keep_nodes, max_influences, min_weight, joint_targets, prune_joints):
+    """
+    スキンのジョイントとスキンウェイトを削減する(glTFオブジェクトを直接変更する)
+    :param gltf: glTFオブジェクト
+    :param skin: スキン
+    :param meshes: スキンを使うメッシュリスト
+    :param keep_nodes: ウェイトがなくても残すジョイントのノード
+    :param max_influences: 影響するジョイント数の上限
+    :param min_weight: これ以下のウェイトは除く
+    :param joint_targets: ジョイントのノード -> ウェイトの移し先のノード の辞書
+    :param prune_joints: Falseでウェイトを移したジョイントだけを削除する
+    """
+    # ウェイトの移し先がスキンのジョイントにある場合だけ移す
+    moved = {n: skin['joints'].index(joint_targets[joint]) for n, joint in enumerate(skin['joints'])
+             if joint in joint_targets and joint_targets[joint] in skin['joints']}
+
+    # スキンを使う頂点データ(JOINTS、WEIGHTSを持つもの)ごとに、頂点の影響を求める
+    groups = {}
+    for mesh in meshes:
+        for primitive in mesh['primitives']:
+            if influence_sets(primitive['attributes']):
+                groups.setdefault(block_key(primitive), []).append(primitive)
+    blocks = [(primitives, [limited_influences([(moved.get(j, j), w) for j, w in i], max_influences, min_weight)
+                            for i in vertex_influences(primitives[0]['attributes'])])
+              for primitives in groups.values()]
+
+    # ウェイトを持つジョイントと、ヒューマノイドのボーンを残す(prune_jointsがFalseならウェイトを移していないジョイントも)
+    used = {j for _, influences in blocks for vertex in influences for j, _ in vertex}
+    kept = [n for n, joint in enumerate(skin['joints'])
+            if n in used or joint in keep_nodes or not (prune_joints or n in moved)] or [0]
+    remap = {old: new for new, old in enumerate(kept)}
+    if len(kept) < len(skin['joints']):
+        skin['joints'] = [skin['joints'][n] for n in kept]
+        if 'inverseBindMatrices' in skin:
+            ibm = skin['inverseBindMatrices'] = gathered_accessor(skin['inverseBindMatrices'], kept)
+            gltf['accessors'].append(ibm)
+            gltf['bufferViews'].append(ibm['bufferView'])
+
+    for primitives, influences in blocks:
+        attributes = primitives[0]['attributes']
+        sets = influence_sets(attributes)
+        new_sets = max(1, (max(map(len, influences), default=0) + 3) // 4)
+
+        new_attributes = {}
+        for n in range(new_sets):
+            joints, weights = array('I'), array('f')
+            for vertex in influences:
+                slots = vertex[n * 4:n * 4 + 4]
+                padding = 4 - len(slots)  # 空きはジョイント0、ウェイト0
+                joints.extend([remap[j] for j, _ in slots] + [0] * padding)
+                weights.extend([w for _, w in slots] + [0.0] * padding)
+            old_joints, old_weights = attributes['JOINTS_%d' % sets[n]], attributes['WEIGHTS_%d' % sets[n]]
+            if list(joints) != list(accessor_array(old_joints)):
+                new_attributes['JOINTS_%d' % n] = create_accessor(joints, old_joints['componentType'], 'VEC4',
+                                                                  ARRAY_BUFFER)
+            if weights != array('f', accessor_floats(old_weights)):
+                component_type = old_weights['componentType']
+                values = weights if component_type == FLOAT else quantized_weights(weights, component_type)
+                new_attributes['WEIGHTS_%d' % n] = create_accessor(values, component_type, 'VEC4', ARRAY_BUFFER,
+                                                                   component_type != FLOAT)
+        # 使わなくなった組(JOINTS_1, WEIGHTS_1など)は削除する
+        removed = {name % n for n in sets[new_sets:] for name in ['JOINTS_%d', 'WEIGHTS_%d']}
+        if not new_attributes and not removed:
+            continue
+
+        for primitive in primitives:
+            # 頂点属性の辞書はindexingで書き換えるのでプリミティブごとに作る
+            primitive['attributes'] = {k: v for k, v in dict(primitive['attributes'], **new_attributes).items()
+                                       if k not in removed}
+        gltf['accessors'] += new_attributes.values()
+        gltf['bufferViews'] += [a['bufferView'] for a in new_attributes.values()]
+
+
+def reduced_skins(gltf, max_influences=MAX_INFLUENCES, min_weight=0.0, joint_targets=None, prune_joints=True):
+    """
+    スキンから影響する頂点がないジョイントを削除し、頂点に影響するジョイント数を制限する
+    ヒューマノイドのボーンはウェイトがなくても残す
+    ジョイント番号(JOINTS)、逆バインド行列は削除後のジョイントに合わせて作り直す
+    :param gltf: glTFオブジェクト
+    :param max_influences: 1つの頂点に影響するジョイント数の上限(Noneで制限しない)
+    :param min_weight: これ以下のウェイトは除く(0で除かない)
+    :param joint_targets: ジョイントのノード -> ウェイトの移し先のノード の辞書(移したジョイントは削除される)
+    :param prune_joints: Falseで影響する頂点がないジョイントを削除せず、ウェイトを移したジョイントだけを削除する
+    :return: 変換後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'meshes', 'skins')
+    keep_nodes = humanoid_nodes(gltf)
+    skins, meshes = skinned_meshes(gltf)
+    for skin in skins:
+        reduce_skin(gltf, skin, meshes[id(skin)], keep_nodes, max_influences, min_weight, joint_targets or {},
+                    prune_joints)
+
+    # 使われなくなったアクセッサーはclean処理で削除される
+    return gltf
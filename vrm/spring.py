@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+from itertools import combinations
+
+from .gltf import copy_gltf
+from .skinner import humanoid_nodes, reduced_skins
+from .util import distance, unique
+
+"""
+揺れもの(VRMのsecondaryAnimation)の削減
+"""
+
+
+def secondary_animation(gltf):
+    """
+    :param gltf: glTFオブジェクト
+    :return: 揺れもの設定(なければ空の辞書)
+    """
+    return gltf.get('extensions', {}).get('VRM', {}).get('secondaryAnimation', {})
+
+
+def spring_nodes(nodes, root):
+    """
+    揺れもののルートから子孫をたどる(ルート以下の全ノードが揺れる)
+    :param nodes: ノードリスト
+    :param root: ルートのノード番号
+    :return: (ノード番号, ルートからの深さ(ルートが1))のリスト
+    """
+    result = []
+    stack = [(root, 1)]
+    while stack:
+        node, depth = stack.pop()
+        result.append((node, depth))
+        stack += [(child, depth + 1) for child in reversed(nodes[node].get('children', []))]
+    return result
+
+
+def group_roots(nodes, group):
+    """
+    :param nodes: ノードリスト
+    :param group: ボーングループ
+    :return: ボーングループの有効なルートのノード番号リスト
+    """
+    return [root for root in group.get('bones', []) if 0 <= root < len(nodes)]
+
+
+def group_colliders(collider_groups, group):
+    """
+    :param collider_groups: コライダーグループリスト
+    :param group: ボーングループ
+    :return: ボーングループが衝突判定するコライダー数
+    """
+    return sum(len(collider_groups[n]['colliders']) for n in group.get('colliderGroups', [])
+               if 0 <= n < len(collider_groups))
+
+
+def referenced_nodes(gltf):
+    """
+    子孫を切り離せないノードを列挙する
+    ヒューマノイドのボーン、一人称のボーン、メッシュを持つノード、コライダーグループのノード、
+    揺れもののルートと中心、アニメーションの対象
+    :param gltf: glTFオブジェクト
+    :return: ノード番号のset
+    """
+    vrm = gltf['extensions']['VRM']
+    secondary = secondary_animation(gltf)
+    nodes = humanoid_nodes(gltf)
+    nodes.update(n for n, node in enumerate(gltf['nodes']) if 'mesh' in node or 'camera' in node)
+    if 'firstPersonBone' in vrm.get('firstPerson', {}):
+        nodes.add(vrm['firstPerson']['firstPersonBone'])
+    nodes.update(g['node'] for g in secondary.get('colliderGroups', []))
+    for group in secondary.get('boneGroups', []):
+        nodes.update(group.get('bones', []))
+        nodes.add(group.get('center', -1))
+    for animation in gltf.get('animations', []):
+        nodes.update(c['target']['node'] for c in animation.get('channels', []) if 'node' in c['target'])
+    return nodes
+
+
+def capped_spring_chains(gltf, max_length):
+    """
+    揺れもののチェーンをルートからmax_length個のノードまでにする
+    それより深いノードのウェイトはmax_length番目のノードに移し、ノードを親から切り離す
+    (切り離したノードは揺れものの対象にならない)
+    子孫に参照されているノードがあるチェーン、ウェイトを移せなかったチェーンは変更しない
+    :param gltf: glTFオブジェクト
+    :param max_length: チェーンのノード数の上限
+    :return: 変換後のglTFオブジェクト
+    """
+    nodes = gltf['nodes']
+    keep = referenced_nodes(gltf)
+    cuts, targets = [], {}
+    for group in secondary_animation(gltf).get('boneGroups', []):
+        for root in group_roots(nodes, group):
+            for node, depth in spring_nodes(nodes, root):
+                if depth != max_length or node in cuts:
+                    continue
+                below = [n for n, _ in spring_nodes(nodes, node)[1:]]
+                if below and not keep.intersection(below):
+                    cuts.append(node)
+                    targets.update((n, node) for n in below)
+    if not targets:
+        return gltf
+
+    # ジョイント数は制限せず、ウェイトを移すだけ(ウェイトのない他のジョイントは残す、reduced_skinsはノードも複製する)
+    gltf = reduced_skins(gltf, None, joint_targets=targets, prune_joints=False)
+    nodes = gltf['nodes']
+
+    # ジョイントとして残っている(ウェイトを移せなかった)ノードを含む子は切り離さない
+    joints = {j for skin in gltf.get('skins', []) for j in skin['joints']}
+    for cut in cuts:
+        node = nodes[cut]
+        node['children'] = [c for c in node['children']
+                            if joints.intersection(n for n, _ in spring_nodes(nodes, c))]
+        if not node['children']:
+            del node['children']
+    return gltf
+
+
+def merged_collider(collider1, collider2):
+    """
+    2つのコライダー(球)を包む球を求める
+    :param collider1: コライダー1
+    :param collider2: コライダー2
+    :return: 包む球のコライダー
+    """
+    center1 = [collider1['offset'][k] for k in 'xyz']
+    center2 = [collider2['offset'][k] for k in 'xyz']
+    radius1, radius2 = collider1['radius'], collider2['radius']
+    d = distance(center1, center2)
+    if d + radius2 <= radius1:
+        return collider1
+    if d + radius1 <= radius2:
+        return collider2
+    radius = (d + radius1 + radius2) / 2
+    t = (radius - radius1) / d
+    return {'offset': {k: c1 + (c2 - c1) * t for k, c1, c2 in zip('xyz', center1, center2)}, 'radius': radius}
+
+
+def budgeted_colliders(collider_groups, max_colliders):
+    """
+    コライダー数が上限以下になるまで、同じグループ内で統合による半径の増加(包む球の半径と、大きい方の半径の差)が
+    最も小さい2つのコライダーを統合する(中心が最も近い2つとは限らない)
+    統合できなくなったら(各グループのコライダーが1つ)、半径の小さいコライダーから削除する
+    (コライダーグループを直接変更する、空になったグループはそのまま残す)
+    :param collider_groups: コライダーグループリスト
+    :param max_colliders: コライダー数の上限(負の値は0とみなす)
+    """
+    max_colliders = max(0, max_colliders)
+    while sum(len(g['colliders']) for g in collider_groups) > max_colliders:
+        pairs = []
+        for group in collider_groups:
+            for (i, c1), (j, c2) in combinations(enumerate(group['colliders']), 2):
+                merged = merged_collider(c1, c2)
+                pairs.append((merged['radius'] - max(c1['radius'], c2['radius']), group, i, j, merged))
+        if pairs:
+            _, group, i, j, merged = min(pairs, key=lambda p: p[0])
+            group['colliders'] = [merged if n == i else c for n, c in enumerate(group['colliders']) if n != j]
+        else:
+            group = min((g for g in collider_groups if g['colliders']), key=lambda g: g['colliders'][0]['radius'])
+            group['colliders'] = []
+
+
+def pruned_spring_bones(gltf, max_colliders=None):
+    """
+    揺れる(ウェイトを持つ、メッシュやコライダーを持つ)ノードがないルートとボーングループを削除する
+    どのボーングループからも使われていないコライダーグループを削除し、コライダー数を上限以下にする
+    :param gltf: glTFオブジェクト
+    :param max_colliders: コライダー数の上限(Noneで制限しない)
+    :return: 変換後のglTFオブジェクト
+    """
+    gltf = copy_gltf(gltf, 'extensions')
+    secondary = secondary_animation(gltf)
+    if not secondary:
+        return gltf
+    nodes = gltf['nodes']
+    collider_groups = [g for g in secondary.get('colliderGroups', []) if 0 <= g['node'] < len(nodes)]
+
+    moving = {j for skin in gltf.get('skins', []) for j in skin['joints']}
+    moving.update(n for n, node in enumerate(nodes) if 'mesh' in node)
+    moving.update(g['node'] for g in collider_groups)
+    bone_groups = []
+    for group in secondary.get('boneGroups', []):
+        group['bones'] = unique(root for root in group_roots(nodes, group)
+                                if any(n in moving for n, _ in spring_nodes(nodes, root)))
+        if group['bones']:
+            bone_groups.append(group)
+
+    # ボーングループから使われているコライダーグループだけ残す
+    groups = secondary.get('colliderGroups', [])
+    used = {id(groups[n]) for g in bone_groups for n in g.get('colliderGroups', []) if 0 <= n < len(groups)}
+    collider_groups = [g for g in collider_groups if id(g) in used]
+    if max_colliders is not None:
+        budgeted_colliders(collider_groups, max_colliders)
+    collider_groups = [g for g in collider_groups if g['colliders']]
+
+    # コライダーグループ番号を振り直す
+    remap = {id(g): n for n, g in enumerate(collider_groups)}
+    for group in bone_groups:
+        group['colliderGroups'] = unique(remap[id(groups[n])] for n in group.get('colliderGroups', [])
+                                         if 0 <= n < len(groups) and id(groups[n]) in remap)
+    secondary['boneGroups'] = bone_groups
+    secondary['colliderGroups'] = collider_groups
+    return gltf
+
+
+def reduced_spring_bones(gltf, max_chain_length=None, max_colliders=None):
+    """
+    揺れものの物理演算の負荷を減らす
+    チェーンの長さを制限し、揺れるノードがないボーングループと使われていないコライダーを削除し、
+    コライダー数を上限以下に統合する
+    :param gltf: glTFオブジェクト
+    :param max_chain_length: チェーンのノード数の上限(Noneで制限しない)
+    :param max_colliders: コライダー数の上限(Noneで制限しない)
+    :return: 変換後のglTFオブジェクト
+    """
+    if max_chain_length:
+        gltf = capped_spring_chains(gltf, max_chain_length)
+    return pruned_spring_bones(gltf, max_colliders)
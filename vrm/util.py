@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+from concurrent.futures import ThreadPoolExecutor
 from math import sqrt
 
 
@@ -9,9 +10,17 @@ def unique(seq):
     :return: 重複のないリストを返す
     """
     new_list = []
+    hashed = set()
     for x in seq:
-        if x not in new_list:
-            new_list.append(x)
+        try:
+            if x in hashed:
+                continue
+            hashed.add(x)
+        except TypeError:
+            # ハッシュ化できない要素(dictなど)はリストと比較する
+            if x in new_list:
+                continue
+        new_list.append(x)
     return new_list
 
 
@@ -49,3 +58,18 @@ def distance(vec1, vec2):
     diff_seq = [s1 - s2 for s1, s2 in zip(vec1, vec2)]
     sq_ds = sum([ds * ds for ds in diff_seq])
     return sqrt(sq_ds)
+
+
+def parallel_map(func, seq, jobs=1):
+    """
+    リストの各要素に関数を並列に適用する
+    スレッドで実行するので、GILを解放する処理(Pillowの画像処理など)で効果がある
+    :param func: 関数
+    :param seq: リスト
+    :param jobs: 並列数(1以下は逐次実行)
+    :return: 結果リスト(並列数に関わらずリストと同じ順)
+    """
+    if jobs <= 1:
+        return list(map(func, seq))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(func, seq))
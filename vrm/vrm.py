@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import json
+import mmap
 import struct
 
 from .gltf import instancing, indexing
@@ -11,6 +12,17 @@ def read_binary(path):
         return fi.read()
 
 
+def map_binary(path):
+    """
+    ファイルをメモリマップして読み込む
+    ファイルを閉じてもマップは有効で、参照しているmemoryviewがなくなるまで解放されない
+    :param path: ファイルパス
+    :return: ファイル全体のmemoryview(読み込み専用)
+    """
+    with open(path, 'rb') as fi:
+        return memoryview(mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ))
+
+
 GLTF_MAGIC = 0x46546c67  # glTF
 JSON_TYPE = 0x4e4f534a  # JSON
 CHUNK_TYPE = 0x4e4942  # BIN
@@ -33,33 +45,37 @@ class VRM(object):
         :param path: 保存先ファイルパス
         """
         with open(path, 'wb') as fo:
-            gltf, chunks = indexing(self.gltf)  # 参照をインデックス番号に変換
+            gltf, datas = indexing(self.gltf)  # 参照をインデックス番号に変換
             gltf_encoded = json.dumps(gltf).encode('utf-8')
             gltf_encoded = gltf_encoded.ljust((len(gltf_encoded) + 3) // 4 * 4)  # 4バイトアラインメント
-            glb_length = 20 + len(gltf_encoded) + sum(map(len, chunks)) + len(chunks) * 8
+            chunk_length = gltf['buffers'][0]['byteLength']
+            glb_length = 20 + len(gltf_encoded) + 8 + chunk_length
 
             # glTF header
             for v in [GLTF_MAGIC, self.version, glb_length, len(gltf_encoded), JSON_TYPE]:
                 fo.write(struct.pack('I', v))
             # glTF JSON
             fo.write(gltf_encoded)
-            # chunk data
-            for chunk in chunks:
-                for v in [len(chunk), CHUNK_TYPE]:
-                    fo.write(struct.pack('I', v))
-                fo.write(chunk)
+            # chunk data(bufferViewのデータを連結せずに直接書き出す)
+            for v in [chunk_length, CHUNK_TYPE]:
+                fo.write(struct.pack('I', v))
+            for data in datas:
+                fo.write(data)
+                fo.write(b'\x00' * (-len(data) % 4))  # 4バイトアラインメント
 
 
-def load(path):
+def load(path, use_mmap=False):
     """
     VRM読み込み
+    use_mmapを指定した場合、bufferViewのデータはファイルをマップしたmemoryviewのスライスになる(コピーなし)
+    マップ中のファイルは上書きしないこと
     :param path: VRMファイルパス
+    :param use_mmap: Trueでファイルをメモリマップして読み込む
     :return: VRMオブジェクト
     """
 
     # glb header
-    glb_bin = read_binary(path)
-    struct.unpack_from("II", glb_bin)
+    glb_bin = map_binary(path) if use_mmap else read_binary(path)
 
     # glTF header
     gltf_magic, version, length = struct.unpack_from("III", glb_bin)
@@ -68,7 +84,7 @@ def load(path):
     # glTF
     json_length, json_type = struct.unpack_from("II", glb_bin, offset=12)
     assert json_type == JSON_TYPE
-    json_text = glb_bin[20:][:json_length].decode('utf-8')
+    json_text = bytes(glb_bin[20:20 + json_length]).decode('utf-8')
     gltf = json.loads(json_text)
 
     # chunk data
@@ -77,7 +93,7 @@ def load(path):
     while offset < length:
         chunk_length, chunk_type = struct.unpack_from("II", glb_bin, offset=offset)
         assert chunk_type == CHUNK_TYPE
-        chunk = glb_bin[offset + 8:][:chunk_length]
+        chunk = glb_bin[offset + 8:offset + 8 + chunk_length]
         chunks.append(chunk)
         offset += 8 + chunk_length
 